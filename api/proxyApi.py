@@ -8,31 +8,67 @@
 -------------------------------------------------
    Change Activity:
                    2023/09/14: Rewritten using FastAPI with async support
+                   2026/10/18: Serve /get from an in-process snapshot
+                   2026/10/18: max_latency and sort=latency on /get and /all
+                   2026/10/18: 400 for an invalid /all cursor
+                   2026/10/18: check_stats from the check history
+                   2026/10/18: start the cache only on dbs with change events
 -------------------------------------------------
 """
 __author__ = 'JHao'
 
 import json
+import asyncio
 import platform
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from loguru import logger
 
+from helper import history
 from helper.proxy import Proxy
+from api.proxyCache import ProxyCache, regionCountry, latencyKey, pickFast
 from handler.proxyHandler import ProxyHandler
 from handler.configHandler import ConfigHandler
 
-app = FastAPI()
 conf = ConfigHandler()
 proxy_handler = ProxyHandler()
+proxy_cache = ProxyCache(proxy_handler, conf.apiCacheResync)
+
+# random picks from the db when /get filters on something the db has no index for
+DB_PICKS = 5
+
+
+def withStats(proxy):
+    """ a copy of the record with a summary of its check history, cached records are shared """
+    return dict(proxy, check_stats=history.summary(proxy.get("history", "")))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    task = None
+    if conf.apiCache and proxy_handler.db.supportsEvents:
+        task = asyncio.create_task(proxy_cache.run())
+    elif conf.apiCache:
+        logger.warning(f"ProxyCache: disabled, {proxy_handler.db.db_type} has no change events")
+    yield
+    if task:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 api_list = [
-    {"url": "/get", "params": "type: 'https' or ''", "desc": "get a proxy"},
-    {"url": "/pop", "params": "type: 'https' or ''", "desc": "get and delete a proxy"},
+    {"url": "/get", "params": "type: 'https' or '', region: country such as 'Japan', max_latency: seconds, "
+                              "sort: 'latency' to favor fast proxies", "desc": "get a proxy with its check_stats"},
+    {"url": "/pop", "params": "type: 'https' or ''", "desc": "get and delete a proxy with its check_stats"},
     {"url": "/delete", "params": "proxy: 'e.g. 127.0.0.1:8080'", "desc": "delete an unable proxy"},
-    {"url": "/all", "params": "type: 'https' or ''", "desc": "get all proxies from proxy pool"},
+    {"url": "/all", "params": "type: 'https' or '', stream: true for NDJSON, cursor: page through with cursor, "
+                              "max_latency: seconds, sort: 'latency' for fastest first, stats: true to add check_stats",
+     "desc": "get all proxies from proxy pool"},
     {"url": "/count", "params": "", "desc": "return proxy count"}
 ]
 
@@ -55,20 +91,29 @@ async def index():
 
 
 @app.get("/get/")
-async def get_proxy(type: Optional[str] = Query(default="", description="Type of proxy: 'https' or ''")):
+async def get_proxy(type: Optional[str] = Query(default="", description="Type of proxy: 'https' or ''"),
+                    region: Optional[str] = Query(default="", description="Country of proxy"),
+                    max_latency: Optional[float] = Query(default=0, description="max latency in seconds"),
+                    sort: Optional[str] = Query(default="", description="'latency' to favor fast proxies")):
     type = type.lower()
-    proxy = await proxy_handler.get(type)
-    return proxy if proxy else {"code": 0, "src": "no proxy"}
+    weighted = sort == "latency"
+    if proxy_cache.ready:
+        proxy = proxy_cache.get(type, region, max_latency, weighted)
+    elif region or max_latency or weighted:
+        # the db has no region or latency index, a few random picks are a best effort
+        candidates = await asyncio.gather(*[proxy_handler.get(type) for _ in range(DB_PICKS)])
+        candidates = [proxy for proxy in candidates
+                      if proxy and (not region or regionCountry(proxy.get("region")) == region.lower())]
+        proxy = pickFast(candidates, max_latency, weighted)
+    else:
+        proxy = await proxy_handler.get(type)
+    return withStats(proxy) if proxy else {"code": 0, "src": "no proxy"}
 
 
 @app.get("/pop/")
 async def pop_proxy(type: Optional[str] = Query(default="", description="Type of proxy: 'https' or ''")):
-    https = type.lower() == 'https'
-    proxy = await proxy_handler.pop(https)
-    if proxy:
-        return proxy.to_dict
-    else:
-        return {"code": 0, "src": "no proxy"}
+    proxy = await proxy_handler.pop(type.lower())
+    return withStats(proxy) if proxy else {"code": 0, "src": "no proxy"}
 
 
 @app.get("/refresh/")
@@ -77,28 +122,82 @@ async def refresh():
     return {"message": "success"}
 
 
-@app.get("/all/", response_model=List[Dict[str, Any]])
+def match_proxy(proxy, type, source, valid, max_latency=0):
+    """ whether a proxy record passes the /all filters """
+    if type == "https":
+        if not proxy.get("https"):
+            return False
+    elif type and proxy.get("type") != type:
+        return False
+    if source and source not in proxy.get("source", ""):
+        return False
+    if valid and not (proxy.get("last_status") and proxy.get("outbound_ip")):
+        return False
+    if max_latency and not 0 < (proxy.get("latency") or 0) <= max_latency:
+        return False
+    return True
+
+
+@app.get("/all/")
 async def get_all(
         type: Optional[str] = Query(default="", description="Type of proxy: 'https' or ''"),
         source: Optional[str] = Query(default="", description="source of proxy"),
         valid: Optional[bool] = Query(default=False, description="is proxy valid"),
         count: Optional[int] = Query(default=0, description="count of proxy"),
+        stream: Optional[bool] = Query(default=False, description="stream proxies as NDJSON"),
+        cursor: Optional[str] = Query(default=None, description="page cursor, 0 for the first page"),
+        page_size: Optional[int] = Query(default=500, ge=1, description="page size hint for cursor paging"),
+        max_latency: Optional[float] = Query(default=0, description="max latency in seconds"),
+        sort: Optional[str] = Query(default="", description="'latency' for fastest first"),
+        stats: Optional[bool] = Query(default=False, description="add check_stats to every proxy"),
 ):
-    proxies = await proxy_handler.getAll()
-    # proxies.sort(key=lambda x: x.get('last_time', ''), reverse=True)
-
-    if type:
-        proxies = [proxy for proxy in proxies if source in proxy.get("type") == type]
-
-    if source:
-        proxies = [proxy for proxy in proxies if source in proxy.get("source")]
-
-    if valid:
-        proxies = [proxy for proxy in proxies if proxy.get("last_status") and proxy.get("outbound_ip")]
-
-    if count > 0:
-        proxies = proxies[:count]
-
+    type = type.lower()
+    filters = {"type": type, "source": source, "valid": valid}
+    # decoding every history costs about as much as the scan, so /all only does it on request
+    output = withStats if stats else (lambda proxy: proxy)
+
+    if cursor is not None:
+        try:
+            next_cursor, proxies = await proxy_handler.scan(cursor, page_size, **filters)
+        except ValueError:
+            # redis and memory cursors are numbers, ssdb and sqlite ones the last proxy of a page
+            return JSONResponse(status_code=400, content={"code": 0, "src": "invalid cursor"})
+        proxies = [proxy for proxy in proxies if match_proxy(proxy, type, source, valid, max_latency)]
+        if sort == "latency":
+            # within the page, a sorted walk over all pages would need the whole set
+            proxies.sort(key=latencyKey)
+        return {"cursor": next_cursor, "proxies": [output(proxy) for proxy in proxies]}
+
+    if sort == "latency":
+        proxies = [proxy async for proxy in proxy_handler.iterAll(page_size, **filters)
+                   if match_proxy(proxy, type, source, valid, max_latency)]
+        proxies.sort(key=latencyKey)
+        if count > 0:
+            proxies = proxies[:count]
+        proxies = [output(proxy) for proxy in proxies]
+        if stream:
+            return StreamingResponse((json.dumps(proxy, ensure_ascii=False) + "\n" for proxy in proxies),
+                                     media_type="application/x-ndjson")
+        return proxies
+
+    if stream:
+        async def ndjson():
+            sent = 0
+            async for proxy in proxy_handler.iterAll(page_size, **filters):
+                if match_proxy(proxy, type, source, valid, max_latency):
+                    yield json.dumps(output(proxy), ensure_ascii=False) + "\n"
+                    sent += 1
+                    if 0 < count <= sent:
+                        break
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    proxies = []
+    async for proxy in proxy_handler.iterAll(page_size, **filters):
+        if match_proxy(proxy, type, source, valid, max_latency):
+            proxies.append(output(proxy))
+            if 0 < count <= len(proxies):
+                break
     return proxies
 
 
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     proxyCache.py
+   Description :   In-process snapshot of the valid proxies for the API
+   Author :        JHao
+   Date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: Snapshot kept current by db change events
+                   2026/10/18: Latency limit and selection weighted towards fast proxies
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import random
+import asyncio
+import collections
+
+from loguru import logger
+
+from util.indexedSet import IndexedSet
+
+
+def regionCountry(region):
+    """ country part of a region string such as 'Japan, Tokyo, Amazon' """
+    return (region or "").split(",")[0].strip().lower()
+
+
+def latencyKey(item):
+    """ sort key of a proxy record by latency, the ones never measured last """
+    return item.get("latency") or float("inf")
+
+
+def pickFast(candidates, max_latency=0, weighted=False):
+    """
+    One of the candidate proxy records
+    :param candidates: list of proxy records
+    :param max_latency: skip the ones slower than this many seconds or never measured, 0 for no limit
+    :param weighted: pick with a probability proportional to 1/latency instead of uniformly
+    :return: proxy record or None
+    """
+    if max_latency:
+        candidates = [item for item in candidates if 0 < (item.get("latency") or 0) <= max_latency]
+    if not candidates:
+        return None
+    if not weighted:
+        return random.choice(candidates)
+    # the ones never measured weigh like the slowest measured one
+    slowest = max((item.get("latency") or 0 for item in candidates), default=0) or 1
+    return random.choices(candidates, weights=[1 / (item.get("latency") or slowest) for item in candidates])[0]
+
+
+class Snapshot(object):
+    """ valid proxies grouped by (type, country), '' matches any """
+
+    # candidates drawn from a group when the latency matters
+    SAMPLE = 16
+
+    def __init__(self):
+        self.proxies = dict()
+        self.groups = collections.defaultdict(IndexedSet)
+
+    @staticmethod
+    def groupKeys(item):
+        types = ["", item.get("type", "")]
+        if item.get("https"):
+            types.append("https")
+        regions = ["", regionCountry(item.get("region"))]
+        return [(type, region) for type in types for region in regions]
+
+    def put(self, item):
+        self.delete(item["proxy"])
+        if not (item.get("last_status") and item.get("outbound_ip")):
+            return
+        self.proxies[item["proxy"]] = item
+        for key in self.groupKeys(item):
+            self.groups[key].add(item["proxy"])
+
+    def delete(self, proxy):
+        item = self.proxies.pop(proxy, None)
+        if item is None:
+            return
+        for key in self.groupKeys(item):
+            self.groups[key].discard(proxy)
+            if not self.groups[key]:
+                del self.groups[key]
+
+    def apply(self, event):
+        for item in event.get("put", []):
+            self.put(item)
+        for proxy in event.get("delete", []):
+            self.delete(proxy)
+
+    def get(self, type="", region="", max_latency=0, weighted=False):
+        group = self.groups.get((type, region.lower()))
+        if not group:
+            return None
+        if not (max_latency or weighted):
+            return self.proxies[group.choice()]
+        item = pickFast([self.proxies[proxy] for proxy in group.sample(self.SAMPLE)], max_latency, weighted)
+        if item is None and max_latency and len(group) > self.SAMPLE:
+            # few proxies are fast enough, look at the whole group
+            item = pickFast([self.proxies[proxy] for proxy in group], max_latency, weighted)
+        return item
+
+
+class ProxyCache(object):
+    """
+    Valid proxies held in memory
+
+    Follows the change events of the db and rebuilds itself from a full scan when it
+    subscribes, every `resync_interval` seconds and on a reset event. `ready` is False
+    while the subscription is down, callers then go to the db.
+    """
+
+    def __init__(self, proxy_handler, resync_interval):
+        self.proxy_handler = proxy_handler
+        self.resync_interval = resync_interval
+        self.ready = False
+        self._subscribed = False
+        self._snapshot = Snapshot()
+        self._resync_task = None
+        # events received while a resync is scanning, replayed on the new snapshot
+        self._pending = None
+
+    def get(self, type="", region="", max_latency=0, weighted=False):
+        return self._snapshot.get(type, region, max_latency, weighted)
+
+    def apply(self, event):
+        if event.get("reset"):
+            if self._pending is None:
+                self._pending = []
+                self._resync_task = asyncio.create_task(self.resync())
+            return
+        self._snapshot.apply(event)
+        if self._pending is not None:
+            self._pending.append(event)
+
+    async def resync(self):
+        snapshot = Snapshot()
+        try:
+            async for item in self.proxy_handler.iterAll():
+                snapshot.put(item)
+            for event in self._pending:
+                snapshot.apply(event)
+            self._snapshot = snapshot
+            self.ready = self._subscribed
+            logger.info(f"ProxyCache: resync {len(snapshot.proxies)} valid proxies")
+        except Exception as e:
+            logger.error(f"ProxyCache: resync error: {e}")
+        finally:
+            self._pending = None
+
+    async def run(self):
+        """ follow the db until cancelled """
+        timer = asyncio.create_task(self._resyncTimer())
+        try:
+            while True:
+                try:
+                    async for event in self.proxy_handler.subscribe():
+                        self._subscribed = True
+                        self.apply(event)
+                except Exception as e:
+                    logger.error(f"ProxyCache: subscription error: {e}")
+                self._subscribed = self.ready = False
+                await asyncio.sleep(1)
+        finally:
+            timer.cancel()
+
+    async def _resyncTimer(self):
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            self.apply({"reset": True})
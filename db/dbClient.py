@@ -10,6 +10,11 @@
                    2016/12/02:   Database Factory Class
                    2020/07/03:   Removed raw_proxy storage
                    2023/09/14:   Adapted to use asynchronous database clients
+                   2026/10/18:   Added sqlite backend
+                   2026/10/18:   Added memory backend
+                   2026/10/18:   Added redis cluster and sharding
+                   2026/10/18:   Negative cache of recently failed proxies
+                   2026/10/18:   addSources for the sources of known proxies
 -------------------------------------------------
 """
 __author__ = 'JHao'
@@ -19,6 +24,7 @@ import sys
 import asyncio
 
 from helper.proxy import Proxy
+from handler.configHandler import ConfigHandler
 from util.six import urlparse, withMetaclass
 from util.singleton import Singleton
 
@@ -28,23 +34,40 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 class DbClient(withMetaclass(Singleton)):
     """
     DbClient is a database factory class providing methods:
-    get/put/update/pop/delete/exists/getAll/clear/getCount/changeTable
+    get/getMany/put/putMany/update/pop/delete/deleteMany/exists/claimDue/getAll/scan/clear/getCount/changeTable/reindex/migrate/subscribe
+    getDead/putDead/deleteDead/listDead/purgeDead
 
     Abstract method definitions:
         get(): Return a proxy randomly;
+        getMany(proxies): Return the stored records of a batch of proxies;
         put(proxy): Store a proxy;
-        pop(): Return and delete a proxy sequentially;
+        putMany(proxies): Store a batch of proxies;
+        pop(): Return and delete a proxy randomly;
         update(proxy): Update specified proxy information;
         delete(proxy): Delete specified proxy;
+        deleteMany(proxies): Delete a batch of proxies;
         exists(proxy): Check if specified proxy exists;
+        claimDue(count, lease): Claim proxies whose next check time has passed;
         getAll(): Return all proxies;
+        scan(cursor, count, **filters): Return one page of proxies and the next cursor,
+            filters type/source/valid are applied by backends that can push them down;
         clear(): Clear all proxy information;
         getCount(): Return proxy statistics;
         changeTable(name): Switch the operation object
+        reindex(): Rebuild secondary indexes and counters from the stored proxies
+        migrate(): Rewrite stored proxies with the configured serializer
+        subscribe(): Yield change events of the proxies, None if supportsEvents is False
+        getDead(proxies): Return the negative cache entries (expiry, strikes) of proxies;
+        putDead(entries): Add or renew negative cache entries;
+        deleteDead(proxies): Remove proxies from the negative cache;
+        listDead(after): Return the proxies banned beyond a time;
+        purgeDead(before): Remove entries whose ban ended before a time
 
     All methods need to be implemented by the corresponding class:
         ssdb: ssdbClient.py
         redis: redisClient.py
+        sqlite: sqliteClient.py
+        memory: memoryClient.py
         mongodb: mongodbClient.py
     """
 
@@ -64,6 +87,10 @@ class DbClient(withMetaclass(Singleton)):
         cls.db_user = db_conf.username
         cls.db_pwd = db_conf.password
         cls.db_name = db_conf.path[1:]
+        # sqlite://relative/path or sqlite:///absolute/path
+        cls.db_path = db_conf.netloc + db_conf.path
+        if cls.db_path.startswith("//"):
+            cls.db_path = "/" + cls.db_path.lstrip("/")
         return cls
 
     def __initDbClient(self):
@@ -73,40 +100,69 @@ class DbClient(withMetaclass(Singleton)):
         __type = None
         if "SSDB" == self.db_type:
             __type = "ssdbClient"
-        elif "REDIS" == self.db_type:
+        elif self.db_type in ("REDIS", "REDISCLUSTER"):
             __type = "redisClient"
+        elif "SQLITE" == self.db_type:
+            __type = "sqliteClient"
+        elif "MEMORY" == self.db_type:
+            __type = "memoryClient"
         else:
             pass
         assert __type, 'type error, Not support DB type: {}'.format(self.db_type)
         module = __import__(__type)
-        client_class = getattr(module, "%sClient" % self.db_type.title())
-        self.client = client_class(host=self.db_host,
-                                   port=self.db_port,
-                                   username=self.db_user,
-                                   password=self.db_pwd,
-                                   db=self.db_name)
+        client_class = getattr(module, "%sClient" % __type[:-len("Client")].title())
+        if "SQLITE" == self.db_type:
+            self.client = client_class(path=self.db_path, serializer=ConfigHandler().dbSerializer)
+            return
+        options = dict(host=self.db_host,
+                       port=self.db_port,
+                       username=self.db_user,
+                       password=self.db_pwd,
+                       db=self.db_name,
+                       serializer=ConfigHandler().dbSerializer)
+        if "redisClient" == __type:
+            options.update(cluster="REDISCLUSTER" == self.db_type, shards=ConfigHandler().dbShards)
+        self.client = client_class(**options)
 
     async def get(self, type='', **kwargs):
         return await self.client.get(type, **kwargs)
 
+    async def getMany(self, keys, **kwargs):
+        return await self.client.getMany(keys, **kwargs)
+
+    async def addSources(self, sources):
+        return await self.client.addSources(sources)
+
     async def put(self, key, **kwargs):
         return await self.client.put(key, **kwargs)
 
+    async def putMany(self, keys, **kwargs):
+        return await self.client.putMany(keys, **kwargs)
+
     async def update(self, key, value, **kwargs):
         return await self.client.update(key, value, **kwargs)
 
     async def delete(self, key, **kwargs):
         return await self.client.delete(key, **kwargs)
 
+    async def deleteMany(self, keys, **kwargs):
+        return await self.client.deleteMany(keys, **kwargs)
+
     async def exists(self, key, **kwargs):
         return await self.client.exists(key, **kwargs)
 
-    async def pop(self, https, **kwargs):
-        return await self.client.pop(https, **kwargs)
+    async def claimDue(self, count, lease, **kwargs):
+        return await self.client.claimDue(count, lease, **kwargs)
+
+    async def pop(self, type='', **kwargs):
+        return await self.client.pop(type, **kwargs)
 
     async def getAll(self):
         return await self.client.getAll()
 
+    async def scan(self, cursor=0, count=500, **kwargs):
+        return await self.client.scan(cursor, count, **kwargs)
+
     async def clear(self):
         return await self.client.clear()
 
@@ -116,6 +172,34 @@ class DbClient(withMetaclass(Singleton)):
     async def getCount(self):
         return await self.client.getCount()
 
+    async def reindex(self):
+        return await self.client.reindex()
+
+    async def migrate(self):
+        return await self.client.migrate()
+
+    @property
+    def supportsEvents(self):
+        return self.client.supportsEvents
+
+    def subscribe(self):
+        return self.client.subscribe()
+
+    async def getDead(self, keys):
+        return await self.client.getDead(keys)
+
+    async def putDead(self, entries):
+        return await self.client.putDead(entries)
+
+    async def deleteDead(self, keys):
+        return await self.client.deleteDead(keys)
+
+    async def listDead(self, after):
+        return await self.client.listDead(after)
+
+    async def purgeDead(self, before):
+        return await self.client.purgeDead(before)
+
     async def test(self):
         return await self.client.test()
 
@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     memoryClient.py
+   Description :   In-process storage for tests and benchmarks
+   Author :        JHao
+   Date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: memory backend on indexed dicts and sets
+                   2026/10/18: negative cache of recently failed proxies
+                   2026/10/18: get/pop of an unknown type leave the indexes alone
+                   2026/10/18: addSources rewrites only the source of known proxies
+                   2026/10/18: stored records are copies, never the dicts of the Proxy objects
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import heapq
+import asyncio
+import collections
+
+from helper.proxy import Proxy
+from util.indexedSet import IndexedSet
+
+
+class MemoryTable(object):
+    """ proxies of one table with the same indexes and counters as the Redis layout """
+
+    def __init__(self):
+        self.records = dict()
+        self.indexes = collections.defaultdict(IndexedSet)
+        self.stats = collections.Counter()
+        # (due, proxy) entries, stale ones are skipped when their due differs from self.dues
+        self.due_heap = []
+        self.dues = dict()
+        self.subscribers = []
+        # proxy -> (expiry, strikes), not derived from the records, kept by reindex
+        self.dead = dict()
+
+
+class MemoryClient(object):
+    """
+    Asynchronous in-process client, same interface as RedisClient
+
+    Nothing leaves the process, so it is only shared by the coroutines of one
+    interpreter. Records are kept as dicts and copied on the way in and out.
+    Index keys are ("valid", ""), ("valid", "https") and ("valid", <type>), each
+    an IndexedSet for O(1) random picks.
+    """
+
+    # subscribe() yields the change events
+    supportsEvents = True
+
+    def __init__(self, **kwargs):
+        """
+        init, connection arguments are ignored
+        """
+        self.name = ""
+        self.__tables = collections.defaultdict(MemoryTable)
+
+    @property
+    def __table(self):
+        return self.__tables[self.name]
+
+    @staticmethod
+    def isValid(item):
+        return bool(item.get("last_status") and item.get("outbound_ip"))
+
+    def __indexKeys(self, item):
+        if not self.isValid(item):
+            return set()
+        keys = {("valid", ""), ("valid", item.get("type", ""))}
+        if item.get("https"):
+            keys.add(("valid", "https"))
+        return keys
+
+    def __countFields(self, item):
+        fields = ["total", "source:%s" % item.get("source", "")]
+        if self.isValid(item):
+            fields.append("valid")
+        return fields
+
+    def __publish(self, event):
+        for queue in self.__table.subscribers:
+            queue.put_nowait(event)
+
+    def __store(self, item, due):
+        table = self.__table
+        old = table.records.get(item["proxy"])
+        old_keys = self.__indexKeys(old) if old else set()
+        new_keys = self.__indexKeys(item)
+        for key in old_keys - new_keys:
+            table.indexes[key].discard(item["proxy"])
+        for key in new_keys - old_keys:
+            table.indexes[key].add(item["proxy"])
+        if old:
+            table.stats.subtract(self.__countFields(old))
+        table.stats.update(self.__countFields(item))
+        table.records[item["proxy"]] = item
+        self.__setDue(item["proxy"], due)
+        return 0 if old else 1
+
+    def __setDue(self, proxy_str, due):
+        if self.__table.dues.get(proxy_str) == due:
+            return
+        self.__table.dues[proxy_str] = due
+        heapq.heappush(self.__table.due_heap, (due, proxy_str))
+
+    def __remove(self, proxy_str):
+        table = self.__table
+        old = table.records.pop(proxy_str, None)
+        if old is None:
+            return None
+        for key in self.__indexKeys(old):
+            table.indexes[key].discard(proxy_str)
+        table.stats.subtract(self.__countFields(old))
+        table.dues.pop(proxy_str, None)
+        return old
+
+    async def get(self, type=''):
+        """
+        随机返回一个可用代理
+        :return: proxy attributes dict or None
+        """
+        # get, a missing key would stay in the defaultdict for every type a client asks for
+        index = self.__table.indexes.get(("valid", type))
+        proxy = index.choice() if index else None
+        return dict(self.__table.records[proxy]) if proxy else None
+
+    async def put(self, proxy_obj):
+        """
+        放入代理
+        :param proxy_obj: Proxy obj
+        :return: 1 for a new proxy, 0 for an updated one
+        """
+        return await self.putMany([proxy_obj])
+
+    async def putMany(self, proxy_objs):
+        """
+        批量放入代理
+        :param proxy_objs: list of Proxy obj
+        :return: number of new proxies
+        """
+        if not proxy_objs:
+            return 0
+        # to_dict is cached on the Proxy and must not be changed, the table keeps its own copy
+        items = [dict(proxy_obj.to_dict) for proxy_obj in proxy_objs]
+        count = sum(self.__store(item, int(proxy_obj.due_time)) for item, proxy_obj in zip(items, proxy_objs))
+        self.__publish({"put": [dict(item) for item in items]})
+        return count
+
+    async def pop(self, type=''):
+        """
+        随机弹出一个可用代理
+        :return: proxy attributes dict or None
+        """
+        index = self.__table.indexes.get(("valid", type))
+        proxy = index.choice() if index else None
+        if not proxy:
+            return None
+        self.__publish({"delete": [proxy]})
+        return self.__remove(proxy)
+
+    async def delete(self, proxy_str):
+        """
+        移除指定代理
+        :param proxy_str: proxy str
+        :return:
+        """
+        return await self.deleteMany([proxy_str])
+
+    async def deleteMany(self, proxy_strs):
+        """
+        批量移除代理
+        :param proxy_strs: list of proxy str
+        :return: number of removed proxies
+        """
+        count = sum(self.__remove(proxy_str) is not None for proxy_str in proxy_strs)
+        if proxy_strs:
+            self.__publish({"delete": list(proxy_strs)})
+        return count
+
+    async def claimDue(self, count, lease):
+        """
+        领取下次检测时间已到的代理, 并把它们的检测时间延后lease秒
+        :param count: max number of proxies
+        :param lease: seconds before an unfinished claim becomes due again
+        :return: list of proxy attributes dicts
+        """
+        table = self.__table
+        now = int(time.time())
+        claimed = []
+        while table.due_heap and table.due_heap[0][0] <= now and len(claimed) < count:
+            due, proxy_str = heapq.heappop(table.due_heap)
+            if table.dues.get(proxy_str) == due:
+                claimed.append(proxy_str)
+        for proxy_str in claimed:
+            self.__setDue(proxy_str, now + lease)
+        return [dict(table.records[proxy_str]) for proxy_str in claimed]
+
+    async def exists(self, proxy_str):
+        """
+        判断指定代理是否存在
+        :param proxy_str: proxy str
+        :return:
+        """
+        return proxy_str in self.__table.records
+
+    async def getMany(self, proxy_strs):
+        """
+        返回多个代理的记录
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to attributes dict, 不存在的不返回
+        """
+        records = self.__table.records
+        return {proxy_str: dict(records[proxy_str]) for proxy_str in proxy_strs if proxy_str in records}
+
+    async def addSources(self, sources):
+        """
+        给已有代理追加来源, 只改写来源和来源计数
+        :param sources: dict of proxy string to source string
+        :return: list of the proxies already stored
+        """
+        table = self.__table
+        known, updated = [], []
+        for proxy_str, source_str in sources.items():
+            item = table.records.get(proxy_str)
+            if item is None:
+                continue
+            known.append(proxy_str)
+            source = item.get("source", "")
+            merged = Proxy.merge_sources(source, source_str)
+            if merged != source:
+                table.stats.subtract(["source:%s" % source])
+                table.stats.update(["source:%s" % merged])
+                # replaced rather than changed, a record may still be shared with a caller
+                table.records[proxy_str] = dict(item, source=merged)
+                updated.append(dict(item, source=merged))
+        if updated:
+            self.__publish({"put": updated})
+        return known
+
+    async def update(self, proxy_obj):
+        """
+        更新 proxy 属性
+        :param proxy_obj:
+        :return:
+        """
+        return await self.put(proxy_obj)
+
+    async def getAll(self):
+        """
+        字典形式返回所有代理
+        :return:
+        """
+        return [dict(item) for item in self.__table.records.values()]
+
+    async def scan(self, cursor=0, count=500, **kwargs):
+        """
+        返回一页代理, 页之间有增删时可能漏掉或重复代理
+        :param cursor: offset returned by the previous page, 0 to start
+        :param count: page size
+        :param kwargs: type/source/valid filters, not applied here, callers filter the page
+        :return: (next cursor, list of proxy attributes dicts), next cursor is 0 at the end
+        """
+        cursor = int(cursor or 0)
+        if cursor < 0:
+            raise ValueError("invalid cursor %d" % cursor)
+        items = list(self.__table.records.values())[cursor:cursor + count]
+        next_cursor = cursor + count if cursor + count < len(self.__table.records) else 0
+        return next_cursor, [dict(item) for item in items]
+
+    async def clear(self):
+        """
+        清空所有代理
+        :return:
+        """
+        subscribers = self.__table.subscribers
+        self.__tables[self.name] = MemoryTable()
+        self.__table.subscribers = subscribers
+        self.__publish({"reset": True})
+
+    async def subscribe(self):
+        """
+        代理变更事件, 与RedisClient相同, 先产生一个reset事件
+        :return: async generator of event dicts
+        """
+        queue = asyncio.Queue()
+        subscribers = self.__table.subscribers
+        subscribers.append(queue)
+        try:
+            yield {"reset": True}
+            while True:
+                yield await queue.get()
+        finally:
+            subscribers.remove(queue)
+
+    async def reindex(self):
+        """
+        根据记录重建索引/检测时间/计数
+        :return: number of indexed records
+        """
+        items = list(self.__table.records.values())
+        subscribers, dead = self.__table.subscribers, self.__table.dead
+        self.__tables[self.name] = MemoryTable()
+        self.__table.subscribers, self.__table.dead = subscribers, dead
+        for item in items:
+            self.__store(item, int(Proxy.createFromJson(item).due_time))
+        return len(items)
+
+    async def migrate(self):
+        """
+        记录不做编码, 无需迁移
+        :return: number of rewritten records
+        """
+        return 0
+
+    async def getCount(self):
+        """
+        返回代理数量
+        :return:
+        """
+        stats = self.__table.stats
+        return {
+            'total': stats["total"],
+            'valid': stats["valid"],
+            'sources': {field[len("source:"):]: value for field, value in stats.items()
+                        if field.startswith("source:") and value > 0}
+        }
+
+    async def getDead(self, proxy_strs):
+        """
+        负缓存中的代理, 包括已过期的
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to (expiry timestamp, strikes)
+        """
+        dead = self.__table.dead
+        return {proxy_str: dead[proxy_str] for proxy_str in proxy_strs if proxy_str in dead}
+
+    async def putDead(self, entries):
+        """
+        加入或更新负缓存
+        :param entries: dict of proxy string to (expiry timestamp, strikes)
+        :return:
+        """
+        self.__table.dead.update(entries)
+
+    async def deleteDead(self, proxy_strs):
+        """
+        从负缓存移除
+        :param proxy_strs: list of proxy strings
+        :return: number of removed entries
+        """
+        dead = self.__table.dead
+        return sum(dead.pop(proxy_str, None) is not None for proxy_str in proxy_strs)
+
+    async def listDead(self, after):
+        """
+        负缓存中解除时间晚于after的代理
+        :param after: timestamp
+        :return: list of proxy strings
+        """
+        return [proxy_str for proxy_str, (expiry, _) in self.__table.dead.items() if expiry > after]
+
+    async def purgeDead(self, before):
+        """
+        清除解除时间早于before的负缓存
+        :param before: timestamp
+        :return: number of removed entries
+        """
+        dead = self.__table.dead
+        expired = [proxy_str for proxy_str, (expiry, _) in dead.items() if expiry < before]
+        for proxy_str in expired:
+            del dead[proxy_str]
+        return len(expired)
+
+    def changeTable(self, name):
+        """
+        切换操作对象
+        :param name:
+        :return:
+        """
+        self.name = name
+
+    async def test(self):
+        return False
@@ -1,66 +1,432 @@
 # -*- coding: utf-8 -*-
 
+import zlib
 import json
+import time
 import redis
+import random
+import asyncio
 import collections
 
-from random import choice
 from loguru import logger
 
 from redis.exceptions import TimeoutError, ConnectionError, ResponseError
-from redis.asyncio import Redis
+from redis.asyncio import Redis, RedisCluster
 from redis.asyncio.connection import BlockingConnectionPool
+from helper.proxy import Proxy
+from db.serializer import getSerializer, detect, loads, SOURCE_INDEX, HTTPS_INDEX, OUTBOUND_IP_INDEX, LAST_STATUS_INDEX
 from handler.logHandler import LogHandler
 
+# Helpers of the write and delete scripts. ARGV[2..5] are the positions of source, https,
+# outbound_ip and last_status in compact records, KEYS[3] is the stats hash.
+RECORD_LUA = """
+local function truthy(value)
+    return value ~= nil and value ~= false and value ~= cjson.null and value ~= '' and value ~= 0
+end
+
+local function field(record, name, position)
+    local value = record[name]
+    if value == nil then
+        value = record[tonumber(ARGV[position])]
+    end
+    return value
+end
+
+-- valid flag and source of an encoded record, as RedisClient.isValid and __countFields see them
+local function state(item)
+    local record = cjson.decode(item)
+    local source = field(record, 'source', 2)
+    if source == nil or source == cjson.null then
+        source = ''
+    end
+    return truthy(field(record, 'last_status', 5)) and truthy(field(record, 'outbound_ip', 4)), tostring(source)
+end
+
+local counts = {}
+local function count(valid, source, delta)
+    counts['total'] = (counts['total'] or 0) + delta
+    counts['source:' .. source] = (counts['source:' .. source] or 0) + delta
+    if valid then
+        counts['valid'] = (counts['valid'] or 0) + delta
+    end
+end
+
+local function flushCounts()
+    for name, delta in pairs(counts) do
+        if delta ~= 0 then
+            redis.call('HINCRBY', KEYS[3], name, delta)
+        end
+    end
+end
+"""
+
+# KEYS: hash, check due zset, stats hash, valid set, https set
+# ARGV: prefix of the per type sets, positions of fields in compact records (see RECORD_LUA),
+#       events channel, change event, then per proxy: proxy, record, due time, valid 1/0, https 1/0, source
+# The old record is read in the script, so racing writers can not count a proxy twice
+# or leave it in the index sets after it became invalid. The event is published by the
+# script too, so subscribers get the events in the order of the writes.
+WRITE_SCRIPT = RECORD_LUA + """
+local added = {}
+for i = 8, #ARGV, 6 do
+    local proxy = ARGV[i]
+    local type_key = ARGV[1] .. string.match(proxy, '^[^:]*')
+    local old = redis.call('HGET', KEYS[1], proxy)
+    if old then
+        local valid, source = state(old)
+        count(valid, source, -1)
+    end
+    table.insert(added, redis.call('HSET', KEYS[1], proxy, ARGV[i + 1]))
+    redis.call('ZADD', KEYS[2], ARGV[i + 2], proxy)
+    local valid = ARGV[i + 3] == '1'
+    count(valid, ARGV[i + 5], 1)
+    if valid then
+        redis.call('SADD', KEYS[4], proxy)
+        redis.call('SADD', type_key, proxy)
+    else
+        redis.call('SREM', KEYS[4], proxy)
+        redis.call('SREM', type_key, proxy)
+    end
+    if valid and ARGV[i + 4] == '1' then
+        redis.call('SADD', KEYS[5], proxy)
+    else
+        redis.call('SREM', KEYS[5], proxy)
+    end
+end
+flushCounts()
+redis.call('PUBLISH', ARGV[6], ARGV[7])
+return added
+"""
+
+# KEYS: hash, check due zset, stats hash, valid set, https set
+# ARGV: prefix of the per type sets, positions of fields in compact records, events channel,
+#       change event, then the proxies
+DELETE_SCRIPT = RECORD_LUA + """
+local removed = 0
+for i = 8, #ARGV do
+    local proxy = ARGV[i]
+    local old = redis.call('HGET', KEYS[1], proxy)
+    if old then
+        local valid, source = state(old)
+        count(valid, source, -1)
+        redis.call('HDEL', KEYS[1], proxy)
+        removed = removed + 1
+    end
+    redis.call('ZREM', KEYS[2], proxy)
+    redis.call('SREM', KEYS[4], proxy)
+    redis.call('SREM', KEYS[5], proxy)
+    redis.call('SREM', ARGV[1] .. string.match(proxy, '^[^:]*'), proxy)
+end
+flushCounts()
+redis.call('PUBLISH', ARGV[6], ARGV[7])
+return removed
+"""
+
+# KEYS: hash, set to pick from, valid set, https set, check due zset, stats hash
+# ARGV: prefix of the per type sets, position of source in compact records, events channel
+# Per type sets share the hash tag of KEYS so they live in the same slot. The events
+# channel is passed in ARGV: inside a script PUBLISH is not checked against the slot,
+# while redis-py routes a pipelined PUBLISH by its channel like a key.
+POP_SCRIPT = """
+for _ = 1, 3 do
+    local proxy = redis.call('SPOP', KEYS[2])
+    if not proxy then
+        return nil
+    end
+    local item = redis.call('HGET', KEYS[1], proxy)
+    redis.call('SREM', KEYS[3], proxy)
+    redis.call('SREM', KEYS[4], proxy)
+    redis.call('SREM', ARGV[1] .. string.match(proxy, '^[^:]*'), proxy)
+    redis.call('ZREM', KEYS[5], proxy)
+    if item then
+        redis.call('HDEL', KEYS[1], proxy)
+        -- the pickable sets only hold valid proxies
+        redis.call('HINCRBY', KEYS[6], 'total', -1)
+        redis.call('HINCRBY', KEYS[6], 'valid', -1)
+        local record = cjson.decode(item)
+        local source = record['source'] or record[tonumber(ARGV[2])] or ''
+        redis.call('HINCRBY', KEYS[6], 'source:' .. tostring(source), -1)
+        redis.call('PUBLISH', ARGV[3], cjson.encode({delete = {proxy}}))
+        return item
+    end
+end
+return nil
+"""
+
+# KEYS: check due zset, hash
+# ARGV: now, lease seconds, count
+# Claimed proxies are pushed back by the lease so concurrent checkers skip them,
+# the checker result then sets the real next check time.
+CLAIM_SCRIPT = """
+local proxies = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+local lease = tonumber(ARGV[1]) + tonumber(ARGV[2])
+local items = {}
+for _, proxy in ipairs(proxies) do
+    local item = redis.call('HGET', KEYS[2], proxy)
+    if item then
+        redis.call('ZADD', KEYS[1], lease, proxy)
+        table.insert(items, item)
+    else
+        redis.call('ZREM', KEYS[1], proxy)
+    end
+end
+return items
+"""
+
+# KEYS: hash
+# ARGV: proxy, expected value, new value
+# Rewrites a record only if nobody changed it since it was read.
+REPLACE_SCRIPT = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# KEYS: hash, stats hash
+# ARGV: events channel, then per proxy: proxy, expected value, new value, old source, new source,
+#       new attributes as JSON for the change event
+# Rewrites the source of records nobody changed since they were read, a record that was
+# removed or rewritten in between is left alone and gets the source on a later fetch.
+SOURCE_SCRIPT = """
+local updated, items = {}, {}
+for i = 2, #ARGV, 6 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        redis.call('HINCRBY', KEYS[2], 'source:' .. ARGV[i + 3], -1)
+        redis.call('HINCRBY', KEYS[2], 'source:' .. ARGV[i + 4], 1)
+        table.insert(updated, ARGV[i])
+        table.insert(items, ARGV[i + 5])
+    end
+end
+if #items > 0 then
+    redis.call('PUBLISH', ARGV[1], '{"put": [' .. table.concat(items, ', ') .. ']}')
+end
+return updated
+"""
+
 
 class RedisClient(object):
     """
     Asynchronous Redis client
 
-    Proxies are stored in a Redis hash:
-    Key is ip:port, value is a JSON string of proxy attributes
+    Proxies are stored in Redis hashes:
+    Key is ip:port, value is the proxy attributes encoded by the configured serializer
+
+    With shards=1 the hash is the table name itself, with shards=N the records are
+    partitioned by crc32(proxy) % N over the hashes <name>:0 .. <name>:N-1, so on a
+    Redis Cluster every shard can live on a different node.
+
+    Valid proxies of a shard are also indexed in Redis sets bound to its hash by a hash tag:
+    {shard}:valid, {shard}:valid:https and {shard}:valid:type:<type>
+    and every proxy is scored by its next check time in the zset {shard}:due.
+    Counters for getCount are kept in the hash {shard}:stats.
+    Recently failed proxies are scored by the end of their ban in the zset {shard}:dead,
+    their failures in a row are counted in the hash {shard}:dead:strikes.
+    Every change is published on the channel {name}:events as
+    {"put": [proxy attributes dicts]}, {"delete": [proxy strings]} or {"reset": true}
     """
 
+    # subscribe() yields the change events
+    supportsEvents = True
+
     def __init__(self, **kwargs):
         """
         Initialize the Redis client
-        :param kwargs: connection parameters (host, port, password, db, etc.)
+        :param kwargs: connection parameters (host, port, password, db, etc.),
+                       cluster for a Redis Cluster, shards for the number of hashes per table
         """
         self.name = ""
         kwargs.pop("username", None)  # Remove username if present
+        self.__serializer = getSerializer(kwargs.pop("serializer", "json"))
+        self.__shards = max(int(kwargs.pop("shards", 1) or 1), 1)
 
         # Remove 'password' key if the value is None or empty string
         # if 'password' in kwargs and not kwargs['password']:
         #     kwargs.pop('password')
 
-        self.__conn = Redis(
-            connection_pool=BlockingConnectionPool(
-                decode_responses=True,
-                timeout=5,
-                socket_timeout=5,
-                **kwargs
+        if kwargs.pop("cluster", False):
+            # a cluster has no numbered databases
+            kwargs.pop("db", None)
+            self.__conn = RedisCluster(decode_responses=True, socket_timeout=5, **kwargs)
+        else:
+            self.__conn = Redis(
+                connection_pool=BlockingConnectionPool(
+                    decode_responses=True,
+                    timeout=5,
+                    socket_timeout=5,
+                    **kwargs
+                )
             )
-        )
+        self.__pop_script = self.__conn.register_script(POP_SCRIPT)
+        self.__claim_script = self.__conn.register_script(CLAIM_SCRIPT)
+        self.__replace_script = self.__conn.register_script(REPLACE_SCRIPT)
+        self.__write_script = self.__conn.register_script(WRITE_SCRIPT)
+        self.__delete_script = self.__conn.register_script(DELETE_SCRIPT)
+        self.__source_script = self.__conn.register_script(SOURCE_SCRIPT)
 
-    async def get(self, type=''):
+    @property
+    def shards(self):
         """
-        Return a proxy
-        :param https: whether to return an HTTPS proxy
-        :return: proxy JSON string or None
+        Hash names of the current table
+        :return: list of hash names
         """
-        try:
-            items = [json.loads(x) for x in await self.__conn.hvals(self.name)]
-            items = [x for x in items if x.get("last_status") and x.get("outbound_ip")]
+        if self.__shards == 1:
+            return [self.name]
+        return ["%s:%d" % (self.name, i) for i in range(self.__shards)]
+
+    def __shard(self, proxy_str):
+        """
+        Hash a proxy is stored in
+        :param proxy_str: proxy string
+        :return: hash name
+        """
+        if self.__shards == 1:
+            return self.name
+        return "%s:%d" % (self.name, zlib.crc32(proxy_str.encode("utf-8")) % self.__shards)
+
+    def __groupByShard(self, items, proxy_str=lambda item: item):
+        """
+        Split items by the hash their proxy is stored in
+        :param items: proxy strings or objects
+        :param proxy_str: proxy string of an item
+        :return: dict of hash name to list of items
+        """
+        groups = collections.defaultdict(list)
+        for item in items:
+            groups[self.__shard(proxy_str(item))].append(item)
+        return groups
+
+    @staticmethod
+    def __key(shard, *parts):
+        """
+        Name of an auxiliary key bound to a hash
+        :param shard: hash name
+        :param parts: key suffix parts
+        :return: key name
+        """
+        return ":".join(("{%s}" % shard,) + parts)
+
+    @property
+    def __channel(self):
+        return "{%s}:events" % self.name
+
+    @staticmethod
+    def isValid(item):
+        """
+        Whether a proxy record is usable
+        :param item: proxy attributes dict
+        :return: True/False
+        """
+        return bool(item.get("last_status") and item.get("outbound_ip"))
+
+    def __indexKeys(self, shard, item):
+        """
+        Index sets a proxy record belongs to
+        :param shard: hash name
+        :param item: proxy attributes dict
+        :return: set of key names
+        """
+        if not self.isValid(item):
+            return set()
+        keys = {self.__key(shard, "valid"), self.__key(shard, "valid", "type", item.get("type", ""))}
+        if item.get("https"):
+            keys.add(self.__key(shard, "valid", "https"))
+        return keys
+
+    def __countFields(self, item):
+        """
+        Stats fields a proxy record counts towards
+        :param item: proxy attributes dict
+        :return: list of field names
+        """
+        fields = ["total", "source:%s" % item.get("source", "")]
+        if self.isValid(item):
+            fields.append("valid")
+        return fields
+
+    def __selectKey(self, shard, type):
+        """
+        Index set to pick a proxy from
+        :param shard: hash name
+        :param type: 'https' for https support, a proxy type such as 'socks5', or '' for any
+        :return: key name
+        """
+        if not type:
+            return self.__key(shard, "valid")
+        if type == "https":
+            return self.__key(shard, "valid", "https")
+        return self.__key(shard, "valid", "type", type)
 
-            if type:
-                items = list(filter(lambda x: x.get("type") == type, items))
+    def __randomShards(self):
+        """
+        Hashes in random order, records are spread evenly so trying them in turn
+        picks close to uniformly over all proxies
+        :return: list of hash names
+        """
+        shards = self.shards
+        random.shuffle(shards)
+        return shards
 
-            return choice(items) if items else None
+    async def get(self, type=''):
+        """
+        Return a random valid proxy
+        :param type: 'https' for https support, a proxy type such as 'socks5', or '' for any
+        :return: proxy attributes dict or None
+        """
+        try:
+            for shard in self.__randomShards():
+                key = self.__selectKey(shard, type)
+                for _ in range(3):
+                    proxy = await self.__conn.srandmember(key)
+                    if not proxy:
+                        break
+                    item = await self.__conn.hget(shard, proxy)
+                    if item:
+                        return loads(item)
+                    # index entry outlived its record
+                    await self.__conn.srem(key, proxy)
+            return None
         except Exception as e:
             log = LogHandler('redis_client')
             log.error(f"Error getting proxy: {e}", exc_info=True)
             return None
 
+    def __scriptKeys(self, shard):
+        """
+        KEYS of the write and delete scripts
+        :param shard: hash name
+        :return: list of key names
+        """
+        return [shard, self.__key(shard, "due"), self.__key(shard, "stats"),
+                self.__key(shard, "valid"), self.__key(shard, "valid", "https")]
+
+    def __scriptArgs(self, shard, event):
+        """
+        Leading ARGV of the write and delete scripts
+        :param shard: hash name
+        :param event: change event the script publishes
+        :return: list of arguments
+        """
+        return [self.__key(shard, "valid", "type", ""), SOURCE_INDEX, HTTPS_INDEX, OUTBOUND_IP_INDEX,
+                LAST_STATUS_INDEX, self.__channel, json.dumps(event)]
+
+    async def __write(self, shard, proxy_objs):
+        """
+        Write proxies of one hash and keep its index sets and counters up to date in one script
+        :param shard: hash name
+        :param proxy_objs: list of Proxy objects, the last one wins for duplicates
+        :return: list of HSET replies, 1 for a new proxy and 0 for an updated one
+        """
+        proxy_objs = list({proxy_obj.proxy: proxy_obj for proxy_obj in proxy_objs}.values())
+        args = self.__scriptArgs(shard, {"put": [proxy_obj.to_dict for proxy_obj in proxy_objs]})
+        for proxy_obj in proxy_objs:
+            item = proxy_obj.to_dict
+            args += [proxy_obj.proxy, self.__serializer.dumps(item), proxy_obj.due_time,
+                     int(self.isValid(item)), int(bool(item.get("https"))), item.get("source", "")]
+        return await self.__write_script(keys=self.__scriptKeys(shard), args=args, client=self.__conn)
+
     async def put(self, proxy_obj):
         """
         Put a proxy into the hash
@@ -68,22 +434,41 @@ class RedisClient(object):
         :return:
         """
         try:
-            data = await self.__conn.hset(self.name, proxy_obj.proxy, proxy_obj.to_json)
-            return data
+            return (await self.__write(self.__shard(proxy_obj.proxy), [proxy_obj]))[0]
         except Exception as e:
             logger.error(f"Error putting proxy: {e}", exc_info=True)
             return None
 
-    async def pop(self, https):
+    async def putMany(self, proxy_objs):
         """
-        Pop a proxy
-        :param https: whether to pop an HTTPS proxy
-        :return: proxy JSON string or None
+        Put a batch of proxies into the hashes with one script call per hash
+        :param proxy_objs: list of Proxy objects
+        :return: number of new proxies
         """
-        proxy = await self.get(https)
-        if proxy:
-            await self.__conn.hdel(self.name, json.loads(proxy).get("proxy", ""))
-        return proxy if proxy else None
+        if not proxy_objs:
+            return 0
+        try:
+            groups = self.__groupByShard(proxy_objs, lambda proxy_obj: proxy_obj.proxy)
+            results = await asyncio.gather(*[self.__write(shard, group) for shard, group in groups.items()])
+            return sum(sum(result) for result in results)
+        except Exception as e:
+            logger.error(f"Error putting {len(proxy_objs)} proxies: {e}", exc_info=True)
+            return None
+
+    async def pop(self, type=''):
+        """
+        Atomically take a random valid proxy out of the pool
+        :param type: 'https' for https support, a proxy type such as 'socks5', or '' for any
+        :return: proxy attributes dict or None
+        """
+        for shard in self.__randomShards():
+            keys = [shard, self.__selectKey(shard, type), self.__key(shard, "valid"),
+                    self.__key(shard, "valid", "https"), self.__key(shard, "due"), self.__key(shard, "stats")]
+            args = [self.__key(shard, "valid", "type", ""), SOURCE_INDEX, self.__channel]
+            item = await self.__pop_script(keys=keys, args=args, client=self.__conn)
+            if item:
+                return loads(item)
+        return None
 
     async def delete(self, proxy_str):
         """
@@ -91,7 +476,42 @@ class RedisClient(object):
         :param proxy_str: proxy string
         :return:
         """
-        return await self.__conn.hdel(self.name, proxy_str)
+        return await self.deleteMany([proxy_str])
+
+    async def __deleteMany(self, shard, proxy_strs):
+        """
+        Remove a batch of proxies of one hash in one script
+        :param shard: hash name
+        :param proxy_strs: list of proxy strings
+        :return: number of removed proxies
+        """
+        args = self.__scriptArgs(shard, {"delete": list(proxy_strs)}) + list(proxy_strs)
+        return await self.__delete_script(keys=self.__scriptKeys(shard), args=args, client=self.__conn)
+
+    async def deleteMany(self, proxy_strs):
+        """
+        Remove a batch of proxies, one transaction per hash
+        :param proxy_strs: list of proxy strings
+        :return: number of removed proxies
+        """
+        if not proxy_strs:
+            return 0
+        groups = self.__groupByShard(proxy_strs)
+        return sum(await asyncio.gather(*[self.__deleteMany(shard, group) for shard, group in groups.items()]))
+
+    async def claimDue(self, count, lease):
+        """
+        Claim proxies whose next check time has passed, earliest first within each hash
+        :param count: max number of proxies to claim, split evenly over the hashes and rounded up
+        :param lease: seconds before an unfinished claim becomes due again
+        :return: list of proxy attributes dicts
+        """
+        now = time.time()
+        per_shard = -(-count // self.__shards)
+        results = await asyncio.gather(*[self.__claim_script(keys=[self.__key(shard, "due"), shard],
+                                                             args=[now, lease, per_shard], client=self.__conn)
+                                         for shard in self.shards])
+        return [loads(item) for items in results for item in items]
 
     async def exists(self, proxy_str):
         """
@@ -100,18 +520,69 @@ class RedisClient(object):
         :return: True if exists, False otherwise
         """
         try:
-            return await self.__conn.hexists(self.name, proxy_str)
+            return await self.__conn.hexists(self.__shard(proxy_str), proxy_str)
         except redis.ConnectionError as e:
             logger.error(f"Redis connection error: {e}")
             return False
 
+    async def getMany(self, proxy_strs):
+        """
+        Return the stored records of proxies with one HMGET per hash
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to attributes dict, missing proxies left out
+        """
+        if not proxy_strs:
+            return {}
+        groups = self.__groupByShard(proxy_strs)
+        shards = list(groups)
+        results = await asyncio.gather(*[self.__conn.hmget(shard, groups[shard]) for shard in shards])
+        return {proxy: loads(item) for shard, items in zip(shards, results)
+                for proxy, item in zip(groups[shard], items) if item}
+
+    async def __addSources(self, shard, sources):
+        """
+        Add sources to the records of one hash with a compare and set script
+        :param shard: hash name
+        :param sources: dict of proxy string to source string
+        :return: list of the proxies in the hash
+        """
+        proxy_strs = list(sources)
+        known, args = [], [self.__channel]
+        for proxy_str, item in zip(proxy_strs, await self.__conn.hmget(shard, proxy_strs)):
+            if not item:
+                continue
+            known.append(proxy_str)
+            record = loads(item)
+            source = record.get("source", "")
+            merged = Proxy.merge_sources(source, sources[proxy_str])
+            if merged != source:
+                record["source"] = merged
+                args += [proxy_str, item, self.__serializer.dumps(record), source, merged, json.dumps(record)]
+        if len(args) > 1:
+            await self.__source_script(keys=[shard, self.__key(shard, "stats")], args=args, client=self.__conn)
+        return known
+
+    async def addSources(self, sources):
+        """
+        Add sources to the records of proxies already stored, nothing else of a record is written
+        :param sources: dict of proxy string to source string
+        :return: list of the proxies already stored
+        """
+        if not sources:
+            return []
+        groups = self.__groupByShard(list(sources))
+        results = await asyncio.gather(*[self.__addSources(shard, {proxy_str: sources[proxy_str]
+                                                                   for proxy_str in group})
+                                         for shard, group in groups.items()])
+        return [proxy_str for known in results for proxy_str in known]
+
     async def update(self, proxy_obj):
         """
         Update proxy attributes
         :param proxy_obj: Proxy object
         :return:
         """
-        return await self.__conn.hset(self.name, proxy_obj.proxy, proxy_obj.to_json)
+        return await self.put(proxy_obj)
 
     async def getAll(self):
         """
@@ -119,36 +590,263 @@ class RedisClient(object):
         :param https: whether to return only HTTPS proxies
         :return: list of proxies
         """
-        items = await self.__conn.hvals(self.name)
-        return [json.loads(item) for item in items]
+        results = await asyncio.gather(*[self.__conn.hvals(shard) for shard in self.shards])
+        return [loads(item) for items in results for item in items]
+
+    async def scan(self, cursor=0, count=500, **kwargs):
+        """
+        Return one HSCAN page of proxies, the hashes are scanned one after another
+        :param cursor: cursor returned by the previous page, 0 to start
+        :param count: page size hint
+        :param kwargs: type/source/valid filters, not applied here, callers filter the page
+        :return: (next cursor, list of proxy attributes dicts), next cursor is 0 at the end
+        """
+        # cursor = HSCAN cursor * shards + index of the hash being scanned
+        cursor = int(cursor or 0)
+        if cursor < 0:
+            raise ValueError("invalid cursor %d" % cursor)
+        shard_cursor, index = divmod(cursor, self.__shards)
+        shard_cursor, items = await self.__conn.hscan(self.shards[index], cursor=shard_cursor, count=count)
+        if shard_cursor:
+            next_cursor = shard_cursor * self.__shards + index
+        else:
+            next_cursor = index + 1 if index + 1 < self.__shards else 0
+        return next_cursor, [loads(item) for item in items.values()]
+
+    async def __auxKeys(self, shard, pattern="*"):
+        """
+        Auxiliary keys of a hash matching a pattern
+        :param shard: hash name
+        :param pattern: key suffix pattern
+        :return: list of key names
+        """
+        return [key async for key in self.__conn.scan_iter(match=self.__key(shard, pattern))]
 
     async def clear(self):
         """
-        Clear all proxies
+        Clear all proxies and their index sets
         :return:
         """
-        return await self.__conn.delete(self.name)
+        result = 0
+        for shard in self.shards:
+            result += await self.__conn.delete(shard, *await self.__auxKeys(shard))
+        await self.__conn.publish(self.__channel, json.dumps({"reset": True}))
+        return result
 
-    async def getCount(self):
+    async def subscribe(self):
+        """
+        Yield change events of the current table until the subscription drops,
+        starting with {"reset": true} once subscribed
+        :return: async generator of event dicts
+        """
+        pubsub = self.__conn.pubsub()
+        try:
+            await pubsub.subscribe(self.__channel)
+            async for message in pubsub.listen():
+                if message["type"] == "subscribe":
+                    yield {"reset": True}
+                elif message["type"] == "message":
+                    yield json.loads(message["data"])
+        finally:
+            await pubsub.aclose()
+
+    async def __reindex(self, shard):
+        """
+        Rebuild the index sets, the check due zset and the counters of one hash
+        :param shard: hash name
+        :return: number of indexed records
+        """
+        members = collections.defaultdict(list)
+        due = dict()
+        counts = collections.Counter()
+        async for proxy, item in self.__conn.hscan_iter(shard, count=1000):
+            item = loads(item)
+            due[proxy] = Proxy.createFromJson(item).due_time
+            counts.update(self.__countFields(item))
+            for key in self.__indexKeys(shard, item):
+                members[key].append(proxy)
+
+        due_key = self.__key(shard, "due")
+        async with self.__conn.pipeline(transaction=False) as pipe:
+            for key, proxies in members.items():
+                pipe.delete(key + ":tmp")
+                for i in range(0, len(proxies), 1000):
+                    pipe.sadd(key + ":tmp", *proxies[i:i + 1000])
+            pipe.delete(due_key + ":tmp")
+            proxies = list(due)
+            for i in range(0, len(proxies), 1000):
+                pipe.zadd(due_key + ":tmp", {proxy: due[proxy] for proxy in proxies[i:i + 1000]})
+            await pipe.execute()
+
+        stale = [key for key in await self.__auxKeys(shard, "valid*")
+                 if key not in members and not key.endswith(":tmp")]
+        async with self.__conn.pipeline(transaction=True) as pipe:
+            if stale:
+                pipe.delete(*stale)
+            for key in members:
+                pipe.rename(key + ":tmp", key)
+            if due:
+                pipe.rename(due_key + ":tmp", due_key)
+            else:
+                pipe.delete(due_key)
+            pipe.delete(self.__key(shard, "stats"))
+            if counts:
+                pipe.hset(self.__key(shard, "stats"), mapping=counts)
+            await pipe.execute()
+        return len(due)
+
+    async def reindex(self):
+        """
+        Rebuild the index sets, the check due zsets and the counters from the proxy hashes
+        :return: number of indexed records
+        """
+        return sum(await asyncio.gather(*[self.__reindex(shard) for shard in self.shards]))
+
+    async def __rehome(self):
+        """
+        Move the records of the unsharded hash into the shards after shards was raised
+        :return: number of moved records
+        """
+        count = 0
+        cursor = 0
+        while True:
+            cursor, items = await self.__conn.hscan(self.name, cursor=cursor, count=1000)
+            await self.putMany([Proxy.createFromJson(loads(item)) for item in items.values()])
+            count += len(items)
+            if not cursor:
+                break
+        if count:
+            await self.__conn.delete(self.name, *await self.__auxKeys(self.name))
+        return count
+
+    async def migrate(self):
         """
-        Return the count of proxies
-        :return: dict with total and https counts
+        Rewrite records stored with another serializer, safe to run while the pool is in use,
+        with several shards records still in the unsharded hash are moved into them
+        :return: number of rewritten records
         """
-        proxies = await self.getAll()
-        valid_count = 0
-        sources = collections.defaultdict(int)
+        count = await self.__rehome() if self.__shards > 1 else 0
+        for shard in self.shards:
+            cursor = 0
+            while True:
+                cursor, items = await self.__conn.hscan(shard, cursor=cursor, count=1000)
+                async with self.__conn.pipeline(transaction=False) as pipe:
+                    for proxy, item in items.items():
+                        if detect(item) is not self.__serializer:
+                            new = self.__serializer.dumps(loads(item))
+                            await self.__replace_script(keys=[shard], args=[proxy, item, new], client=pipe)
+                    count += sum(await pipe.execute())
+                if not cursor:
+                    break
+        return count
 
-        for proxy in proxies:
-            if proxy.get("last_status") and proxy.get("outbound_ip"):
-                valid_count += 1
-            sources[proxy.get("source")] += 1
+    async def getCount(self):
+        """
+        Return the count of proxies from the maintained counters of all hashes
+        :return: dict with total, valid and per source counts
+        """
+        stats = collections.Counter()
+        for shard_stats in await asyncio.gather(*[self.__conn.hgetall(self.__key(shard, "stats"))
+                                                  for shard in self.shards]):
+            stats.update({field: int(value) for field, value in shard_stats.items()})
+        sources = dict()
+        for field, value in stats.items():
+            if field.startswith("source:") and value > 0:
+                sources[field[len("source:"):]] = value
 
         return {
-            'total': len(proxies),
-            'valid': valid_count,
+            'total': stats["total"],
+            'valid': stats["valid"],
             'sources': sources
         }
 
+    async def __getDead(self, shard, proxy_strs):
+        async with self.__conn.pipeline(transaction=False) as pipe:
+            pipe.zmscore(self.__key(shard, "dead"), proxy_strs)
+            pipe.hmget(self.__key(shard, "dead", "strikes"), proxy_strs)
+            expiries, strikes = await pipe.execute()
+        return {proxy: (expiry, int(count or 1))
+                for proxy, expiry, count in zip(proxy_strs, expiries, strikes) if expiry is not None}
+
+    async def getDead(self, proxy_strs):
+        """
+        Negative cache entries of proxies, expired ones included
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to (expiry timestamp, strikes)
+        """
+        if not proxy_strs:
+            return {}
+        groups = self.__groupByShard(proxy_strs)
+        entries = dict()
+        for result in await asyncio.gather(*[self.__getDead(shard, group) for shard, group in groups.items()]):
+            entries.update(result)
+        return entries
+
+    async def __putDead(self, shard, entries):
+        async with self.__conn.pipeline(transaction=True) as pipe:
+            pipe.zadd(self.__key(shard, "dead"), {proxy: expiry for proxy, (expiry, _) in entries.items()})
+            pipe.hset(self.__key(shard, "dead", "strikes"),
+                      mapping={proxy: strikes for proxy, (_, strikes) in entries.items()})
+            await pipe.execute()
+
+    async def putDead(self, entries):
+        """
+        Add or renew negative cache entries
+        :param entries: dict of proxy string to (expiry timestamp, strikes)
+        :return:
+        """
+        if not entries:
+            return
+        groups = self.__groupByShard(entries)
+        await asyncio.gather(*[self.__putDead(shard, {proxy: entries[proxy] for proxy in group})
+                               for shard, group in groups.items()])
+
+    async def __deleteDead(self, shard, proxy_strs):
+        async with self.__conn.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.__key(shard, "dead"), *proxy_strs)
+            pipe.hdel(self.__key(shard, "dead", "strikes"), *proxy_strs)
+            removed, _ = await pipe.execute()
+        return removed
+
+    async def deleteDead(self, proxy_strs):
+        """
+        Remove proxies from the negative cache
+        :param proxy_strs: list of proxy strings
+        :return: number of removed entries
+        """
+        if not proxy_strs:
+            return 0
+        groups = self.__groupByShard(proxy_strs)
+        return sum(await asyncio.gather(*[self.__deleteDead(shard, group) for shard, group in groups.items()]))
+
+    async def listDead(self, after):
+        """
+        Proxies of the negative cache whose ban ends after a time
+        :param after: timestamp
+        :return: list of proxy strings
+        """
+        results = await asyncio.gather(*[self.__conn.zrangebyscore(self.__key(shard, "dead"), "(%f" % after, "+inf")
+                                         for shard in self.shards])
+        return [proxy for proxies in results for proxy in proxies]
+
+    async def __purgeDead(self, shard, before):
+        dead_key = self.__key(shard, "dead")
+        async with self.__conn.pipeline(transaction=True) as pipe:
+            pipe.zrangebyscore(dead_key, "-inf", "(%f" % before)
+            pipe.zremrangebyscore(dead_key, "-inf", "(%f" % before)
+            proxies, _ = await pipe.execute()
+        for i in range(0, len(proxies), 1000):
+            await self.__conn.hdel(self.__key(shard, "dead", "strikes"), *proxies[i:i + 1000])
+        return len(proxies)
+
+    async def purgeDead(self, before):
+        """
+        Forget negative cache entries whose ban ended before a time
+        :param before: timestamp
+        :return: number of removed entries
+        """
+        return sum(await asyncio.gather(*[self.__purgeDead(shard, before) for shard in self.shards]))
+
     def changeTable(self, name):
         """
         Change the Redis hash name (table)
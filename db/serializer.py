@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     serializer.py
+   Description :   Proxy record encodings
+   Author :        JHao
+   Date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: json and compact positional encodings
+                   2026/10/18: orjson when installed
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+from util import fastJson
+
+# Field order of the compact encoding. Only append new fields at the end,
+# records written before keep decoding with defaults for the missing tail.
+FIELDS = (
+    ("proxy", ""),
+    ("https", False),
+    ("outbound_ip", ""),
+    ("fail_count", 0),
+    ("region", ""),
+    ("anonymous", ""),
+    ("source", ""),
+    ("check_count", 0),
+    ("last_status", ""),
+    ("last_time", ""),
+    ("next_time", ""),
+    ("history", ""),
+    ("latency", 0),
+    ("timings", {}),
+)
+
+# 1-based positions of fields in a compact record, for Lua scripts
+SOURCE_INDEX = [name for name, _ in FIELDS].index("source") + 1
+HTTPS_INDEX = [name for name, _ in FIELDS].index("https") + 1
+OUTBOUND_IP_INDEX = [name for name, _ in FIELDS].index("outbound_ip") + 1
+LAST_STATUS_INDEX = [name for name, _ in FIELDS].index("last_status") + 1
+
+
+class JsonSerializer(object):
+    """ JSON object keyed by attribute name, the historical format """
+
+    name = "json"
+
+    @staticmethod
+    def dumps(item):
+        return fastJson.dumps(item)
+
+    @staticmethod
+    def loads(data):
+        return fastJson.loads(data)
+
+
+class CompactSerializer(object):
+    """
+    JSON array of attribute values in FIELDS order
+
+    type/ip/port are derived from proxy, so they are not stored.
+    """
+
+    name = "compact"
+
+    @staticmethod
+    def dumps(item):
+        return fastJson.dumps([item.get(name, default) for name, default in FIELDS])
+
+    @staticmethod
+    def loads(data):
+        values = fastJson.loads(data)
+        values += [default for _, default in FIELDS[len(values):]]
+        proxy_type, ip, port = values[0].split(":")
+        # same key order as Proxy.to_dict
+        item = {"proxy": values[0], "https": values[1], "type": proxy_type, "ip": ip.replace("//", ""), "port": port}
+        item.update((name, value) for (name, _), value in zip(FIELDS[2:], values[2:]))
+        return item
+
+
+SERIALIZERS = {serializer.name: serializer for serializer in (JsonSerializer, CompactSerializer)}
+
+
+def getSerializer(name):
+    """
+    Serializer by name
+    :param name: json/compact
+    :return: serializer class
+    """
+    assert name in SERIALIZERS, 'Not support serializer: {}'.format(name)
+    return SERIALIZERS[name]
+
+
+def detect(data):
+    """
+    Serializer a stored record was written with
+    :param data: encoded record
+    :return: serializer class
+    """
+    return CompactSerializer if data[:1] == "[" else JsonSerializer
+
+
+def loads(data):
+    """
+    Decode a record written with any of the serializers
+    :param data: encoded record
+    :return: proxy attributes dict
+    """
+    return detect(data).loads(data)
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     sqliteClient.py
+   Description :   Embedded SQLite client
+   Author :        JHao
+   Date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: SQLite backend with queries pushed down to SQL
+                   2026/10/18: Negative cache table of recently failed proxies
+                   2026/10/18: Explicit transactions on the autocommit connection
+                   2026/10/18: addSources in one transaction
+                   2026/10/18: reindex/migrate skip rows changed since they were read
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import sqlite3
+import asyncio
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from helper.proxy import Proxy
+from handler.logHandler import LogHandler
+from db.serializer import getSerializer, detect, loads
+
+
+class SqliteClient(object):
+    """
+    Asynchronous SQLite client, same interface as RedisClient
+
+    One table per name holds the encoded record in `data` next to the columns
+    the queries filter on, each with an index, so filters, random picks and
+    counts run inside SQLite. All statements run on a single worker thread
+    owning the connection, a batch is one BEGIN IMMEDIATE transaction. Recently
+    failed proxies are kept in <name>_dead with the end of their ban and their
+    failures in a row.
+    """
+
+    # 没有变更事件, subscribe()返回None
+    supportsEvents = False
+
+    COLUMNS = ("proxy", "type", "https", "valid", "source", "last_time", "due", "data")
+
+    def __init__(self, **kwargs):
+        """
+        init
+        :param path: database file, created if missing
+        :param serializer: record encoding
+        """
+        self.name = ""
+        self.path = kwargs.get("path") or "proxy.db"
+        self.__serializer = getSerializer(kwargs.get("serializer", "json"))
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self.__conn = None
+        self.__tables = set()
+
+    def __connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    @contextmanager
+    def __transaction(conn):
+        """
+        one transaction on an autocommit connection, BEGIN IMMEDIATE takes the write lock
+        up front so a read and the write depending on it are not split by another process
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def __table(self):
+        """ connection on the worker thread, with the current table created """
+        if self.__conn is None:
+            self.__conn = self.__connect()
+        if self.name not in self.__tables:
+            table = self.name
+            self.__conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS "{table}" (
+                    proxy TEXT PRIMARY KEY, type TEXT, https INTEGER, valid INTEGER,
+                    source TEXT, last_time TEXT, due INTEGER, data TEXT);
+                CREATE INDEX IF NOT EXISTS "{table}_type" ON "{table}" (valid, type);
+                CREATE INDEX IF NOT EXISTS "{table}_https" ON "{table}" (valid, https);
+                CREATE INDEX IF NOT EXISTS "{table}_source" ON "{table}" (source);
+                CREATE INDEX IF NOT EXISTS "{table}_last_time" ON "{table}" (last_time);
+                CREATE INDEX IF NOT EXISTS "{table}_due" ON "{table}" (due);
+                CREATE TABLE IF NOT EXISTS "{table}_dead" (proxy TEXT PRIMARY KEY, expiry REAL, strikes INTEGER);
+                CREATE INDEX IF NOT EXISTS "{table}_dead_expiry" ON "{table}_dead" (expiry);
+            """)
+            self.__tables.add(table)
+        return self.__conn
+
+    async def __run(self, func, *args):
+        """ run func(conn, *args) on the worker thread """
+        def call():
+            return func(self.__table(), *args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, call)
+
+    @staticmethod
+    def isValid(item):
+        return bool(item.get("last_status") and item.get("outbound_ip"))
+
+    def __row(self, item, due):
+        return (item["proxy"], item.get("type", ""), int(bool(item.get("https"))), int(self.isValid(item)),
+                item.get("source", ""), item.get("last_time", ""), int(due), self.__serializer.dumps(item))
+
+    @staticmethod
+    def __where(type='', source='', valid=False):
+        """ SQL condition and parameters of the /all filters """
+        conditions, params = [], []
+        if type == "https":
+            conditions.append("https = 1")
+        elif type:
+            conditions.append("type = ?")
+            params.append(type)
+        if source:
+            conditions.append("instr(source, ?) > 0")
+            params.append(source)
+        if valid:
+            conditions.append("valid = 1")
+        return " AND ".join(conditions) or "1", params
+
+    def __pickSql(self, type):
+        where, params = self.__where(type, valid=True)
+        sql = (f'SELECT proxy, data FROM "{self.name}" WHERE {where} LIMIT 1 OFFSET '
+               f'(SELECT abs(random()) % max(count(*), 1) FROM "{self.name}" WHERE {where})')
+        return sql, params + params
+
+    async def get(self, type=''):
+        """
+        随机返回一个可用代理
+        :return: proxy attributes dict or None
+        """
+        sql, params = self.__pickSql(type)
+
+        def pick(conn):
+            return conn.execute(sql, params).fetchone()
+
+        try:
+            row = await self.__run(pick)
+            return loads(row[1]) if row else None
+        except Exception as e:
+            log = LogHandler('sqlite_client')
+            log.error(f"Error getting proxy: {e}", exc_info=True)
+            return None
+
+    async def put(self, proxy_obj):
+        """
+        将代理放入表
+        :param proxy_obj: Proxy obj
+        :return: 1 for a new proxy, 0 for an updated one
+        """
+        return await self.putMany([proxy_obj])
+
+    async def putMany(self, proxy_objs):
+        """
+        批量放入代理, 一个事务
+        :param proxy_objs: list of Proxy obj
+        :return: number of new proxies
+        """
+        if not proxy_objs:
+            return 0
+        proxy_objs = {proxy_obj.proxy: proxy_obj for proxy_obj in proxy_objs}
+        rows = [self.__row(proxy_obj.to_dict, proxy_obj.due_time) for proxy_obj in proxy_objs.values()]
+        placeholders = ",".join("?" * len(self.COLUMNS))
+
+        def write(conn):
+            with self.__transaction(conn):
+                before = conn.execute(f'SELECT count(*) FROM "{self.name}"').fetchone()[0]
+                conn.executemany(f'INSERT OR REPLACE INTO "{self.name}" VALUES ({placeholders})', rows)
+                return conn.execute(f'SELECT count(*) FROM "{self.name}"').fetchone()[0] - before
+
+        return await self.__run(write)
+
+    async def pop(self, type=''):
+        """
+        随机弹出一个可用代理
+        :return: proxy attributes dict or None
+        """
+        sql, params = self.__pickSql(type)
+
+        def pop(conn):
+            with self.__transaction(conn):
+                row = conn.execute(sql, params).fetchone()
+                if row:
+                    conn.execute(f'DELETE FROM "{self.name}" WHERE proxy = ?', (row[0],))
+                return row
+
+        row = await self.__run(pop)
+        return loads(row[1]) if row else None
+
+    async def delete(self, proxy_str):
+        """
+        移除指定代理, 使用changeTable指定表名
+        :param proxy_str: proxy str
+        :return:
+        """
+        return await self.deleteMany([proxy_str])
+
+    async def deleteMany(self, proxy_strs):
+        """
+        批量移除代理
+        :param proxy_strs: list of proxy str
+        :return: number of removed proxies
+        """
+        if not proxy_strs:
+            return 0
+
+        def delete(conn):
+            with self.__transaction(conn):
+                return conn.executemany(f'DELETE FROM "{self.name}" WHERE proxy = ?',
+                                        [(proxy_str,) for proxy_str in proxy_strs]).rowcount
+
+        return await self.__run(delete)
+
+    async def claimDue(self, count, lease):
+        """
+        领取下次检测时间已到的代理, 并把它们的检测时间延后lease秒
+        :param count: max number of proxies
+        :param lease: seconds before an unfinished claim becomes due again
+        :return: list of proxy attributes dicts
+        """
+        def claim(conn):
+            now = int(time.time())
+            with self.__transaction(conn):
+                rows = conn.execute(f'SELECT proxy, data FROM "{self.name}" WHERE due <= ? ORDER BY due LIMIT ?',
+                                    (now, count)).fetchall()
+                conn.executemany(f'UPDATE "{self.name}" SET due = ? WHERE proxy = ?',
+                                 [(now + lease, row[0]) for row in rows])
+            return rows
+
+        return [loads(row[1]) for row in await self.__run(claim)]
+
+    async def exists(self, proxy_str):
+        """
+        判断指定代理是否存在, 使用changeTable指定表名
+        :param proxy_str: proxy str
+        :return:
+        """
+        def exists(conn):
+            return conn.execute(f'SELECT 1 FROM "{self.name}" WHERE proxy = ?', (proxy_str,)).fetchone()
+
+        return await self.__run(exists) is not None
+
+    async def getMany(self, proxy_strs):
+        """
+        返回多个代理的记录
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to attributes dict, 不存在的不返回
+        """
+        def select(conn):
+            rows = []
+            for i in range(0, len(proxy_strs), 500):
+                chunk = proxy_strs[i:i + 500]
+                rows += conn.execute(f'SELECT proxy, data FROM "{self.name}" '
+                                     f'WHERE proxy IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+            return rows
+
+        if not proxy_strs:
+            return {}
+        return {proxy: loads(data) for proxy, data in await self.__run(select)}
+
+    async def addSources(self, sources):
+        """
+        给已有代理追加来源, 读和写在一个事务中
+        :param sources: dict of proxy string to source string
+        :return: list of the proxies already stored
+        """
+        proxy_strs = list(sources)
+
+        def merge(conn):
+            with self.__transaction(conn):
+                rows = []
+                for i in range(0, len(proxy_strs), 500):
+                    chunk = proxy_strs[i:i + 500]
+                    rows += conn.execute(f'SELECT proxy, data FROM "{self.name}" '
+                                         f'WHERE proxy IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+                updates = []
+                for proxy, data in rows:
+                    record = loads(data)
+                    source = record.get("source", "")
+                    merged = Proxy.merge_sources(source, sources[proxy])
+                    if merged != source:
+                        record["source"] = merged
+                        updates.append((merged, self.__serializer.dumps(record), proxy))
+                conn.executemany(f'UPDATE "{self.name}" SET source = ?, data = ? WHERE proxy = ?', updates)
+            return [row[0] for row in rows]
+
+        if not proxy_strs:
+            return []
+        return await self.__run(merge)
+
+    async def update(self, proxy_obj):
+        """
+        更新 proxy 属性
+        :param proxy_obj:
+        :return:
+        """
+        return await self.put(proxy_obj)
+
+    async def getAll(self):
+        """
+        字典形式返回所有代理, 使用changeTable指定表名
+        :return:
+        """
+        def select(conn):
+            return conn.execute(f'SELECT data FROM "{self.name}"').fetchall()
+
+        return [loads(row[0]) for row in await self.__run(select)]
+
+    async def scan(self, cursor="", count=500, type='', source='', valid=False):
+        """
+        返回一页符合条件的代理
+        :param cursor: 上一页返回的cursor, 起始为""或"0"
+        :param count: page size
+        :param type: 'https', a proxy type or ''
+        :param source: substring of the source
+        :param valid: only valid proxies
+        :return: (next cursor, list of proxy attributes dicts), next cursor is "" at the end
+        """
+        start = "" if cursor in (None, "", "0", 0) else cursor
+        where, params = self.__where(type, source, valid)
+
+        def select(conn):
+            return conn.execute(f'SELECT proxy, data FROM "{self.name}" WHERE proxy > ? AND {where} '
+                                f'ORDER BY proxy LIMIT ?', [start] + params + [count]).fetchall()
+
+        rows = await self.__run(select)
+        next_cursor = rows[-1][0] if len(rows) >= count else ""
+        return next_cursor, [loads(row[1]) for row in rows]
+
+    async def clear(self):
+        """
+        清空所有代理, 使用changeTable指定表名
+        :return:
+        """
+        def clear(conn):
+            with self.__transaction(conn):
+                conn.execute(f'DELETE FROM "{self.name}_dead"')
+                return conn.execute(f'DELETE FROM "{self.name}"').rowcount
+
+        return await self.__run(clear)
+
+    def subscribe(self):
+        """ SQLite不支持订阅, 见supportsEvents """
+        return None
+
+    async def __rewrite(self, keep):
+        """ 重新计算所有行, keep(data)为True的行跳过; 读取后被其他进程改写的行保留新的写入 """
+        columns = ", ".join("%s = ?" % column for column in self.COLUMNS[1:])
+
+        def rewrite(conn):
+            rows = []
+            for (data,) in conn.execute(f'SELECT data FROM "{self.name}"'):
+                if not keep(data):
+                    item = loads(data)
+                    row = self.__row(item, Proxy.createFromJson(item).due_time)
+                    rows.append(row[1:] + (row[0], data))
+            with self.__transaction(conn):
+                return conn.executemany(f'UPDATE "{self.name}" SET {columns} WHERE proxy = ? AND data = ?',
+                                        rows).rowcount
+
+        return await self.__run(rewrite)
+
+    async def reindex(self):
+        """
+        根据记录重新计算用于查询的列
+        :return: number of indexed records
+        """
+        return await self.__rewrite(lambda data: False)
+
+    async def migrate(self):
+        """
+        按配置的serializer重写记录
+        :return: number of rewritten records
+        """
+        return await self.__rewrite(lambda data: detect(data) is self.__serializer)
+
+    async def getCount(self):
+        """
+        返回代理数量
+        :return:
+        """
+        def count(conn):
+            return conn.execute(f'SELECT source, count(*), sum(valid) FROM "{self.name}" GROUP BY source').fetchall()
+
+        rows = await self.__run(count)
+        return {
+            'total': sum(row[1] for row in rows),
+            'valid': sum(row[2] for row in rows),
+            'sources': {row[0]: row[1] for row in rows}
+        }
+
+    async def getDead(self, proxy_strs):
+        """
+        负缓存中的代理, 包括已过期的
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to (expiry timestamp, strikes)
+        """
+        def select(conn):
+            rows = []
+            for i in range(0, len(proxy_strs), 500):
+                chunk = proxy_strs[i:i + 500]
+                rows += conn.execute(f'SELECT proxy, expiry, strikes FROM "{self.name}_dead" '
+                                     f'WHERE proxy IN ({",".join("?" * len(chunk))})', chunk).fetchall()
+            return rows
+
+        return {proxy: (expiry, strikes) for proxy, expiry, strikes in await self.__run(select)}
+
+    async def putDead(self, entries):
+        """
+        加入或更新负缓存
+        :param entries: dict of proxy string to (expiry timestamp, strikes)
+        :return:
+        """
+        rows = [(proxy, expiry, strikes) for proxy, (expiry, strikes) in entries.items()]
+
+        def write(conn):
+            with self.__transaction(conn):
+                conn.executemany(f'INSERT OR REPLACE INTO "{self.name}_dead" VALUES (?, ?, ?)', rows)
+
+        await self.__run(write)
+
+    async def deleteDead(self, proxy_strs):
+        """
+        从负缓存移除
+        :param proxy_strs: list of proxy strings
+        :return: number of removed entries
+        """
+        def delete(conn):
+            with self.__transaction(conn):
+                return conn.executemany(f'DELETE FROM "{self.name}_dead" WHERE proxy = ?',
+                                        [(proxy_str,) for proxy_str in proxy_strs]).rowcount
+
+        return await self.__run(delete)
+
+    async def listDead(self, after):
+        """
+        负缓存中解除时间晚于after的代理
+        :param after: timestamp
+        :return: list of proxy strings
+        """
+        def select(conn):
+            return conn.execute(f'SELECT proxy FROM "{self.name}_dead" WHERE expiry > ?', (after,)).fetchall()
+
+        return [row[0] for row in await self.__run(select)]
+
+    async def purgeDead(self, before):
+        """
+        清除解除时间早于before的负缓存
+        :param before: timestamp
+        :return: number of removed entries
+        """
+        def delete(conn):
+            with self.__transaction(conn):
+                return conn.execute(f'DELETE FROM "{self.name}_dead" WHERE expiry < ?', (before,)).rowcount
+
+        return await self.__run(delete)
+
+    def changeTable(self, name):
+        """
+        切换操作对象
+        :param name:
+        :return:
+        """
+        self.name = name
+
+    async def test(self):
+        log = LogHandler('sqlite_client')
+        try:
+            await self.getCount()
+            return False
+        except sqlite3.Error as e:
+            log.error('sqlite error: %s' % str(e), exc_info=True)
+            return e
@@ -13,25 +13,160 @@
                    2017/09/27: 修改pop()方法 返回{proxy:value}字典
                    2020/07/03: 2.1.0 优化代码结构
                    2021/05/26: 区分http和https代理
+                   2026/10/18: 基于asyncio的SSDB原生协议客户端, 接口与RedisClient一致
+                   2026/10/18: 最近失效代理的负缓存
+                   2026/10/18: 取消或出错时丢弃还有未读响应的连接
+                   2026/10/18: addSources只返回已有代理, 不追加来源
 -------------------------------------------------
 """
 __author__ = 'JHao'
-from redis.exceptions import TimeoutError, ConnectionError, ResponseError
-from redis.connection import BlockingConnectionPool
+
+import time
+import zlib
+import random
+import asyncio
+import collections
+
+from helper.proxy import Proxy
 from handler.logHandler import LogHandler
-from random import choice
-from redis import Redis
-import json
+from db.serializer import getSerializer, detect, loads
+
+
+class SsdbError(Exception):
+    """ SSDB返回非ok状态 """
+
+
+class SsdbConnection(object):
+    """
+    SSDB原生协议连接
+
+    请求与响应均由若干块组成, 每块为"长度\\n数据\\n", 以空行结束;
+    响应的第一块为状态: ok/not_found/error/fail/client_error
+    """
+
+    def __init__(self, host, port, password=None, timeout=5):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        if self.password:
+            await self.execute("auth", self.password)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    @staticmethod
+    def pack(*args):
+        blocks = []
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            blocks.append(b"%d\n%s\n" % (len(data), data))
+        blocks.append(b"\n")
+        return b"".join(blocks)
+
+    async def readResponse(self):
+        blocks = []
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                raise ConnectionError("ssdb connection closed")
+            if line in (b"\n", b"\r\n"):
+                break
+            data = await self._reader.readexactly(int(line) + 1)
+            blocks.append(data[:-1].decode("utf-8"))
+        status = blocks[0] if blocks else "error"
+        if status == "ok":
+            return blocks[1:]
+        if status == "not_found":
+            return None
+        raise SsdbError("%s: %s" % (status, " ".join(blocks[1:])))
+
+    async def executeMany(self, commands):
+        """
+        管道: 一次写入全部请求再依次读取响应
+        :param commands: list of (cmd, arg, ...)
+        :return: list of responses, None for not_found
+        """
+        if not self.connected:
+            await self.connect()
+        responses, error = [], None
+        try:
+            self._writer.write(b"".join(self.pack(*command) for command in commands))
+            await self._writer.drain()
+            for _ in commands:
+                try:
+                    responses.append(await asyncio.wait_for(self.readResponse(), self.timeout))
+                except SsdbError as e:
+                    # 其余命令的响应仍要读完, 否则会被之后的请求读到
+                    error = error or e
+                    responses.append(None)
+        except BaseException:
+            # 出错或被取消时可能还有未读的响应, 连接不能再用
+            self.close()
+            raise
+        if error:
+            raise error
+        return responses
+
+    async def execute(self, *command):
+        return (await self.executeMany([command]))[0]
+
+
+class SsdbConnectionPool(object):
+    """ 最多max_connections个连接, 用尽时等待归还 """
+
+    def __init__(self, max_connections=20, **kwargs):
+        self.kwargs = kwargs
+        self._idle = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_connections)
+
+    async def executeMany(self, commands):
+        async with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                conn = SsdbConnection(**self.kwargs)
+            try:
+                return await conn.executeMany(commands)
+            finally:
+                if conn.connected:
+                    self._idle.put_nowait(conn)
+
+    async def execute(self, *command):
+        return (await self.executeMany([command]))[0]
 
 
 class SsdbClient(object):
     """
-    SSDB client
+    Asynchronous SSDB client, same interface as RedisClient
 
     SSDB中代理存放的结构为hash：
-    key为代理的ip:por, value为代理属性的字典;
+    key为代理的ip:port, value为按配置的serializer编码的代理属性;
+
+    SSDB没有set/脚本/事务/订阅, 对应结构为:
+        可用代理索引为hash {name}:valid, {name}:valid:https, {name}:valid:type:<type>,
+        field为"crc32|proxy", 从随机crc32起hscan一条即为随机选取;
+        下次检测时间为zset {name}:due (整数秒);
+        计数为hash {name}:stats;
+        最近失效的代理为zset {name}:dead (解除时间, 整数秒), 连续失效次数为hash {name}:dead:strikes.
+    写入通过管道一次发送, 但不是原子的, 计数偏差可通过reindex修正.
     """
 
+    # 没有变更事件, subscribe()返回None
+    supportsEvents = False
+
     def __init__(self, **kwargs):
         """
         init
@@ -41,94 +176,429 @@ class SsdbClient(object):
         :return:
         """
         self.name = ""
-        kwargs.pop("username")
-        self.__conn = Redis(connection_pool=BlockingConnectionPool(decode_responses=True,
-                                                                   timeout=5,
-                                                                   socket_timeout=5,
-                                                                   **kwargs))
+        kwargs.pop("username", None)
+        kwargs.pop("db", None)
+        self.__serializer = getSerializer(kwargs.pop("serializer", "json"))
+        self.__conn = SsdbConnectionPool(host=kwargs.get("host"), port=kwargs.get("port"),
+                                         password=kwargs.get("password"), timeout=5)
+
+    def __key(self, *parts):
+        return ":".join(("{%s}" % self.name,) + parts)
+
+    @staticmethod
+    def __indexField(proxy_str):
+        """ 索引field, 按crc32前缀打散以便随机选取 """
+        return "%08x|%s" % (zlib.crc32(proxy_str.encode("utf-8")), proxy_str)
+
+    @staticmethod
+    def isValid(item):
+        return bool(item.get("last_status") and item.get("outbound_ip"))
+
+    def __indexKeys(self, item):
+        if not self.isValid(item):
+            return set()
+        keys = {self.__key("valid"), self.__key("valid", "type", item.get("type", ""))}
+        if item.get("https"):
+            keys.add(self.__key("valid", "https"))
+        return keys
+
+    def __allIndexKeys(self, proxy_str):
+        return {self.__key("valid"), self.__key("valid", "https"),
+                self.__key("valid", "type", proxy_str.split(":")[0])}
+
+    def __countFields(self, item):
+        fields = ["total", "source:%s" % item.get("source", "")]
+        if self.isValid(item):
+            fields.append("valid")
+        return fields
 
-    def get(self, https):
+    def __selectKey(self, type):
+        if not type:
+            return self.__key("valid")
+        if type == "https":
+            return self.__key("valid", "https")
+        return self.__key("valid", "type", type)
+
+    async def __randomMember(self, key):
+        """ 从索引中随机取一个代理 """
+        start = "%08x" % random.getrandbits(32)
+        for begin in (start, ""):
+            fields = await self.__conn.execute("hkeys", key, begin, "", 1)
+            if fields:
+                return fields[0].split("|", 1)[1]
+        return None
+
+    async def __multiGet(self, proxy_strs):
+        """ 按顺序返回记录, 不存在为None """
+        blocks = await self.__conn.execute("multi_hget", self.name, *proxy_strs) or []
+        found = dict(zip(blocks[::2], blocks[1::2]))
+        return [found.get(proxy_str) for proxy_str in proxy_strs]
+
+    async def get(self, type=''):
         """
-        从hash中随机返回一个代理
-        :return:
+        从索引中随机返回一个可用代理
+        :return: proxy attributes dict or None
         """
-        if https:
-            items_dict = self.__conn.hgetall(self.name)
-            proxies = list(filter(lambda x: json.loads(x).get("https"), items_dict.values()))
-            return choice(proxies) if proxies else None
-        else:
-            proxies = self.__conn.hkeys(self.name)
-            proxy = choice(proxies) if proxies else None
-            return self.__conn.hget(self.name, proxy) if proxy else None
+        key = self.__selectKey(type)
+        try:
+            for _ in range(3):
+                proxy = await self.__randomMember(key)
+                if not proxy:
+                    return None
+                item = await self.__conn.execute("hget", self.name, proxy)
+                if item:
+                    return loads(item[0])
+                await self.__conn.execute("hdel", key, self.__indexField(proxy))
+            return None
+        except Exception as e:
+            log = LogHandler('ssdb_client')
+            log.error(f"Error getting proxy: {e}", exc_info=True)
+            return None
 
-    def put(self, proxy_obj):
+    async def __write(self, proxy_objs):
+        proxy_objs = list({proxy_obj.proxy: proxy_obj for proxy_obj in proxy_objs}.values())
+        olds = await self.__multiGet([proxy_obj.proxy for proxy_obj in proxy_objs])
+        records, dues = [], []
+        adds, removes = collections.defaultdict(list), collections.defaultdict(list)
+        counts = collections.Counter()
+        new_count = 0
+        for proxy_obj, old in zip(proxy_objs, olds):
+            old = loads(old) if old else None
+            new = proxy_obj.to_dict
+            records += [proxy_obj.proxy, self.__serializer.dumps(new)]
+            dues += [proxy_obj.proxy, int(proxy_obj.due_time)]
+            old_keys = self.__indexKeys(old) if old else set()
+            new_keys = self.__indexKeys(new)
+            for key in old_keys - new_keys:
+                removes[key].append(self.__indexField(proxy_obj.proxy))
+            for key in new_keys - old_keys:
+                adds[key] += [self.__indexField(proxy_obj.proxy), 1]
+            counts.update(self.__countFields(new))
+            if old:
+                counts.subtract(self.__countFields(old))
+            else:
+                new_count += 1
+
+        commands = [("multi_hset", self.name, *records), ("multi_zset", self.__key("due"), *dues)]
+        commands += [("multi_hset", key, *fields) for key, fields in adds.items()]
+        commands += [("multi_hdel", key, *fields) for key, fields in removes.items()]
+        commands += [("hincr", self.__key("stats"), field, delta) for field, delta in counts.items() if delta]
+        await self.__conn.executeMany(commands)
+        return new_count
+
+    async def put(self, proxy_obj):
         """
         将代理放入hash
         :param proxy_obj: Proxy obj
-        :return:
+        :return: 1 for a new proxy, 0 for an updated one
+        """
+        return await self.__write([proxy_obj])
+
+    async def putMany(self, proxy_objs):
         """
-        result = self.__conn.hset(self.name, proxy_obj.proxy, proxy_obj.to_json)
-        return result
+        批量放入代理, 两次往返
+        :param proxy_objs: list of Proxy obj
+        :return: number of new proxies
+        """
+        if not proxy_objs:
+            return 0
+        return await self.__write(proxy_objs)
 
-    def pop(self, https):
+    async def pop(self, type=''):
         """
-        顺序弹出一个代理
-        :return: proxy
+        随机弹出一个可用代理, 以hdel结果判断归属, 并发时不会重复弹出
+        :return: proxy attributes dict or None
         """
-        proxy = self.get(https)
-        if proxy:
-            self.__conn.hdel(self.name, json.loads(proxy).get("proxy", ""))
-        return proxy if proxy else None
+        for _ in range(3):
+            proxy = await self.__randomMember(self.__selectKey(type))
+            if not proxy:
+                return None
+            item = await self.__conn.execute("hget", self.name, proxy)
+            removed = await self.__conn.execute("hdel", self.name, proxy)
+            await self.__removeRest([proxy], [item[0]] if item and removed == ["1"] else [])
+            if item and removed == ["1"]:
+                return loads(item[0])
+        return None
+
+    async def __removeRest(self, proxy_strs, olds):
+        """ 删除代理记录以外的索引/检测时间, 并按被删除的记录更新计数 """
+        counts = collections.Counter()
+        for old in olds:
+            counts.subtract(self.__countFields(loads(old)))
+        keys = set()
+        for proxy_str in proxy_strs:
+            keys |= self.__allIndexKeys(proxy_str)
+        fields = [self.__indexField(proxy_str) for proxy_str in proxy_strs]
+        commands = [("multi_zdel", self.__key("due"), *proxy_strs)]
+        commands += [("multi_hdel", key, *fields) for key in keys]
+        commands += [("hincr", self.__key("stats"), field, delta) for field, delta in counts.items() if delta]
+        await self.__conn.executeMany(commands)
 
-    def delete(self, proxy_str):
+    async def delete(self, proxy_str):
         """
         移除指定代理, 使用changeTable指定hash name
         :param proxy_str: proxy str
         :return:
         """
-        self.__conn.hdel(self.name, proxy_str)
+        return await self.deleteMany([proxy_str])
+
+    async def deleteMany(self, proxy_strs):
+        """
+        批量移除代理
+        :param proxy_strs: list of proxy str
+        :return: number of removed proxies
+        """
+        if not proxy_strs:
+            return 0
+        olds = [old for old in await self.__multiGet(proxy_strs) if old]
+        await self.__conn.execute("multi_hdel", self.name, *proxy_strs)
+        await self.__removeRest(proxy_strs, olds)
+        return len(olds)
 
-    def exists(self, proxy_str):
+    async def claimDue(self, count, lease):
+        """
+        领取下次检测时间已到的代理, 无脚本支持, 领取与延后不是原子的
+        :param count: max number of proxies
+        :param lease: seconds before an unfinished claim becomes due again
+        :return: list of proxy attributes dicts
+        """
+        now = int(time.time())
+        blocks = await self.__conn.execute("zscan", self.__key("due"), "", "", now, count) or []
+        proxy_strs = blocks[::2]
+        if not proxy_strs:
+            return []
+        items = await self.__multiGet(proxy_strs)
+        claimed = [proxy_str for proxy_str, item in zip(proxy_strs, items) if item]
+        gone = [proxy_str for proxy_str, item in zip(proxy_strs, items) if not item]
+        commands = []
+        if claimed:
+            commands.append(("multi_zset", self.__key("due"), *[x for p in claimed for x in (p, now + lease)]))
+        if gone:
+            commands.append(("multi_zdel", self.__key("due"), *gone))
+        await self.__conn.executeMany(commands)
+        return [loads(item) for item in items if item]
+
+    async def exists(self, proxy_str):
         """
         判断指定代理是否存在, 使用changeTable指定hash name
         :param proxy_str: proxy str
         :return:
         """
-        return self.__conn.hexists(self.name, proxy_str)
+        return await self.__conn.execute("hexists", self.name, proxy_str) == ["1"]
+
+    async def getMany(self, proxy_strs):
+        """
+        一次multi_hget返回多个代理的记录
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to attributes dict, 不存在的不返回
+        """
+        if not proxy_strs:
+            return {}
+        return {proxy_str: loads(item) for proxy_str, item in zip(proxy_strs, await self.__multiGet(proxy_strs))
+                if item}
 
-    def update(self, proxy_obj):
+    async def addSources(self, sources):
+        """
+        已有代理不追加来源: SSDB没有脚本/事务, 读写之间被删除的代理会被写回成没有索引和检测时间的记录
+        :param sources: dict of proxy string to source string
+        :return: list of the proxies already stored
+        """
+        if not sources:
+            return []
+        proxy_strs = list(sources)
+        return [proxy_str for proxy_str, item in zip(proxy_strs, await self.__multiGet(proxy_strs)) if item]
+
+    async def update(self, proxy_obj):
         """
         更新 proxy 属性
         :param proxy_obj:
         :return:
         """
-        self.__conn.hset(self.name, proxy_obj.proxy, proxy_obj.to_json)
+        return await self.put(proxy_obj)
 
-    def getAll(self, https):
+    async def getAll(self):
         """
         字典形式返回所有代理, 使用changeTable指定hash name
         :return:
         """
-        item_dict = self.__conn.hgetall(self.name)
-        if https:
-            return list(filter(lambda x: json.loads(x).get("https"), item_dict.values()))
-        else:
-            return item_dict.values()
+        return [item async for item in self.__iterAll()]
 
-    def clear(self):
+    async def scan(self, cursor="", count=500, **kwargs):
+        """
+        返回一页代理
+        :param cursor: 上一页返回的cursor, 起始为""或"0"
+        :param count: page size
+        :param kwargs: type/source/valid filters, not applied here, callers filter the page
+        :return: (next cursor, list of proxy attributes dicts), next cursor is "" at the end
+        """
+        start = "" if cursor in (None, "", "0", 0) else cursor
+        blocks = await self.__conn.execute("hscan", self.name, start, "", count) or []
+        keys, values = blocks[::2], blocks[1::2]
+        next_cursor = keys[-1] if len(keys) >= count else ""
+        return next_cursor, [loads(value) for value in values]
+
+    async def __iterAll(self, count=1000):
+        cursor = ""
+        while True:
+            cursor, items = await self.scan(cursor, count)
+            for item in items:
+                yield item
+            if not cursor:
+                break
+
+    async def __hashNames(self):
+        """ 当前表的所有辅助hash """
+        prefix = self.__key("")
+        names = await self.__conn.execute("hlist", prefix, prefix + "\xff", 1000) or []
+        return [name for name in names if name.startswith(prefix)]
+
+    async def clear(self):
         """
         清空所有代理, 使用changeTable指定hash name
         :return:
         """
-        return self.__conn.delete(self.name)
+        commands = [("hclear", self.name), ("zclear", self.__key("due")), ("zclear", self.__key("dead"))]
+        commands += [("hclear", name) for name in await self.__hashNames()]
+        return await self.__conn.executeMany(commands)
+
+    def subscribe(self):
+        """ SSDB不支持订阅, 见supportsEvents """
+        return None
 
-    def getCount(self):
+    async def reindex(self):
+        """
+        根据代理hash重建索引/检测时间/计数
+        :return: number of indexed records
+        """
+        members = collections.defaultdict(list)
+        dues, counts, total = [], collections.Counter(), 0
+        async for item in self.__iterAll():
+            total += 1
+            dues += [item["proxy"], int(Proxy.createFromJson(item).due_time)]
+            counts.update(self.__countFields(item))
+            for key in self.__indexKeys(item):
+                members[key] += [self.__indexField(item["proxy"]), 1]
+
+        # the negative cache is not derived from the records
+        commands = [("hclear", name) for name in await self.__hashNames() if name != self.__key("dead", "strikes")]
+        commands.append(("zclear", self.__key("due")))
+        for i in range(0, len(dues), 2000):
+            commands.append(("multi_zset", self.__key("due"), *dues[i:i + 2000]))
+        for key, fields in members.items():
+            for i in range(0, len(fields), 2000):
+                commands.append(("multi_hset", key, *fields[i:i + 2000]))
+        if counts:
+            commands.append(("multi_hset", self.__key("stats"), *[x for kv in counts.items() for x in kv]))
+        await self.__conn.executeMany(commands)
+        return total
+
+    async def migrate(self):
+        """
+        按配置的serializer重写记录, SSDB无脚本支持, 运行期间的并发更新可能被覆盖
+        :return: number of rewritten records
+        """
+        count, cursor = 0, ""
+        while True:
+            blocks = await self.__conn.execute("hscan", self.name, cursor, "", 1000) or []
+            records = []
+            for proxy, item in zip(blocks[::2], blocks[1::2]):
+                if detect(item) is not self.__serializer:
+                    records += [proxy, self.__serializer.dumps(loads(item))]
+            if records:
+                await self.__conn.execute("multi_hset", self.name, *records)
+                count += len(records) // 2
+            if len(blocks) < 2000:
+                break
+            cursor = blocks[-2]
+        return count
+
+    async def getCount(self):
         """
         返回代理数量
         :return:
         """
-        proxies = self.getAll(https=False)
-        return {'total': len(proxies), 'https': len(list(filter(lambda x: json.loads(x).get("https"), proxies)))}
+        blocks = await self.__conn.execute("hgetall", self.__key("stats")) or []
+        stats = dict(zip(blocks[::2], blocks[1::2]))
+        sources = dict()
+        for field, value in stats.items():
+            if field.startswith("source:") and int(value) > 0:
+                sources[field[len("source:"):]] = int(value)
+        return {
+            'total': int(stats.get("total", 0)),
+            'valid': int(stats.get("valid", 0)),
+            'sources': sources
+        }
+
+    async def getDead(self, proxy_strs):
+        """
+        负缓存中的代理, 包括已过期的
+        :param proxy_strs: list of proxy strings
+        :return: dict of proxy string to (expiry timestamp, strikes)
+        """
+        if not proxy_strs:
+            return {}
+        expiries, strikes = await self.__conn.executeMany([("multi_zget", self.__key("dead"), *proxy_strs),
+                                                           ("multi_hget", self.__key("dead", "strikes"), *proxy_strs)])
+        strikes = dict(zip(strikes[::2], strikes[1::2])) if strikes else {}
+        return {proxy: (int(expiry), int(strikes.get(proxy, 1)))
+                for proxy, expiry in zip(expiries[::2], expiries[1::2])} if expiries else {}
+
+    async def putDead(self, entries):
+        """
+        加入或更新负缓存
+        :param entries: dict of proxy string to (expiry timestamp, strikes)
+        :return:
+        """
+        if not entries:
+            return
+        expiries = [x for proxy, (expiry, _) in entries.items() for x in (proxy, int(expiry))]
+        strikes = [x for proxy, (_, count) in entries.items() for x in (proxy, count)]
+        await self.__conn.executeMany([("multi_zset", self.__key("dead"), *expiries),
+                                       ("multi_hset", self.__key("dead", "strikes"), *strikes)])
+
+    async def deleteDead(self, proxy_strs):
+        """
+        从负缓存移除
+        :param proxy_strs: list of proxy strings
+        :return: number of removed entries
+        """
+        if not proxy_strs:
+            return 0
+        removed = len(await self.getDead(proxy_strs))
+        await self.__conn.executeMany([("multi_zdel", self.__key("dead"), *proxy_strs),
+                                       ("multi_hdel", self.__key("dead", "strikes"), *proxy_strs)])
+        return removed
+
+    async def listDead(self, after):
+        """
+        负缓存中解除时间晚于after的代理
+        :param after: timestamp
+        :return: list of proxy strings
+        """
+        proxies, key_start, score_start = [], "", int(after) + 1
+        while True:
+            blocks = await self.__conn.execute("zscan", self.__key("dead"), key_start, score_start, "", 1000) or []
+            proxies += blocks[::2]
+            if len(blocks) < 2000:
+                return proxies
+            key_start, score_start = blocks[-2], blocks[-1]
+
+    async def purgeDead(self, before):
+        """
+        清除解除时间早于before的负缓存
+        :param before: timestamp
+        :return: number of removed entries
+        """
+        count = 0
+        while True:
+            blocks = await self.__conn.execute("zscan", self.__key("dead"), "", "", int(before) - 1, 1000) or []
+            proxies = blocks[::2]
+            if proxies:
+                await self.__conn.executeMany([("multi_zdel", self.__key("dead"), *proxies),
+                                               ("multi_hdel", self.__key("dead", "strikes"), *proxies)])
+                count += len(proxies)
+            if len(proxies) < 1000:
+                return count
 
     def changeTable(self, name):
         """
@@ -138,16 +608,17 @@ class SsdbClient(object):
         """
         self.name = name
 
-    def test(self):
+    async def test(self):
         log = LogHandler('ssdb_client')
         try:
-            self.getCount()
-        except TimeoutError as e:
+            await self.getCount()
+            return False
+        except (asyncio.TimeoutError, TimeoutError) as e:
             log.error('ssdb connection time out: %s' % str(e), exc_info=True)
             return e
-        except ConnectionError as e:
+        except (ConnectionError, OSError) as e:
             log.error('ssdb connection error: %s' % str(e), exc_info=True)
             return e
-        except ResponseError as e:
+        except SsdbError as e:
             log.error('ssdb connection error: %s' % str(e), exc_info=True)
             return e
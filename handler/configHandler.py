@@ -32,6 +32,14 @@ class ConfigHandler(withMetaclass(Singleton)):
     def serverPort(self):
         return os.environ.get("PORT", setting.PORT)
 
+    @LazyProperty
+    def apiCache(self):
+        return os.getenv("API_CACHE", str(setting.API_CACHE)).lower() in ("true", "1", "yes")
+
+    @LazyProperty
+    def apiCacheResync(self):
+        return int(os.getenv("API_CACHE_RESYNC", setting.API_CACHE_RESYNC))
+
     @LazyProperty
     def dbConn(self):
         return os.getenv("DB_CONN", setting.DB_CONN)
@@ -40,6 +48,14 @@ class ConfigHandler(withMetaclass(Singleton)):
     def tableName(self):
         return os.getenv("TABLE_NAME", setting.TABLE_NAME)
 
+    @LazyProperty
+    def dbSerializer(self):
+        return os.getenv("DB_SERIALIZER", setting.DB_SERIALIZER)
+
+    @LazyProperty
+    def dbShards(self):
+        return int(os.getenv("DB_SHARDS", setting.DB_SHARDS))
+
     @property
     def fetchers(self):
         reload_six(setting)
@@ -57,6 +73,18 @@ class ConfigHandler(withMetaclass(Singleton)):
     def verifyTimeout(self):
         return int(os.getenv("VERIFY_TIMEOUT", setting.VERIFY_TIMEOUT))
 
+    @LazyProperty
+    def verifyMode(self):
+        return os.getenv("VERIFY_MODE", setting.VERIFY_MODE)
+
+    @LazyProperty
+    def verifyHttps(self):
+        return os.getenv("VERIFY_HTTPS", str(setting.VERIFY_HTTPS)).lower() in ("true", "1", "yes")
+
+    @LazyProperty
+    def verifySocksNative(self):
+        return os.getenv("VERIFY_SOCKS_NATIVE", str(setting.VERIFY_SOCKS_NATIVE)).lower() in ("true", "1", "yes")
+
     # @LazyProperty
     # def proxyCheckCount(self):
     #     return int(os.getenv("PROXY_CHECK_COUNT", setting.PROXY_CHECK_COUNT))
@@ -73,6 +101,78 @@ class ConfigHandler(withMetaclass(Singleton)):
     def poolSizeMin(self):
         return int(os.getenv("POOL_SIZE_MIN", setting.POOL_SIZE_MIN))
 
+    @LazyProperty
+    def proxyCheckInterval(self):
+        return int(os.getenv("PROXY_CHECK_INTERVAL", setting.PROXY_CHECK_INTERVAL))
+
+    @LazyProperty
+    def proxyCheckMaxInterval(self):
+        return int(os.getenv("PROXY_CHECK_MAX_INTERVAL", setting.PROXY_CHECK_MAX_INTERVAL))
+
+    @LazyProperty
+    def proxyCheckRate(self):
+        return float(os.getenv("PROXY_CHECK_RATE", setting.PROXY_CHECK_RATE))
+
+    @LazyProperty
+    def proxyCheckBatch(self):
+        return int(os.getenv("PROXY_CHECK_BATCH", setting.PROXY_CHECK_BATCH))
+
+    @LazyProperty
+    def proxyCheckLease(self):
+        return int(os.getenv("PROXY_CHECK_LEASE", setting.PROXY_CHECK_LEASE))
+
+    @LazyProperty
+    def checkFlushSize(self):
+        return int(os.getenv("CHECK_FLUSH_SIZE", setting.CHECK_FLUSH_SIZE))
+
+    @LazyProperty
+    def checkFlushInterval(self):
+        return float(os.getenv("CHECK_FLUSH_INTERVAL", setting.CHECK_FLUSH_INTERVAL))
+
+    @LazyProperty
+    def checkConcurrencyMin(self):
+        return int(os.getenv("CHECK_CONCURRENCY_MIN", setting.CHECK_CONCURRENCY_MIN))
+
+    @LazyProperty
+    def checkConcurrencyMax(self):
+        return int(os.getenv("CHECK_CONCURRENCY_MAX", setting.CHECK_CONCURRENCY_MAX))
+
+    @LazyProperty
+    def checkConcurrencyStart(self):
+        return int(os.getenv("CHECK_CONCURRENCY_START", setting.CHECK_CONCURRENCY_START))
+
+    @LazyProperty
+    def checkTimeoutTarget(self):
+        return float(os.getenv("CHECK_TIMEOUT_TARGET", setting.CHECK_TIMEOUT_TARGET))
+
+    @LazyProperty
+    def checkLagTarget(self):
+        return float(os.getenv("CHECK_LAG_TARGET", setting.CHECK_LAG_TARGET))
+
+    @LazyProperty
+    def checkHistorySize(self):
+        return int(os.getenv("CHECK_HISTORY_SIZE", setting.CHECK_HISTORY_SIZE))
+
+    @LazyProperty
+    def checkConnectTimeout(self):
+        return float(os.getenv("CHECK_CONNECT_TIMEOUT", setting.CHECK_CONNECT_TIMEOUT))
+
+    @LazyProperty
+    def checkConnectConcurrency(self):
+        return int(os.getenv("CHECK_CONNECT_CONCURRENCY", setting.CHECK_CONNECT_CONCURRENCY))
+
+    @LazyProperty
+    def checkQueueSize(self):
+        return int(os.getenv("CHECK_QUEUE_SIZE", setting.CHECK_QUEUE_SIZE))
+
+    @LazyProperty
+    def deadCacheTtl(self):
+        return int(os.getenv("DEAD_CACHE_TTL", setting.DEAD_CACHE_TTL))
+
+    @LazyProperty
+    def deadCacheMaxTtl(self):
+        return int(os.getenv("DEAD_CACHE_MAX_TTL", setting.DEAD_CACHE_MAX_TTL))
+
     @LazyProperty
     def proxyRegion(self):
         return bool(os.getenv("PROXY_REGION", setting.PROXY_REGION))
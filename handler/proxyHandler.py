@@ -9,10 +9,14 @@
    Change Activity:
                    2016/12/03:
                    2020/05/26: 区分http和https
+                   2026/10/18: 最近失效代理的负缓存
+                   2026/10/18: 抓取到已在池中的代理只合并来源
 -------------------------------------------------
 """
 __author__ = 'JHao'
 
+import time
+
 from helper.proxy import Proxy
 from db.dbClient import DbClient
 from handler.configHandler import ConfigHandler
@@ -35,12 +39,12 @@ class ProxyHandler(object):
         """
         return await self.db.get(type)
 
-    async def pop(self, https):
+    async def pop(self, type=''):
         """
         return and delete a useful proxy
         :return:
         """
-        return await self.db.pop(https)
+        return await self.db.pop(type)
 
     async def put(self, proxy):
         """
@@ -49,6 +53,14 @@ class ProxyHandler(object):
         """
         await self.db.put(proxy)
 
+    async def putMany(self, proxies):
+        """
+        put a batch of proxies into use proxy
+        :param proxies: list of Proxy
+        :return:
+        """
+        await self.db.putMany(proxies)
+
     async def delete(self, proxy):
         """
         delete useful proxy
@@ -57,6 +69,14 @@ class ProxyHandler(object):
         """
         return await self.db.delete(proxy.proxy)
 
+    async def deleteMany(self, proxies):
+        """
+        delete a batch of useful proxies
+        :param proxies: list of Proxy
+        :return:
+        """
+        return await self.db.deleteMany([proxy.proxy for proxy in proxies])
+
     async def getAll(self):
         """
         get all proxy from pool as Proxy list
@@ -64,6 +84,47 @@ class ProxyHandler(object):
         """
         return await self.db.getAll()
 
+    async def claimDue(self, count, lease):
+        """
+        claim proxies due for a check as Proxy list
+        :param count: max number of proxies
+        :param lease: seconds before an unfinished claim becomes due again
+        :return:
+        """
+        return [Proxy.createFromJson(item) for item in await self.db.claimDue(count, lease)]
+
+    async def scan(self, cursor=0, count=500, **filters):
+        """
+        get one page of proxies and the cursor of the next page
+        :param cursor: 0 to start
+        :param count: page size hint
+        :param filters: type/source/valid, backends may skip them, so filter the page again
+        :return:
+        """
+        return await self.db.scan(cursor, count, **filters)
+
+    async def iterAll(self, count=500, **filters):
+        """
+        iterate over all proxies page by page without loading the whole pool
+        :param count: page size hint
+        :param filters: type/source/valid, backends may skip them, so filter the items again
+        :return:
+        """
+        cursor = 0
+        while True:
+            cursor, items = await self.db.scan(cursor, count, **filters)
+            for item in items:
+                yield item
+            if not cursor:
+                break
+
+    def subscribe(self):
+        """
+        follow change events of the pool
+        :return: async generator of event dicts, None if the db has no events
+        """
+        return self.db.subscribe()
+
     async def exists(self, proxy):
         """
         check proxy exists
@@ -72,6 +133,61 @@ class ProxyHandler(object):
         """
         return await self.db.exists(proxy.proxy)
 
+    async def mergeKnown(self, proxies):
+        """
+        add the sources of fetched proxies that are already in the pool to their records,
+        the use checker keeps validating those
+        :param proxies: list of Proxy
+        :return: list of the proxies not in the pool yet
+        """
+        if not proxies:
+            return []
+        sources = dict()
+        for proxy in proxies:
+            sources[proxy.proxy] = Proxy.merge_sources(sources.get(proxy.proxy), proxy.source)
+        # only the source is written, a checker result stored meanwhile is kept
+        known = set(await self.db.addSources(sources))
+        return [proxy for proxy in proxies if proxy.proxy not in known]
+
+    async def markDead(self, proxies):
+        """
+        put failed proxies into the negative cache for DEAD_CACHE_TTL seconds,
+        doubled for every failure in a row up to DEAD_CACHE_MAX_TTL
+        :param proxies: list of Proxy
+        :return:
+        """
+        if not proxies or self.conf.deadCacheTtl <= 0:
+            return
+        now = time.time()
+        current = await self.db.getDead([proxy.proxy for proxy in proxies])
+        entries = dict()
+        for proxy in proxies:
+            strikes = current.get(proxy.proxy, (0, 0))[1] + 1
+            ttl = min(self.conf.deadCacheTtl * 2 ** min(strikes - 1, 32), self.conf.deadCacheMaxTtl)
+            entries[proxy.proxy] = (now + ttl, strikes)
+        await self.db.putDead(entries)
+
+    async def clearDead(self, proxies):
+        """
+        remove proxies that passed a check from the negative cache
+        :param proxies: list of Proxy
+        :return:
+        """
+        if proxies and self.conf.deadCacheTtl > 0:
+            await self.db.deleteDead([proxy.proxy for proxy in proxies])
+
+    async def deadProxies(self):
+        """
+        proxies still banned by the negative cache, entries that ended more than
+        DEAD_CACHE_MAX_TTL seconds ago are forgotten first so their strikes start over
+        :return: set of proxy strings
+        """
+        if self.conf.deadCacheTtl <= 0:
+            return set()
+        now = time.time()
+        await self.db.purgeDead(now - self.conf.deadCacheMaxTtl)
+        return set(await self.db.listDead(now))
+
     async def getCount(self):
         """
         return raw_proxy and use_proxy count
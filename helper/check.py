@@ -11,20 +11,36 @@
                    2021/05/25: Validate HTTP and HTTPS separately
                    2022/08/16: Get proxy region information
                    2023/09/14: Rewrite using aiohttp and asynchronous programming
+                   2026/10/18: Keep a short check history per proxy
+                   2026/10/18: One ValidationContext per checker run
+                   2026/10/18: Adaptive number of validations in flight
+                   2026/10/18: Combined validation mode
+                   2026/10/18: Store connect time and time to first byte on the proxy
+                   2026/10/18: TCP connect prefilter before validating fetched proxies
+                   2026/10/18: Checker returns the number of checked and passed proxies
+                   2026/10/18: Checker consumes a queue while it is being filled, None marks the end
+                   2026/10/18: Failed proxies go to the negative cache, passed ones leave it
+                   2026/10/18: Check interval backs off with the successes in a row, use checks rate limited
+                   2026/10/18: Prefilter keeps its connect counts out of the checker stats
+                   2026/10/18: Checker runs of a process share one concurrency controller
+                   2026/10/18: ResultBuffer keeps a batch the db failed to take
 -------------------------------------------------
 """
 
+import time
 import asyncio
 import aiohttp
 import random
+import collections
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from util.webRequest import WebRequest
 from handler.logHandler import LogHandler
-from helper.validator import ProxyValidator
+from helper import history
+from helper.validator import ProxyValidator, ValidationContext, httpTimeOutValidator, socksTimeOutValidator
+from helper.concurrency import ConcurrencyController, RateLimiter, openFiles
 from handler.proxyHandler import ProxyHandler
 from handler.configHandler import ConfigHandler
-from aiohttp_socks import ProxyConnector
 from helper.geoip import get_geo_info
 from loguru import logger
 
@@ -48,7 +64,7 @@ def is_valid_ipv4(ip_str):
     return True
 
 
-async def get_outbound_ip(proxy_str):
+async def get_outbound_ip(proxy_str, context=None):
     headers = {
         "User-Agent": "curl/7.88.1"
     }
@@ -61,21 +77,20 @@ async def get_outbound_ip(proxy_str):
         "http://5.45.99.39:38080/"
     ]
 
-    proxy, connector = None, None
-    if proxy_str.startswith("http"):
-        proxy = proxy_str
-    elif proxy_str.startswith("socks"):
-        connector = ProxyConnector.from_url(proxy_str)
-
     url = random.choice(urls)
     timeout = aiohttp.ClientTimeout(total=5)
 
     try:
-        async with aiohttp.ClientSession(
-                timeout=timeout,
-                connector=connector
-        ) as session, session.get(url, headers=headers, proxy=proxy, ssl=False) as resp:
-            ip = await resp.text()
+        async with ValidationContext.borrow(context) as context:
+            if proxy_str.startswith("socks"):
+                async with context.socksSession(proxy_str) as session, \
+                        session.get(url, headers=headers, timeout=timeout,
+                                    trace_request_ctx=context.trace(proxy_str, "outbound")) as resp:
+                    ip = await resp.text()
+            else:
+                async with context.session.get(url, headers=headers, proxy=proxy_str, timeout=timeout,
+                                               trace_request_ctx=context.trace(proxy_str, "outbound")) as resp:
+                    ip = await resp.text()
             ip = ip.strip()
             logger.info(f'proxy: {proxy_str} use {url} get outbound_ip: {ip}')
             if is_valid_ipv4(ip):
@@ -91,30 +106,50 @@ class DoValidator(object):
 
     conf = ConfigHandler()
 
+    # phases whose time to first byte is the latency of the proxy, the first one traced wins
+    LATENCY_PHASES = ("http", "socks", "outbound")
+
+    # share of the check interval added or taken at random, proxies checked together drift apart
+    INTERVAL_JITTER = 0.1
+
     @classmethod
-    async def validator(cls, proxy, work_type):
+    async def validator(cls, proxy, work_type, context=None):
         """
         Validation entry point
         Args:
             proxy: Proxy Object
             work_type: raw/use
+            context: ValidationContext shared by the checks, a temporary one if None
         Returns:
             Proxy Object
         """
-        status = None
-
-        https_support = False
-        if proxy.proxy.startswith('http'):
-            status = await cls.httpValidator(proxy)
-            if status:
-                https_support = await cls.httpsValidator(proxy)
-
-        elif proxy.proxy.startswith('socks'):
-            status = await cls.socksValidator(proxy)
+        async with ValidationContext.borrow(context) as context:
+            if cls.conf.verifyMode == "combined":
+                status, https_support, outbound_ip, latency, phase = await cls.combinedValidator(proxy, context)
+            else:
+                status, https_support, outbound_ip, latency, phase = await cls.sequentialValidator(proxy, context)
+            timings = context.popTimings(proxy.proxy)
+        return cls.record(proxy, status, https_support, outbound_ip, latency, phase, timings)
 
+    @classmethod
+    def record(cls, proxy, status, https_support, outbound_ip, latency, phase, timings):
+        """
+        Write the result of a check to the proxy
+        Args:
+            proxy: Proxy Object
+            status: passed or not
+            https_support: supports https
+            outbound_ip: outbound ip, '' if unknown
+            latency: seconds taken by the liveness check
+            phase: failed phase, history.PHASE_OK if passed
+            timings: {phase: {"connect": seconds, "ttfb": seconds}} of the traced requests
+        Returns:
+            Proxy Object
+        """
         proxy.https = https_support
         proxy.check_count += 1
-        proxy.last_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now = datetime.now()
+        proxy.last_time = now.strftime("%Y-%m-%d %H:%M:%S")
         proxy.last_status = True if status else False
         proxy.region = get_geo_info(proxy.ip)
 
@@ -122,38 +157,119 @@ class DoValidator(object):
             if proxy.fail_count > 0:
                 proxy.fail_count -= 1
 
-            outbound_ip = await get_outbound_ip(proxy.proxy)
             proxy.outbound_ip = outbound_ip
+            # custom validators are not traced, their wall clock time stands in
+            proxy.latency = next((timings[name]["ttfb"] for name in cls.LATENCY_PHASES if name in timings),
+                                 round(latency, 3))
             if outbound_ip and proxy.ip != outbound_ip:
                 proxy.region = get_geo_info(outbound_ip)
         else:
             proxy.fail_count += 1
+        proxy.timings = timings
+        proxy.history = history.append(proxy.history, now.timestamp(), phase, latency, cls.conf.checkHistorySize)
+        proxy.next_time = (now + timedelta(seconds=cls.checkInterval(proxy))).strftime("%Y-%m-%d %H:%M:%S")
         return proxy
 
     @classmethod
-    async def httpValidator(cls, proxy):
-        for func in ProxyValidator.http_validator:
-            result = await func(proxy.proxy)
-            if not result:
-                return False
-        return True
+    def checkInterval(cls, proxy):
+        """
+        Seconds until the next check of a proxy: PROXY_CHECK_INTERVAL for new proxies and
+        proxies that just failed, doubled for every success in a row up to PROXY_CHECK_MAX_INTERVAL
+        Args:
+            proxy: Proxy Object, its history includes the check just done
+        Returns:
+            seconds, moved by up to INTERVAL_JITTER at random
+        """
+        base = cls.conf.proxyCheckInterval
+        streak = history.streak(proxy.history)
+        interval = min(base * 2 ** min(max(streak - 1, 0), 32), max(base, cls.conf.proxyCheckMaxInterval))
+        return interval * random.uniform(1 - cls.INTERVAL_JITTER, 1 + cls.INTERVAL_JITTER)
 
     @classmethod
-    async def httpsValidator(cls, proxy):
-        for func in ProxyValidator.https_validator:
-            result = await func(proxy.proxy)
-            if not result:
-                return False
-        return True
+    async def sequentialValidator(cls, proxy, context=None):
+        """
+        Liveness, then https support, then the outbound ip, one request after another
+        Returns:
+            (status, https support, outbound ip, latency of the liveness check, failed phase)
+        """
+        start = time.monotonic()
+        status, https_support, outbound_ip, latency = False, False, "", 0
+        phase = history.PHASE_OK
+        if proxy.proxy.startswith('http'):
+            status = await cls.httpValidator(proxy, context)
+            latency = time.monotonic() - start
+            if status:
+                https_support = await cls.httpsValidator(proxy, context)
+            else:
+                phase = history.PHASE_HTTP
+
+        elif proxy.proxy.startswith('socks'):
+            status = await cls.socksValidator(proxy, context)
+            latency = time.monotonic() - start
+            if not status:
+                phase = history.PHASE_SOCKS
+
+        if status:
+            outbound_ip = await get_outbound_ip(proxy.proxy, context)
+            if not outbound_ip:
+                phase = history.PHASE_OUTBOUND
+        return status, https_support, outbound_ip, latency, phase
 
     @classmethod
-    async def socksValidator(cls, proxy):
-        for func in ProxyValidator.socks_validator:
-            result = await func(proxy.proxy)
+    async def combinedValidator(cls, proxy, context=None):
+        """
+        Liveness, outbound ip and https support concurrently: the outbound ip lookup through
+        the proxy is the liveness check, so the built-in http/socks validators are skipped,
+        custom ones and the https check run next to it
+        Returns:
+            (status, https support, outbound ip, latency of the outbound ip lookup, failed phase)
+        """
+        start = time.monotonic()
+
+        async def outbound():
+            ip = await get_outbound_ip(proxy.proxy, context)
+            return ip, time.monotonic() - start
+
+        async def skipped():
+            return False
+
+        if proxy.proxy.startswith('http'):
+            validators = [func for func in ProxyValidator.http_validator if func is not httpTimeOutValidator]
+            https = cls.chain(ProxyValidator.https_validator, proxy, context) if cls.conf.verifyHttps else skipped()
+            phase = history.PHASE_HTTP
+        else:
+            validators = [func for func in ProxyValidator.socks_validator if func is not socksTimeOutValidator]
+            https = skipped()
+            phase = history.PHASE_SOCKS
+
+        (outbound_ip, latency), passed, https_support = await asyncio.gather(
+            outbound(), cls.chain(validators, proxy, context), https)
+        status = bool(outbound_ip) and passed
+        return status, status and https_support, outbound_ip, latency, history.PHASE_OK if status else phase
+
+    @classmethod
+    async def chain(cls, validators, proxy, context=None):
+        """ True if all validators pass, stops at the first failure """
+        for func in validators:
+            result = await func(proxy.proxy, context)
             if not result:
                 return False
         return True
 
+    @classmethod
+    async def httpValidator(cls, proxy, context=None):
+        return await cls.chain(ProxyValidator.http_validator, proxy, context)
+
+    @classmethod
+    async def httpsValidator(cls, proxy, context=None):
+        if not cls.conf.verifyHttps:
+            return False
+        return await cls.chain(ProxyValidator.https_validator, proxy, context)
+
+    @classmethod
+    async def socksValidator(cls, proxy, context=None):
+        return await cls.chain(ProxyValidator.socks_validator, proxy, context)
+
     @classmethod
     async def preValidator(cls, proxy):
         for func in ProxyValidator.pre_validator:
@@ -173,27 +289,253 @@ class DoValidator(object):
             return 'error'
 
 
-async def checker_worker(work_type, target_queue, name):
-    proxy_handler = ProxyHandler()
+async def tcpConnect(proxy, timeout):
+    """
+    Whether the proxy accepts a TCP connection
+    Args:
+        proxy: Proxy Object
+        timeout: connect timeout in seconds
+    Returns:
+        (accepted, seconds taken)
+    """
+    start = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(proxy.ip, int(proxy.port)), timeout)
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return False, time.monotonic() - start
+    elapsed = time.monotonic() - start
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True, elapsed
+
+
+def connectConcurrency(conf):
+    """ simultaneous connects of the prefilter, within the spare file descriptors """
+    files = openFiles()
+    if files is None:
+        return conf.checkConnectConcurrency
+    used, limit = files
+    return max(1, min(conf.checkConnectConcurrency, int(limit * ConcurrencyController.FD_RATIO) - used))
+
+
+# shared by the checker runs of a process, runs started by overlapping jobs stay under one cap
+_use_limiter = None
+
+
+# (event loop, controller) shared by the checker runs of a process, so the limit found by
+# one batch carries over to the next instead of starting from CHECK_CONCURRENCY_START
+_controller = None
+
+
+def sharedController(conf):
+    """
+    Concurrency controller of the checks in this process, a new event loop gets a new one
+    Args:
+        conf: ConfigHandler
+    Returns:
+        ConcurrencyController
+    """
+    global _controller
+    loop = asyncio.get_running_loop()
+    if _controller is None or _controller[0] is not loop:
+        _controller = (loop, ConcurrencyController(conf.checkConcurrencyMin, conf.checkConcurrencyMax,
+                                                   conf.checkTimeoutTarget, conf.checkLagTarget,
+                                                   start=conf.checkConcurrencyStart))
+    return _controller[1]
+
+
+def useRateLimiter(conf):
+    """
+    Rate limiter of the use checks in this process
+    Args:
+        conf: ConfigHandler
+    Returns:
+        RateLimiter, None if PROXY_CHECK_RATE is 0
+    """
+    global _use_limiter
+    if conf.proxyCheckRate <= 0:
+        return None
+    if _use_limiter is None:
+        _use_limiter = RateLimiter(conf.proxyCheckRate)
+    return _use_limiter
+
+
+async def nextProxy(queue):
+    """
+    Next proxy of a checker queue, waiting for the producer
+    Args:
+        queue: asyncio.Queue closed by a None after the last proxy
+    Returns:
+        Proxy Object, None once the queue is closed
+    """
+    proxy = await queue.get()
+    if proxy is None:
+        queue.task_done()
+        # leave the end mark for the other workers
+        queue.put_nowait(None)
+    return proxy
+
+
+def workerCount(queue, ceiling):
+    """ workers for a queue: a bounded one is still being filled, a filled one needs no more than it holds """
+    if queue.maxsize:
+        return ceiling
+    return min(ceiling, max(queue.qsize() - 1, 1))
+
+
+async def connect_worker(work_type, source_queue, target_queue, result_buffer, log_prefix, stats, counts):
+    conf = ConfigHandler()
+    while True:
+        proxy = await nextProxy(source_queue)
+        if proxy is None:
+            break
+
+        try:
+            accepted, elapsed = await tcpConnect(proxy, conf.checkConnectTimeout)
+            if accepted:
+                counts["connected"] += 1
+                await target_queue.put(proxy)
+                continue
+
+            # a refused connect is a failed check like any other
+            DoValidator.record(proxy, False, False, "", elapsed, history.PHASE_CONNECT, {})
+            counts["refused"] += 1
+            stats["checked"] += 1
+            if work_type == "raw":
+                await handle_raw_proxy(proxy, result_buffer, log_prefix)
+            else:
+                await handle_use_proxy(proxy, result_buffer, conf, log_prefix)
+
+        except Exception as e:
+            logger.error(f"{log_prefix}: Error connecting proxy {proxy.proxy}: {e}")
+
+        finally:
+            source_queue.task_done()
+
+
+async def connectPrefilter(work_type, source_queue, target_queue, result_buffer, stats):
+    """
+    Open only a TCP connection to each proxy, at a far higher concurrency than the
+    validation, so the many dead ones do not wait out VERIFY_TIMEOUT in the validators
+    Args:
+        work_type: raw/use
+        source_queue: asyncio.Queue of the proxies, closed by None
+        target_queue: asyncio.Queue the proxies that accepted the connection go to, closed by None at the end
+        result_buffer: ResultBuffer the failed ones are written to
+        stats: collections.Counter of the checker, the failed ones are counted as checked
+    """
+    conf = ConfigHandler()
+    log_prefix = f"{work_type.title()}ProxyConnect"
+    start = time.monotonic()
+    # own counts, the checker stats only hold checked and passed proxies
+    counts = collections.Counter(connected=0, refused=0)
+    try:
+        await asyncio.gather(*[connect_worker(work_type, source_queue, target_queue, result_buffer, log_prefix,
+                                              stats, counts)
+                               for _ in range(workerCount(source_queue, connectConcurrency(conf)))])
+    finally:
+        await target_queue.put(None)
+    logger.info(f"{log_prefix}: {counts['connected']}/{counts['connected'] + counts['refused']} connected "
+                f"in {time.monotonic() - start:.1f}s")
+
+
+class ResultBuffer(object):
+    """
+    Collect checker results and write them to the db in batches. Proxies that failed,
+    kept or deleted, go to the negative cache with the batch, the ones that passed leave it.
+    """
+
+    def __init__(self, proxy_handler, size, interval):
+        self.proxy_handler = proxy_handler
+        self.size = size
+        self.interval = interval
+        self._put = dict()
+        self._delete = dict()
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._put) + len(self._delete)
+
+    async def put(self, proxy):
+        self._delete.pop(proxy.proxy, None)
+        self._put[proxy.proxy] = proxy
+        if len(self) >= self.size:
+            await self.flush()
+
+    async def delete(self, proxy):
+        self._put.pop(proxy.proxy, None)
+        self._delete[proxy.proxy] = proxy
+        if len(self) >= self.size:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Write buffered results, new results keep buffering meanwhile.
+        Results the db failed to take are buffered again for the next flush,
+        unless a newer result of the same proxy came in meanwhile.
+        """
+        async with self._lock:
+            puts, deletes = list(self._put.values()), list(self._delete.values())
+            self._put, self._delete = dict(), dict()
+            unwritten_puts, unwritten_deletes = puts, deletes
+            try:
+                if puts:
+                    await self.proxy_handler.putMany(puts)
+                unwritten_puts = []
+                if deletes:
+                    await self.proxy_handler.deleteMany(deletes)
+                unwritten_deletes = []
+                await self.proxy_handler.markDead(deletes + [proxy for proxy in puts if not proxy.last_status])
+                await self.proxy_handler.clearDead([proxy for proxy in puts if proxy.last_status])
+            except Exception as e:
+                self._restore(unwritten_puts, unwritten_deletes)
+                logger.error(f"ResultBuffer: flush {len(puts)} put, {len(deletes)} delete error: {e}, "
+                             f"{len(unwritten_puts) + len(unwritten_deletes)} kept for the next flush")
+
+    def _restore(self, puts, deletes):
+        for results, target in ((puts, self._put), (deletes, self._delete)):
+            for proxy in results:
+                if proxy.proxy not in self._put and proxy.proxy not in self._delete:
+                    target[proxy.proxy] = proxy
+
+    async def run(self):
+        """Flush every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            # a cancelled flusher must not drop a batch half way
+            await asyncio.shield(self.flush())
+
+
+async def checker_worker(work_type, target_queue, name, result_buffer, context, controller, stats, limiter=None):
     conf = ConfigHandler()
     log_prefix = f"{work_type.title()}ProxyCheck - {name}"
     logger.info(f"{log_prefix}: start")
 
     while True:
-        try:
-            proxy = target_queue.get_nowait()
-        except asyncio.QueueEmpty:
+        proxy = await nextProxy(target_queue)
+        if proxy is None:
             logger.info(f"{log_prefix}: complete")
             break
 
         try:
             # 校验代理
-            proxy = await DoValidator.validator(proxy, work_type)
+            if limiter:
+                await limiter.acquire()
+            async with controller.slot():
+                start = time.monotonic()
+                proxy = await DoValidator.validator(proxy, work_type, context)
+                # validators swallow their errors, a failure that took the whole timeout was one
+                controller.record(not proxy.last_status and time.monotonic() - start >= conf.verifyTimeout * 0.9)
+            stats["checked"] += 1
+            stats["passed"] += bool(proxy.last_status)
 
             if work_type == "raw":
-                await handle_raw_proxy(proxy, proxy_handler, log_prefix)
+                await handle_raw_proxy(proxy, result_buffer, log_prefix)
             else:
-                await handle_use_proxy(proxy, proxy_handler, conf, log_prefix)
+                await handle_use_proxy(proxy, result_buffer, conf, log_prefix)
 
         except Exception as e:
             logger.error(f"{log_prefix}: Error processing proxy {proxy.proxy}: {e}")
@@ -202,37 +544,67 @@ async def checker_worker(work_type, target_queue, name):
             target_queue.task_done()
 
 
-async def handle_raw_proxy(proxy, proxy_handler, log_prefix):
-    if await proxy_handler.exists(proxy):
-        logger.info(f'{log_prefix}: {proxy.proxy.ljust(30)} exist')
-    else:
-        logger.info(f'{log_prefix}: {proxy.proxy.ljust(30)} pass')
-    await proxy_handler.put(proxy)
+async def handle_raw_proxy(proxy, result_buffer, log_prefix):
+    logger.info(f'{log_prefix}: {proxy.proxy.ljust(30)} pass')
+    await result_buffer.put(proxy)
 
 
-async def handle_use_proxy(proxy, proxy_handler, conf, log_prefix):
+async def handle_use_proxy(proxy, result_buffer, conf, log_prefix):
     if proxy.last_status:
         logger.info(f'{log_prefix}: {proxy.proxy.ljust(30)} pass')
-        await proxy_handler.put(proxy)
+        await result_buffer.put(proxy)
         return
 
     if proxy.fail_count > conf.maxFailCount:
         logger.info(f'{log_prefix}: {proxy.proxy.ljust(30)} fail, count {proxy.fail_count} delete')
-        await proxy_handler.delete(proxy)
+        await result_buffer.delete(proxy)
     else:
         logger.info(f'{log_prefix}: {proxy.proxy.ljust(30)} fail, count {proxy.fail_count} keep')
-        await proxy_handler.put(proxy)
+        await result_buffer.put(proxy)
 
 
-async def Checker(tp, queue):
+async def Checker(tp, queue, stats=None):
     """
     Run Proxy Checker
     Args:
         tp: raw/use
-        queue: asyncio.Queue
+        queue: asyncio.Queue, the producer puts None after the last proxy. Checking starts
+               right away, a bounded queue that is still being filled slows the producer down
+               to the pace of the checks.
+        stats: collections.Counter counted into while checking, for callers reporting on a long run
+    Returns:
+        collections.Counter with the number of "checked" and "passed" proxies
     """
-    tasks = []
-    for index in range(50):
-        task = asyncio.create_task(checker_worker(tp, queue, f"worker_{str(index).zfill(2)}"))
-        tasks.append(task)
-    await asyncio.gather(*tasks)
+    conf = ConfigHandler()
+    if stats is None:
+        stats = collections.Counter()
+    stats.update(checked=0, passed=0)
+    prefilter = None
+    result_buffer = ResultBuffer(ProxyHandler(), conf.checkFlushSize, conf.checkFlushInterval)
+    flusher = asyncio.create_task(result_buffer.run())
+    # workers wait for a slot of the controller, it decides how many validate at once
+    controller = sharedController(conf)
+    limiter = useRateLimiter(conf) if tp == "use" else None
+
+    try:
+        # most fetched proxies are dead, a connect attempt is enough to tell
+        if tp == "raw" and conf.checkConnectTimeout > 0:
+            source_queue, queue = queue, asyncio.Queue(maxsize=conf.checkQueueSize)
+            prefilter = asyncio.create_task(connectPrefilter(tp, source_queue, queue, result_buffer, stats))
+
+        async with ValidationContext() as context, controller.running():
+            tasks = []
+            for index in range(workerCount(queue, controller.ceiling)):
+                task = asyncio.create_task(
+                    checker_worker(tp, queue, f"worker_{str(index).zfill(2)}", result_buffer, context, controller, stats,
+                                   limiter))
+                tasks.append(task)
+            await asyncio.gather(*tasks)
+        if prefilter:
+            await prefilter
+    finally:
+        if prefilter:
+            prefilter.cancel()
+        flusher.cancel()
+        await result_buffer.flush()
+    return stats
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     concurrency.py
+   Description :   Adaptive limit of the validations in flight
+   Author :        JHao
+   Date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: AIMD controller driven by timeouts, loop lag and open files
+                   2026/10/18: Rate limiter of the use checks
+                   2026/10/18: One controller shared by the checker runs of a process
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+from loguru import logger
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def openFiles():
+    """
+    Open file descriptors of this process and their soft limit
+    :return: (count, limit), None where /proc or resource are not available
+    """
+    if resource is None or not os.path.isdir("/proc/self/fd"):
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return None
+    return len(os.listdir("/proc/self/fd")), soft
+
+
+class ConcurrencyController(object):
+    """
+    AIMD limit of the validations in flight
+
+    Every `interval` seconds the limit is cut by DECREASE when the share of checks
+    that timed out is above `timeout_target`, the event loop lags more than
+    `lag_target` seconds or open files reach FD_RATIO of their limit. Otherwise it
+    grows by `step` while workers are waiting for a slot. It stays within
+    [floor, ceiling].
+    """
+
+    DECREASE = 0.7
+    FD_RATIO = 0.8
+    # fewer finished checks in an interval say nothing about the timeout rate
+    MIN_SAMPLES = 5
+
+    def __init__(self, floor, ceiling, timeout_target, lag_target, start=None, step=5, interval=1):
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.timeout_target = timeout_target
+        self.lag_target = lag_target
+        self.step = step
+        self.interval = interval
+        self.limit = float(min(max(start or self.floor, self.floor), self.ceiling))
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+        self._done = 0
+        self._timeouts = 0
+        self._blocked = False
+        self._waiting = 0
+        self._users = 0
+        self._adjuster = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """ wait until the number of validations in flight is below the limit """
+        async with self._cond:
+            if self.in_flight >= int(self.limit):
+                self._blocked = True
+                self._waiting += 1
+                try:
+                    await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+                finally:
+                    self._waiting -= 1
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            async with self._cond:
+                self._cond.notify()
+
+    def record(self, timed_out):
+        """
+        count a finished validation
+        :param timed_out: whether it failed by running into the timeout
+        """
+        self._done += 1
+        self._timeouts += bool(timed_out)
+
+    def overloaded(self, lag):
+        """
+        reason to cut the limit, '' if there is none
+        :param lag: event loop lag in seconds
+        """
+        if self._done >= self.MIN_SAMPLES and self._timeouts / self._done > self.timeout_target:
+            return "timeout rate %.2f" % (self._timeouts / self._done)
+        if lag > self.lag_target:
+            return "loop lag %.3fs" % lag
+        files = openFiles()
+        if files and files[0] >= files[1] * self.FD_RATIO:
+            return "open files %d/%d" % files
+        return ""
+
+    async def adjust(self, lag):
+        """
+        apply one AIMD step from the results since the last step
+        :param lag: event loop lag in seconds
+        :return: new limit
+        """
+        limit = self.limit
+        reason = self.overloaded(lag)
+        if reason:
+            limit = max(self.floor, limit * self.DECREASE)
+        elif self._blocked or self._waiting:
+            limit = min(self.ceiling, limit + self.step)
+        self._done = self._timeouts = 0
+        self._blocked = False
+        if reason and int(limit) != int(self.limit):
+            logger.info(f"ConcurrencyController: limit {int(self.limit)} -> {int(limit)}, {reason}")
+        elif int(limit) != int(self.limit):
+            logger.debug(f"ConcurrencyController: limit {int(self.limit)} -> {int(limit)}")
+        self.limit = limit
+        async with self._cond:
+            self._cond.notify_all()
+        return limit
+
+    @asynccontextmanager
+    async def running(self):
+        """ adjust the limit while at least one checker run uses the controller """
+        self._users += 1
+        if self._adjuster is None:
+            self._adjuster = asyncio.create_task(self.run())
+        try:
+            yield self
+        finally:
+            self._users -= 1
+            if not self._users:
+                self._adjuster.cancel()
+                self._adjuster = None
+
+    async def run(self):
+        """ measure the loop lag and adjust the limit until cancelled """
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            await self.adjust(time.monotonic() - start - self.interval)
+
+
+class RateLimiter(object):
+    """
+    At most `rate` acquisitions per second, evenly spaced
+
+    Each caller reserves the next free time slot and sleeps until it, so the
+    callers go in the order they came without a lock or a refill task.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = 0.0
+
+    async def acquire(self):
+        """ wait for the next slot """
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + 1.0 / self.rate
+        if start > now:
+            await asyncio.sleep(start - now)
@@ -9,6 +9,10 @@
    Change Activity:
                    2021/11/18: Multi-threaded fetching
                    2023/09/14: Adapted to use asynchronous fetching with asyncio
+                   2026/10/18: Yield proxies while the fetchers are still running
+                   2026/10/18: Skip proxies in the negative cache
+                   2026/10/18: Merge the sources of proxies already in the pool instead of checking them
+                   2026/10/18: Skip recently failed proxies only if they are not in the pool
 -------------------------------------------------
 """
 __author__ = 'JHao'
@@ -26,6 +30,9 @@ from loguru import logger
 class Fetcher:
     name = "fetcher"
 
+    # fetched proxies looked up in the pool at once
+    KNOWN_BATCH = 500
+
     def __init__(self):
         self.log = LogHandler(self.name)
         self.conf = ConfigHandler()
@@ -33,9 +40,18 @@ class Fetcher:
 
     async def run(self):
         """
-        Fetch proxies asynchronously
+        Fetch proxies asynchronously, each new proxy is yielded as soon as a fetcher finds it.
+        The fetchers wait while CHECK_QUEUE_SIZE proxies are not consumed yet. Proxies already
+        in the pool only get their sources merged, the use checker validates them anyway.
+        Of the others, those that failed recently are skipped, see DEAD_CACHE_TTL.
         """
         proxy_dict = dict()
+        try:
+            dead = await self.proxy_handler.deadProxies()
+        except Exception as e:
+            logger.error(f"ProxyFetch: negative cache error: {e}")
+            dead = set()
+        proxy_queue = asyncio.Queue(maxsize=self.conf.checkQueueSize)
         logger.info("ProxyFetch : start")
 
         tasks = []
@@ -50,18 +66,47 @@ class Fetcher:
                 continue
 
             # Create a task for the fetcher
-            task = asyncio.create_task(self._fetch_proxies(fetch_source, fetcher, proxy_dict))
+            task = asyncio.create_task(
+                self._fetch_proxies(fetch_source, fetcher, proxy_dict, proxy_queue))
             tasks.append(task)
 
-        # Wait for all fetcher tasks to complete
-        await asyncio.gather(*tasks)
+        async def close():
+            await asyncio.gather(*tasks)
+            logger.info("ProxyFetch - all complete!")
+            await proxy_queue.put(None)
 
-        logger.info("ProxyFetch - all complete!")
-        for item in proxy_dict.values():
-            if await DoValidator.preValidator(item.proxy):
-                yield item
+        closer = asyncio.create_task(close())
+        known = skipped = 0
+        try:
+            done = False
+            while not done:
+                # take what the fetchers queued meanwhile, one db round trip for the batch
+                batch = [await proxy_queue.get()]
+                while len(batch) < self.KNOWN_BATCH and not proxy_queue.empty():
+                    batch.append(proxy_queue.get_nowait())
+                if batch[-1] is None:
+                    batch.pop()
+                    done = True
+                try:
+                    new = await self.proxy_handler.mergeKnown(batch)
+                except Exception as e:
+                    logger.error(f"ProxyFetch: pool lookup error: {e}")
+                    new = batch
+                known += len(batch) - len(new)
+                for proxy in new:
+                    # only proxies not stored are skipped, a stored one keeps getting its sources
+                    if proxy.proxy in dead:
+                        skipped += 1
+                        continue
+                    yield proxy
+            logger.info(f"ProxyFetch: {known} proxies already in the pool, sources merged, "
+                        f"{skipped} recently failed proxies skipped")
+        finally:
+            for task in tasks:
+                task.cancel()
+            closer.cancel()
 
-    async def _fetch_proxies(self, fetch_source, fetcher, proxy_dict):
+    async def _fetch_proxies(self, fetch_source, fetcher, proxy_dict, proxy_queue):
         logger.info(f"ProxyFetch - {fetch_source}: fetching proxies")
         try:
             async for proxy_data in fetcher():
@@ -74,9 +119,13 @@ class Fetcher:
 
                 logger.info(f'ProxyFetch - {source}: {proxy_str.ljust(30)} ok')
 
+                # a proxy already passed on still gets the source if it is not written yet
                 if proxy_str in proxy_dict:
                     proxy_dict[proxy_str].add_source(source)
-                else:
-                    proxy_dict[proxy_str] = Proxy(proxy_str, source=source)
+                    continue
+                proxy = Proxy(proxy_str, source=source)
+                proxy_dict[proxy_str] = proxy
+                if await DoValidator.preValidator(proxy_str):
+                    await proxy_queue.put(proxy)
         except Exception as e:
             logger.exception(f"ProxyFetch - {fetch_source}: error: {e}")
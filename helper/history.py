@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     history.py
+   Description :   代理最近N次检测记录
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: 定长二进制记录, base64存放在代理属性中
+                   2026/10/18: TCP连接预筛阶段
+                   2026/10/18: 连续成功次数
+                   2026/10/18: size为0时不保留记录, summary只解码一次
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import base64
+import struct
+
+# 每条记录: 检测时间戳(uint32), 阶段(uint8, 成功为PHASE_OK), 耗时毫秒(uint16)
+RECORD = struct.Struct("<IBH")
+
+# 检测失败的阶段
+PHASE_OK = 0
+PHASE_HTTP = 1
+PHASE_SOCKS = 2
+PHASE_OUTBOUND = 3
+PHASE_CONNECT = 4
+
+PHASE_NAMES = {PHASE_OK: "ok", PHASE_HTTP: "http", PHASE_SOCKS: "socks", PHASE_OUTBOUND: "outbound",
+               PHASE_CONNECT: "connect"}
+
+# 耗时上限, 超出按上限记录
+MAX_LATENCY = 0xFFFF
+
+
+def append(history, timestamp, phase, latency, size):
+    """
+    追加一条检测记录, 只保留最近size条
+    :param history: 已有记录, base64字符串
+    :param timestamp: 检测时间戳
+    :param phase: 失败阶段, 成功为PHASE_OK
+    :param latency: 耗时, 单位秒
+    :param size: 保留条数
+    :return: 新的base64字符串
+    """
+    if size <= 0:
+        return ""
+    data = base64.b64decode(history) if history else b""
+    data += RECORD.pack(int(timestamp), phase, min(int(latency * 1000), MAX_LATENCY))
+    return base64.b64encode(data[-size * RECORD.size:]).decode("ascii")
+
+
+def records(history):
+    """
+    解码检测记录, 从旧到新
+    :param history: base64字符串
+    :return: list of (timestamp, phase, latency in seconds)
+    """
+    data = base64.b64decode(history) if history else b""
+    return [(timestamp, phase, latency / 1000) for timestamp, phase, latency in RECORD.iter_unpack(data)]
+
+
+def successRate(history):
+    """
+    检测成功率, 无记录时为None
+    :param history: base64字符串
+    :return: float or None
+    """
+    items = records(history)
+    if not items:
+        return None
+    return sum(phase == PHASE_OK for _, phase, _ in items) / len(items)
+
+
+def streak(history):
+    """
+    最近连续成功的次数
+    :param history: base64字符串
+    :return: int
+    """
+    count = 0
+    for _, phase, _ in reversed(records(history)):
+        if phase != PHASE_OK:
+            break
+        count += 1
+    return count
+
+
+def latencyPercentile(history, percent):
+    """
+    成功检测耗时的百分位数, 无成功记录时为None
+    :param history: base64字符串
+    :param percent: 0-100
+    :return: seconds or None
+    """
+    return _percentile(sorted(latency for _, phase, latency in records(history) if phase == PHASE_OK), percent)
+
+
+def _percentile(latencies, percent):
+    if not latencies:
+        return None
+    return latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)]
+
+
+def summary(history):
+    """
+    检测记录摘要
+    :param history: base64字符串
+    :return: dict
+    """
+    items = records(history)
+    latencies = sorted(latency for _, phase, latency in items if phase == PHASE_OK)
+    return {
+        "checks": len(items),
+        "success_rate": len(latencies) / len(items) if items else None,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p90": _percentile(latencies, 90),
+        "last_fail": next((PHASE_NAMES.get(phase, "") for _, phase, _ in reversed(items) if phase != PHASE_OK), "")
+    }
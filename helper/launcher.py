@@ -9,6 +9,8 @@
    Change Activity:
                    2021/3/26: Launcher
                    2023/09/14: Adapted to use asynchronous scheduler
+                   2026/10/18: Rebuild indexes and counters, migrate record encoding
+                   2026/10/18: Scheduler with several checker processes
 -------------------------------------------------
 """
 __author__ = 'JHao'
@@ -28,10 +30,44 @@ def startServer():
     runFastAPI()
 
 
-def startScheduler():
+def startScheduler(workers=1):
     __beforeStart()
-    from helper.scheduler import main as scheduler_main
-    asyncio.run(scheduler_main())
+    if workers > 1:
+        if DbClient(ConfigHandler().dbConn).db_type == "MEMORY":
+            log.error("memory db is private to a process, --workers needs a shared db")
+            sys.exit(1)
+        from helper.workers import main as workers_main
+        asyncio.run(workers_main(workers))
+    else:
+        from helper.scheduler import main as scheduler_main
+        asyncio.run(scheduler_main())
+
+
+def startReindex():
+    __beforeStart()
+    asyncio.run(__reindex())
+
+
+async def __reindex():
+    conf = ConfigHandler()
+    db = DbClient(conf.dbConn)
+    db.changeTable(conf.tableName)
+    count = await db.reindex()
+    log.info("ProxyPool reindex: %s proxies" % count)
+    log.info("ProxyPool count: %s" % (await db.getCount()))
+
+
+def startMigrate():
+    __beforeStart()
+    asyncio.run(__migrate())
+
+
+async def __migrate():
+    conf = ConfigHandler()
+    db = DbClient(conf.dbConn)
+    db.changeTable(conf.tableName)
+    count = await db.migrate()
+    log.info("ProxyPool migrate: %s proxies rewritten as %s" % (count, conf.dbSerializer))
 
 
 def __beforeStart():
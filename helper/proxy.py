@@ -8,47 +8,91 @@
 -------------------------------------------------
    Change Activity:
                    2019/7/11: 代理对象类型封装
+                   2026/10/18: 增加检测记录history
+                   2026/10/18: __slots__, 缓存属性字典/json, 有序的来源集合
+                   2026/10/18: 增加延迟latency和各阶段耗时timings
+                   2026/10/18: 合并来源字符串merge_sources
 -------------------------------------------------
 """
 __author__ = 'JHao'
 
-import json
+import time
 from loguru import logger
 
 from setting import source
+from util import fastJson
 
 
 class Proxy(object):
+    """
+    代理对象
+
+    to_dict/to_json在属性修改前只生成一次, 返回的字典不要修改.
+    """
+
+    __slots__ = ("_proxy", "type", "ip", "port", "_fail_count", "_region", "_anonymous", "_source",
+                 "_source_str", "_check_count", "_last_status", "_last_time", "_next_time", "_history",
+                 "_https", "_outbound_ip", "_latency", "_timings", "_dict", "_json")
 
     def __init__(self, proxy, fail_count=0, region="", anonymous="",
-                 source="", check_count=0, last_status="", last_time="", https=False, outbound_ip=''):
+                 source="", check_count=0, last_status="", last_time="", https=False, outbound_ip='', next_time="",
+                 history="", latency=0, timings=None):
         self._proxy = proxy
         self.type, self.ip, self.port = proxy.split(":")
         self.ip = self.ip.replace("//", "")
         self._fail_count = fail_count
         self._region = region
         self._anonymous = anonymous
-        self._source = source.split(',')
+        self._source = self._sources(source)
+        self._source_str = None
         self._check_count = check_count
         self._last_status = last_status
         self._last_time = last_time
+        self._next_time = next_time
+        self._history = history
         self._https = https
-        self.outbound_ip = outbound_ip
+        self._outbound_ip = outbound_ip
+        self._latency = latency
+        self._timings = timings
+        self._dict = None
+        self._json = None
 
     @classmethod
     def createFromJson(cls, data):
+        if isinstance(data, str):
+            data = fastJson.loads(data)
         return cls(
             proxy=data.get("proxy", ""),
             fail_count=data.get("fail_count", 0),
+            region=data.get("region", ""),
             anonymous=data.get("anonymous", ""),
             source=data.get("source", ""),
             check_count=data.get("check_count", 0),
             last_status=data.get("last_status", ""),
             last_time=data.get("last_time", ""),
             https=data.get("https", False),
-            outbound_ip=data.get("outbound_ip", "")
+            outbound_ip=data.get("outbound_ip", ""),
+            next_time=data.get("next_time", ""),
+            history=data.get("history", ""),
+            latency=data.get("latency", 0),
+            timings=data.get("timings")
         )
 
+    @staticmethod
+    def _sources(source_str):
+        """ 来源的有序集合, 来源只有一两个, 用tuple比set/dict更省内存 """
+        if source_str and "," not in source_str:
+            return source_str,
+        return tuple(item for item in dict.fromkeys(source_str.split(',')) if item)
+
+    @staticmethod
+    def merge_sources(source_str, other):
+        """ source_str后追加other中没有的来源 """
+        return ','.join(Proxy._sources("%s,%s" % (source_str or "", other or "")))
+
+    def _changed(self):
+        self._dict = self._json = None
+
     @property
     def proxy(self):
         """ 代理 ip:port """
@@ -72,7 +116,9 @@ class Proxy(object):
     @property
     def source(self):
         """ 代理来源 """
-        return ','.join(self._source)
+        if self._source_str is None:
+            self._source_str = ','.join(self._source)
+        return self._source_str
 
     @property
     def check_count(self):
@@ -89,67 +135,145 @@ class Proxy(object):
         """ 最后一次检测时间 """
         return self._last_time
 
+    @property
+    def next_time(self):
+        """ 下一次检测时间 """
+        return self._next_time
+
+    @property
+    def due_time(self):
+        """ 下一次检测时间戳, 未安排检测时为0 """
+        if not self._next_time:
+            return 0
+        return time.mktime(time.strptime(self._next_time, "%Y-%m-%d %H:%M:%S"))
+
+    @property
+    def history(self):
+        """ 最近几次检测记录, 见helper.history """
+        return self._history
+
     @property
     def https(self):
         """ 是否支持https """
         return self._https
 
+    @property
+    def outbound_ip(self):
+        """ 出口ip """
+        return self._outbound_ip
+
+    @property
+    def latency(self):
+        """ 最近一次检测成功时的首字节时间(秒), 未测量为0 """
+        return self._latency
+
+    @property
+    def timings(self):
+        """ 最近一次检测各阶段的耗时 {阶段: {"connect": 连接秒数, "ttfb": 首字节秒数}} """
+        return self._timings or {}
+
     @property
     def to_dict(self):
         """ 属性字典 """
-        return {
-            "proxy": self.proxy,
-            "https": self.https,
-            "type": self.type,
-            "ip": self.ip,
-            "port": self.port,
-            "outbound_ip": self.outbound_ip,
-            "fail_count": self.fail_count,
-            "region": self._region,
-            "anonymous": self.anonymous,
-            "source": self.source,
-            "check_count": self.check_count,
-            "last_status": self.last_status,
-            "last_time": self.last_time
-        }
+        if self._dict is None:
+            self._dict = {
+                "proxy": self.proxy,
+                "https": self.https,
+                "type": self.type,
+                "ip": self.ip,
+                "port": self.port,
+                "outbound_ip": self.outbound_ip,
+                "fail_count": self.fail_count,
+                "region": self._region,
+                "anonymous": self.anonymous,
+                "source": self.source,
+                "check_count": self.check_count,
+                "last_status": self.last_status,
+                "last_time": self.last_time,
+                "next_time": self.next_time,
+                "history": self.history,
+                "latency": self.latency,
+                "timings": self.timings
+            }
+        return self._dict
 
     @property
     def to_json(self):
         """ 属性json格式 """
-        try:
-            return json.dumps(self.to_dict, ensure_ascii=False)
-        except Exception as e:
-            logger.exception(e)
-            return {}
+        if self._json is None:
+            try:
+                self._json = fastJson.dumps(self.to_dict)
+            except Exception as e:
+                logger.exception(e)
+                return {}
+        return self._json
 
     @fail_count.setter
     def fail_count(self, value):
         self._fail_count = value
+        self._changed()
 
     @check_count.setter
     def check_count(self, value):
         self._check_count = value
+        self._changed()
 
     @last_status.setter
     def last_status(self, value):
         self._last_status = value
+        self._changed()
 
     @last_time.setter
     def last_time(self, value):
         self._last_time = value
+        self._changed()
+
+    @next_time.setter
+    def next_time(self, value):
+        self._next_time = value
+        self._changed()
+
+    @history.setter
+    def history(self, value):
+        self._history = value
+        self._changed()
 
     @https.setter
     def https(self, value):
         self._https = value
+        self._changed()
+
+    @outbound_ip.setter
+    def outbound_ip(self, value):
+        self._outbound_ip = value
+        self._changed()
+
+    @latency.setter
+    def latency(self, value):
+        self._latency = value
+        self._changed()
+
+    @timings.setter
+    def timings(self, value):
+        self._timings = value
+        self._changed()
 
     @region.setter
     def region(self, value):
         self._region = value
+        self._changed()
+
+    @source.setter
+    def source(self, value):
+        self._source = self._sources(value)
+        self._source_str = None
+        self._changed()
 
     def add_source(self, source_str):
-        if source_str:
-            self._source.append(source_str)
-            self._source = list(set(self._source))
+        if source_str and source_str not in self._source:
+            self._source += source_str,
+            self._source_str = None
+            self._changed()
 
 
 if __name__ == '__main__':
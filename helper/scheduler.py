@@ -11,46 +11,88 @@
                    2021/02/23: Run fetch when remaining proxies are fewer than POOL_SIZE_MIN during runProxyCheck
                    2023/09/14: Adapted to use asynchronous versions of validator and checker
                    2023/09/14: Modified to run fetch and check immediately at startup
+                   2026/10/18: Check only proxies whose next check time has passed
+                   2026/10/18: checkDue shared with the worker processes
+                   2026/10/18: Check fetched proxies while fetching
+                   2026/10/18: Smaller due batches under PROXY_CHECK_RATE
 -------------------------------------------------
 """
 __author__ = 'JHao'
 
 import asyncio
+import collections
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from loguru import logger
 from helper.fetch import Fetcher
 from helper.check import Checker
 from handler.logHandler import LogHandler
 from handler.proxyHandler import ProxyHandler
 from handler.configHandler import ConfigHandler
-from helper.proxy import Proxy
 
-async def __runProxyFetch():
-    proxy_queue = asyncio.Queue()
-    proxy_fetcher = Fetcher()
+_fetch_lock = asyncio.Lock()
 
-    # Assuming Fetcher.run() is now asynchronous
-    async for proxy in proxy_fetcher.run():
-        await proxy_queue.put(proxy)
 
-    await Checker("raw", proxy_queue)
+async def __runProxyFetch():
+    if _fetch_lock.locked():
+        return
+
+    async with _fetch_lock:
+        # bounded, a full queue pauses the fetchers until the checkers catch up
+        proxy_queue = asyncio.Queue(maxsize=ConfigHandler().checkQueueSize)
+        proxy_fetcher = Fetcher()
+
+        async def produce():
+            try:
+                async for proxy in proxy_fetcher.run():
+                    await proxy_queue.put(proxy)
+            except Exception as e:
+                logger.error(f"ProxyFetch: error: {e}")
+            await proxy_queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            await Checker("raw", proxy_queue)
+            await producer
+        finally:
+            producer.cancel()
 
 
 async def __runProxyCheck():
     proxy_handler = ProxyHandler()
-    proxy_queue = asyncio.Queue()
     conf = ConfigHandler()
 
     count = await proxy_handler.db.getCount()
     if count.get("total", 0) < conf.poolSizeMin:
         await __runProxyFetch()
 
-    proxies = await proxy_handler.getAll()
-    proxies.sort(key=lambda proxy: proxy.get("last_time"))
-    proxies = [Proxy.createFromJson(proxy) for proxy in proxies]
-    for proxy in proxies:
-        await proxy_queue.put(proxy)
+    await checkDue()
+
 
-    await Checker("use", proxy_queue)
+async def checkDue():
+    """
+    Check the proxies whose next check time has passed, in bounded batches. The claim
+    lease keeps processes running this at the same time from taking the same proxies.
+    The most overdue proxies go first, PROXY_CHECK_RATE spreads the checks over time.
+    :return: collections.Counter of checked and passed proxies
+    """
+    proxy_handler = ProxyHandler()
+    conf = ConfigHandler()
+    stats = collections.Counter(checked=0, passed=0)
+    batch = conf.proxyCheckBatch
+    if conf.proxyCheckRate > 0:
+        # a rate limited batch has to be done well before its lease runs out
+        batch = max(1, min(batch, int(conf.proxyCheckRate * conf.proxyCheckLease / 2)))
+    while True:
+        proxies = await proxy_handler.claimDue(batch, conf.proxyCheckLease)
+        if not proxies:
+            break
+
+        proxy_queue = asyncio.Queue()
+        for proxy in proxies:
+            proxy_queue.put_nowait(proxy)
+        proxy_queue.put_nowait(None)
+        stats.update(await Checker("use", proxy_queue))
+    return stats
 
 
 async def main():
@@ -66,11 +108,14 @@ async def main():
 
     # Add jobs to the scheduler
     scheduler.add_job(__runProxyFetch, 'interval', minutes=10, id="proxy_fetch", name="Proxy Fetch")
-    scheduler.add_job(__runProxyCheck, 'interval', minutes=5, id="proxy_check", name="Proxy Check")
+    scheduler.add_job(__runProxyCheck, 'interval', minutes=1, id="proxy_check", name="Proxy Check")
 
     # Start the scheduler
     scheduler.start()
 
+    # Indexes may lag behind records written by an older version
+    await ProxyHandler().db.reindex()
+
     # Run the functions immediately
     await __runProxyFetch()
     await __runProxyCheck()
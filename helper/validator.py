@@ -9,14 +9,21 @@
    Change Activity:
                    2023/03/10: Support proxies with user authentication username:password@ip:port
                    2023/09/14: Rewrite using aiohttp and asynchronous programming
+                   2026/10/18: Validators share the session of a ValidationContext
+                   2026/10/18: Connect time and time to first byte of the validation requests
+                   2026/10/18: Native SOCKS5 handshake validator
 -------------------------------------------------
 """
 
 import re
+import ssl
+import inspect
+from contextlib import asynccontextmanager
 
 import aiohttp
 import asyncio
 
+from util import socks5
 from util.six import withMetaclass
 from util.singleton import Singleton
 from handler.configHandler import ConfigHandler
@@ -34,7 +41,133 @@ HEADER = {
 IP_REGEX = re.compile(r".*://\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:\d{1,5}")
 
 
+class ValidationContext(object):
+    """
+    Resources shared by the validators of one checker run
+
+    One session whose connector keeps the DNS cache and the SSL context for all
+    checks through HTTP proxies. Connections are closed after each request, a
+    pool of idle connections to thousands of different proxies would only hold
+    file descriptors. SOCKS proxies need a connector per proxy, they get a
+    short-lived session that still shares the SSL context.
+
+    Both kinds of session trace their requests: a request made with
+    trace_request_ctx=context.trace(proxy, phase) records its connect time and
+    time to first byte, popTimings(proxy) hands them over per phase.
+    """
+
+    def __init__(self, timeout=None, limit=0):
+        """
+        :param timeout: total timeout of a request, defaults to VERIFY_TIMEOUT
+        :param limit: max simultaneous connections, 0 for no limit
+        """
+        self.timeout = aiohttp.ClientTimeout(total=timeout or conf.verifyTimeout)
+        self.limit = limit
+        # validation does not verify certificates
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.session = None
+        self.timings = dict()
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._onRequestStart)
+        self.trace_config.on_connection_create_start.append(self._onConnectionCreateStart)
+        self.trace_config.on_connection_create_end.append(self._onConnectionCreateEnd)
+        self.trace_config.on_request_end.append(self._onRequestEnd)
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, ttl_dns_cache=300, ssl=self.ssl_context, force_close=True)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                             trace_configs=[self.trace_config])
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def socksSession(self, proxy):
+        """
+        Session connecting through a SOCKS proxy
+        :param proxy: socks4/socks5 proxy url
+        :return: aiohttp.ClientSession, to be closed by the caller
+        """
+        connector = ProxyConnector.from_url(proxy, ssl=self.ssl_context)
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout, trace_configs=[self.trace_config])
+
+    def trace(self, proxy, phase):
+        """
+        Trace context of a request through the proxy, pass it as trace_request_ctx
+        :param proxy: proxy url
+        :param phase: http/https/socks/outbound
+        :return: dict the timings are written to
+        """
+        return self.timings.setdefault(proxy, dict()).setdefault(phase, dict())
+
+    def popTimings(self, proxy):
+        """
+        Timings of the traced requests through the proxy that got a response
+        :param proxy: proxy url
+        :return: {phase: {"connect": seconds, "ttfb": seconds}}, ttfb counts from the start of the request,
+                 the native SOCKS5 check adds "handshake"
+        """
+        return {phase: {name: round(timing.get(name, 0), 3) for name in ("connect", "handshake", "ttfb")
+                        if name in timing or name == "connect"}
+                for phase, timing in self.timings.pop(proxy, {}).items() if "ttfb" in timing}
+
+    @staticmethod
+    async def _onRequestStart(session, trace_config_ctx, params):
+        if trace_config_ctx.trace_request_ctx is not None:
+            trace_config_ctx.trace_request_ctx["start"] = asyncio.get_running_loop().time()
+
+    @staticmethod
+    async def _onConnectionCreateStart(session, trace_config_ctx, params):
+        if trace_config_ctx.trace_request_ctx is not None:
+            trace_config_ctx.trace_request_ctx["connect_start"] = asyncio.get_running_loop().time()
+
+    @staticmethod
+    async def _onConnectionCreateEnd(session, trace_config_ctx, params):
+        timing = trace_config_ctx.trace_request_ctx
+        # a redirect opens another connection, the first one is the connect time
+        if timing is not None and "connect" not in timing:
+            timing["connect"] = asyncio.get_running_loop().time() - timing["connect_start"]
+
+    @staticmethod
+    async def _onRequestEnd(session, trace_config_ctx, params):
+        timing = trace_config_ctx.trace_request_ctx
+        if timing is not None and "ttfb" not in timing:
+            timing["ttfb"] = asyncio.get_running_loop().time() - timing["start"]
+
+    @classmethod
+    @asynccontextmanager
+    async def borrow(cls, context=None):
+        """
+        The given context, or a temporary one for validators called on their own
+        :param context: ValidationContext or None
+        :return: ValidationContext
+        """
+        if context is not None:
+            yield context
+        else:
+            async with cls() as context:
+                yield context
+
+
+def _withContext(func):
+    """ validators written as func(proxy) keep working, the context is not passed to them """
+    parameters = inspect.signature(func).parameters.values()
+    if len(parameters) > 1 or any(p.kind == p.VAR_POSITIONAL for p in parameters):
+        return func
+
+    async def validator(proxy, context=None):
+        return await func(proxy)
+
+    return validator
+
+
 class ProxyValidator(withMetaclass(Singleton)):
+    """
+    Validators are called as func(proxy, context) with the proxy url and the
+    ValidationContext of the checker, pre validators as func(proxy)
+    """
     pre_validator = []
     http_validator = []
     https_validator = []
@@ -47,17 +180,17 @@ class ProxyValidator(withMetaclass(Singleton)):
 
     @classmethod
     def addHttpValidator(cls, func):
-        cls.http_validator.append(func)
+        cls.http_validator.append(_withContext(func))
         return func
 
     @classmethod
     def addHttpsValidator(cls, func):
-        cls.https_validator.append(func)
+        cls.https_validator.append(_withContext(func))
         return func
 
     @classmethod
     def addSocksValidator(cls, func):
-        cls.socks_validator.append(func)
+        cls.socks_validator.append(_withContext(func))
         return func
 
 
@@ -68,48 +201,58 @@ async def formatValidator(proxy):
 
 
 @ProxyValidator.addHttpValidator
-async def httpTimeOutValidator(proxy):
+async def httpTimeOutValidator(proxy, context=None):
     """HTTP detection with timeout using aiohttp"""
     try:
-        timeout = aiohttp.ClientTimeout(total=conf.verifyTimeout)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.head(conf.httpUrl, headers=HEADER, proxy=proxy) as resp:
+        async with ValidationContext.borrow(context) as context:
+            async with context.session.head(conf.httpUrl, headers=HEADER, proxy=proxy,
+                                            trace_request_ctx=context.trace(proxy, "http")) as resp:
                 return resp.status == 200
     except Exception:
         return False
 
 
 @ProxyValidator.addHttpsValidator
-async def httpsTimeOutValidator(proxy):
+async def httpsTimeOutValidator(proxy, context=None):
     """HTTPS detection with timeout using aiohttp"""
     try:
-        timeout = aiohttp.ClientTimeout(total=conf.verifyTimeout)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.head(conf.httpsUrl, headers=HEADER, proxy=proxy, ssl=False) as resp:
+        async with ValidationContext.borrow(context) as context:
+            async with context.session.head(conf.httpsUrl, headers=HEADER, proxy=proxy,
+                                            trace_request_ctx=context.trace(proxy, "https")) as resp:
                 return resp.status == 200
     except Exception:
         return False
 
 
 @ProxyValidator.addSocksValidator
-async def socksTimeOutValidator(proxy):
+async def socksTimeOutValidator(proxy, context=None):
     """SOCKS detection with timeout using aiohttp"""
+    if conf.verifySocksNative and proxy.startswith("socks5://"):
+        return await socks5HandshakeValidator(proxy, context)
     # Note: For SOCKS proxies, you need to install aiohttp_socks
     try:
-        timeout = aiohttp.ClientTimeout(total=conf.verifyTimeout)
-        connector = ProxyConnector.from_url(proxy)
-        async with aiohttp.ClientSession(
-                connector=connector,
-                timeout=timeout
-        ) as session, session.get(conf.httpsUrl, headers=HEADER, ssl=False) as resp:
-            return resp.status == 200
+        async with ValidationContext.borrow(context) as context:
+            async with context.socksSession(proxy) as session, \
+                    session.get(conf.httpsUrl, headers=HEADER,
+                                trace_request_ctx=context.trace(proxy, "socks")) as resp:
+                return resp.status == 200
     except Exception as e:
         # logger.exception(f'socksTimeOutValidator error: {e}')
         return False
 
 
+async def socks5HandshakeValidator(proxy, context=None):
+    """SOCKS5 detection on plain asyncio streams: handshake, then a HEAD request to HTTP_URL"""
+    timing = context.trace(proxy, "socks") if context is not None else None
+    try:
+        status = await asyncio.wait_for(socks5.httpStatus(proxy, conf.httpUrl, HEADER, timing), conf.verifyTimeout)
+        return status == 200
+    except Exception:
+        return False
+
+
 @ProxyValidator.addHttpValidator
-async def customValidatorExample(proxy):
+async def customValidatorExample(proxy, context=None):
     """Custom validator function, check if the proxy is available, return True/False"""
     # Implement your custom validation logic here
     return True
@@ -122,14 +265,14 @@ async def test():
     proxies = [x.get('proxy') for x in data]
     tasks = []
 
-    async with aiohttp.ClientSession() as session:
+    async with ValidationContext() as context:
         for proxy in proxies:
             p = ProxyValidator()
             for func in p.socks_validator:
-                task = asyncio.create_task(func(proxy))  # 使用 create_task 提交任务
+                task = asyncio.create_task(func(proxy, context))  # 使用 create_task 提交任务
                 tasks.append(task)
 
-    res = await asyncio.gather(*tasks)
+        res = await asyncio.gather(*tasks)
     for i in range(len(proxies)):
         proxy = proxies[i]
         resi = res[i]
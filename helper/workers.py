@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     workers.py
+   Description :   Run the checkers in several processes
+   Author :        JHao
+   Date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18: Worker processes sharded by proxy hash, stats reported to the parent
+                   2026/10/18: Dispatch fetched proxies in batches while fetching
+                   2026/10/18: Bounded raw queues, dispatch waits for the workers to catch up
+                   2026/10/18: One raw checker per worker fed from a bounded queue, reindex before the workers start
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import zlib
+import queue
+import asyncio
+import collections
+import multiprocessing
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from loguru import logger
+
+from helper.proxy import Proxy
+from helper.fetch import Fetcher
+from helper.check import Checker
+from helper.scheduler import checkDue
+from handler.logHandler import LogHandler
+from handler.proxyHandler import ProxyHandler
+from handler.configHandler import ConfigHandler
+
+# tells a worker to exit, sent on its raw queue
+STOP = "stop"
+
+# seconds between two rounds of due checks in a worker
+CHECK_INTERVAL = 60
+
+# fetched proxies sent to the workers at once
+DISPATCH_SIZE = 500
+
+# batches waiting on the raw queue of a worker, fetching pauses while a queue is full
+RAW_QUEUE_SIZE = 4
+
+
+def shardOf(proxy_str, count):
+    """
+    Worker a proxy belongs to, the same hash as the db shards
+    :param proxy_str: proxy url
+    :param count: number of workers
+    :return: index
+    """
+    return zlib.crc32(proxy_str.encode("utf-8")) % count
+
+
+def _getBatch(raw_queue):
+    """ blocking get with a timeout, so the executor thread never outlives the worker """
+    try:
+        return raw_queue.get(timeout=1)
+    except queue.Empty:
+        return None
+
+
+def _putBatch(raw_queue, batch):
+    """ blocking put with a timeout, False while the worker is behind """
+    try:
+        raw_queue.put(batch, timeout=1)
+        return True
+    except queue.Full:
+        return False
+
+
+async def _enqueue(proxy_queue, proxy, checker):
+    """ put on the checker queue, waiting while it is full, unless the checker stopped taking proxies """
+    if not proxy_queue.full():
+        proxy_queue.put_nowait(proxy)
+        return
+    put = asyncio.ensure_future(proxy_queue.put(proxy))
+    await asyncio.wait([put, checker], return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        await checker
+        raise RuntimeError("raw checker stopped")
+
+
+async def _workerLoop(index, raw_queue, stats_queue):
+    loop = asyncio.get_running_loop()
+
+    def report(work_type, stats, start):
+        stats_queue.put({"worker": index, "type": work_type, "checked": stats["checked"],
+                         "passed": stats["passed"], "seconds": time.monotonic() - start})
+
+    async def checkRaw():
+        # one checker for the life of the worker, so a slow proxy holds up one validation
+        # slot instead of the next batch, and a full queue holds up the parent's dispatch
+        proxy_queue = asyncio.Queue(maxsize=ConfigHandler().checkQueueSize)
+        stats, reported = collections.Counter(), collections.Counter()
+        start = time.monotonic()
+
+        def reportRaw():
+            """ report what the raw checker did since the last report """
+            nonlocal start
+            delta = stats - reported
+            if delta["checked"]:
+                report("raw", delta, start)
+                reported.update(delta)
+                start = time.monotonic()
+
+        async def reportEvery():
+            while True:
+                await asyncio.sleep(CHECK_INTERVAL)
+                reportRaw()
+
+        checker = asyncio.create_task(Checker("raw", proxy_queue, stats))
+        reporter = asyncio.create_task(reportEvery())
+        try:
+            while True:
+                batch = await loop.run_in_executor(None, _getBatch, raw_queue)
+                if batch == STOP:
+                    break
+                for item in batch or []:
+                    await _enqueue(proxy_queue, Proxy.createFromJson(item), checker)
+            await _enqueue(proxy_queue, None, checker)
+            await checker
+            reportRaw()
+        finally:
+            reporter.cancel()
+            checker.cancel()
+
+    async def checkUse():
+        while True:
+            start = time.monotonic()
+            try:
+                stats = await checkDue()
+                if stats["checked"]:
+                    report("use", stats, start)
+            except Exception as e:
+                logger.error(f"Worker {index}: due check error: {e}")
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    use_task = asyncio.create_task(checkUse())
+    try:
+        await checkRaw()
+    finally:
+        use_task.cancel()
+
+
+def workerMain(index, raw_queue, stats_queue):
+    """
+    Entry point of a worker process: checks the fetched proxies of its shard that the
+    parent sends, and claims due proxies from the db like the single process scheduler
+    :param index: worker index
+    :param raw_queue: multiprocessing queue of fetched proxy batches
+    :param stats_queue: multiprocessing queue the stats of each checker run are put on
+    """
+    try:
+        asyncio.run(_workerLoop(index, raw_queue, stats_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+class WorkerPool(object):
+    """
+    Checker processes, each with its own event loop and validators
+
+    Fetched proxies are sharded over the workers by hash. Due proxies are claimed from
+    the db by every worker, the claim lease keeps them apart. Results go to the db, the
+    workers report the counts of every checker run to the parent.
+    """
+
+    def __init__(self, count):
+        self.count = count
+        # a forked child would inherit the event loop and the db connections of the parent
+        self.context = multiprocessing.get_context("spawn")
+        self.raw_queues = [self.context.Queue(maxsize=RAW_QUEUE_SIZE) for _ in range(count)]
+        self.stats_queue = self.context.Queue()
+        self.processes = [None] * count
+        self.totals = collections.Counter()
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+
+    def _spawn(self, index):
+        process = self.context.Process(target=workerMain, name=f"checker_{index}", daemon=True,
+                                       args=(index, self.raw_queues[index], self.stats_queue))
+        process.start()
+        self.processes[index] = process
+
+    async def dispatch(self, proxies):
+        """
+        Send fetched proxies to the workers of their shards, waiting while a raw queue is full
+        :param proxies: list of Proxy
+        """
+        loop = asyncio.get_running_loop()
+        batches = [[] for _ in range(self.count)]
+        for proxy in proxies:
+            batches[shardOf(proxy.proxy, self.count)].append(proxy.to_dict)
+        for raw_queue, batch in zip(self.raw_queues, batches):
+            # in an executor, so collect keeps running and restarts a worker that died
+            while batch and not await loop.run_in_executor(None, _putBatch, raw_queue, batch):
+                pass
+
+    def collect(self):
+        """ log the stats reported since the last call, restart dead workers """
+        while True:
+            try:
+                stats = self.stats_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.totals.update({"%s_checked" % stats["type"]: stats["checked"],
+                                "%s_passed" % stats["type"]: stats["passed"]})
+            logger.info(f"WorkerPool: worker {stats['worker']} {stats['type']} checked {stats['checked']}, "
+                        f"passed {stats['passed']} in {stats['seconds']:.1f}s; total {dict(self.totals)}")
+
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.error(f"WorkerPool: worker {index} exited with {process.exitcode}, restarting")
+                self._spawn(index)
+
+    def stop(self, timeout=10):
+        for raw_queue in self.raw_queues:
+            try:
+                raw_queue.put(STOP, timeout=timeout)
+            except queue.Full:
+                pass
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+
+async def main(count):
+    """
+    Scheduler of `schedule --workers N`: fetches in this process, checks in N workers
+    :param count: number of worker processes
+    """
+    conf = ConfigHandler()
+    # Indexes may lag behind records written by an older version, rebuilt before any
+    # worker writes, a rebuild replaces the index sets and counters written meanwhile
+    await ProxyHandler().db.reindex()
+    pool = WorkerPool(count)
+    pool.start()
+    fetch_lock = asyncio.Lock()
+
+    async def runProxyFetch():
+        if fetch_lock.locked():
+            return
+        async with fetch_lock:
+            proxies = []
+            async for proxy in Fetcher().run():
+                proxies.append(proxy)
+                if len(proxies) >= DISPATCH_SIZE:
+                    await pool.dispatch(proxies)
+                    proxies = []
+            await pool.dispatch(proxies)
+
+    async def runPoolSizeCheck():
+        total = (await ProxyHandler().db.getCount()).get("total", 0)
+        if total < conf.poolSizeMin:
+            await runProxyFetch()
+
+    scheduler = AsyncIOScheduler(logger=LogHandler("scheduler"), timezone=conf.timezone,
+                                 job_defaults={'coalesce': False, 'max_instances': 10})
+    scheduler.add_job(runProxyFetch, 'interval', minutes=10, id="proxy_fetch", name="Proxy Fetch")
+    scheduler.add_job(runPoolSizeCheck, 'interval', minutes=1, id="pool_size_check", name="Pool Size Check")
+    scheduler.start()
+
+    await runProxyFetch()
+
+    try:
+        while True:
+            pool.collect()
+            await asyncio.sleep(1)
+    finally:
+        scheduler.shutdown()
+        pool.stop()
@@ -19,7 +19,7 @@ import click
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 
-from helper.launcher import startServer, startScheduler
+from helper.launcher import startServer, startScheduler, startReindex, startMigrate
 from setting import BANNER, VERSION
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
@@ -31,10 +31,11 @@ def cli():
 
 
 @cli.command(name="schedule")
-def schedule():
+@click.option("--workers", default=1, type=click.IntRange(min=1), help="校验进程数, 大于1时按代理哈希分片到多个进程")
+def schedule(workers):
     """ 启动调度程序 """
     click.echo(BANNER)
-    startScheduler()
+    startScheduler(workers)
 
 
 @cli.command(name="server")
@@ -44,5 +45,19 @@ def server():
     startServer()
 
 
+@cli.command(name="reindex")
+def reindex():
+    """ 重建索引与计数 """
+    click.echo(BANNER)
+    startReindex()
+
+
+@cli.command(name="migrate")
+def migrate():
+    """ 按DB_SERIALIZER重写已存储的代理 """
+    click.echo(BANNER)
+    startMigrate()
+
+
 if __name__ == '__main__':
     cli()
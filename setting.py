@@ -37,16 +37,36 @@ HOST = "0.0.0.0"
 
 PORT = 5010
 
+# serve /get from an in-process snapshot of the valid proxies, kept current by db change events
+API_CACHE = True
+
+# full resync of the snapshot every API_CACHE_RESYNC seconds, the bound on its staleness
+API_CACHE_RESYNC = 300
+
 # ############### database config ###################
 # db connection uri
 # example:
 #      Redis: redis://:password@ip:port/db
 #      Ssdb:  ssdb://:password@ip:port
+#      Redis Cluster: rediscluster://:password@ip:port  (any node of the cluster)
+#      Sqlite: sqlite://relative/path.db or sqlite:///absolute/path.db
+#      Memory: memory://  (in-process, for tests and benchmarks)
 DB_CONN = 'redis://:@192.168.50.88:6379/0'
 
 # proxy table name
 TABLE_NAME = 'use_proxy'
 
+# proxy record encoding:
+#      json:    JSON object keyed by attribute name
+#      compact: JSON array of attribute values, smaller and faster to parse
+# records written with either encoding stay readable, `python proxyPool.py migrate` rewrites them
+DB_SERIALIZER = 'json'
+
+# number of redis hashes a table is split into by crc32(proxy), each with its own indexes,
+# raise it to spread the table over the nodes of a cluster.
+# after raising it from 1, `python proxyPool.py migrate` moves the existing records into the shards
+DB_SHARDS = 1
+
 with open(os.path.join(datadir, 'socks5.txt'), 'r') as f:
     socks5_urls = f.readlines()
 
@@ -82,6 +102,17 @@ SOCKS_utl = "https://www.qq.com"
 # 代理验证时超时时间
 VERIFY_TIMEOUT = 3
 
+# 校验方式:
+#      sequential: 依次请求HTTP_URL/HTTPS_URL判断可用和https支持, 可用后再获取出口ip
+#      combined:   通过代理获取出口ip即判断为可用, https支持与其同时校验, 单个代理耗时约为一次请求
+VERIFY_MODE = 'sequential'
+
+# 是否校验https支持
+VERIFY_HTTPS = True
+
+# socks5代理直接进行SOCKS5握手并向HTTP_URL发送HEAD请求校验, 不经过aiohttp; 为False时通过aiohttp_socks请求HTTPS_URL
+VERIFY_SOCKS_NATIVE = True
+
 # 近PROXY_CHECK_COUNT次校验中允许的最大失败次数,超过则剔除代理
 MAX_FAIL_COUNT = 0
 
@@ -91,6 +122,56 @@ MAX_FAIL_COUNT = 0
 # proxyCheck时代理数量少于POOL_SIZE_MIN触发抓取
 POOL_SIZE_MIN = 20
 
+# 代理校验间隔, 单位秒. 新代理和刚失败过的代理按此间隔校验, 之后每连续成功一次间隔翻倍, 最长PROXY_CHECK_MAX_INTERVAL秒
+PROXY_CHECK_INTERVAL = 300
+
+PROXY_CHECK_MAX_INTERVAL = 3600
+
+# 每个进程每秒最多校验的已入池代理数量, 为0时不限制
+PROXY_CHECK_RATE = 0
+
+# 每批从数据库领取的待校验代理数量
+PROXY_CHECK_BATCH = 500
+
+# 领取后未写回结果的代理在PROXY_CHECK_LEASE秒后重新进入待校验
+PROXY_CHECK_LEASE = 600
+
+# 校验结果批量写入数据库: 缓存达到CHECK_FLUSH_SIZE条或距上次写入超过CHECK_FLUSH_INTERVAL秒时写入
+CHECK_FLUSH_SIZE = 200
+
+CHECK_FLUSH_INTERVAL = 1
+
+# 同时进行的校验数量在CHECK_CONCURRENCY_MIN和CHECK_CONCURRENCY_MAX之间自动调整:
+# 超时的校验比例超过CHECK_TIMEOUT_TARGET, 或事件循环延迟超过CHECK_LAG_TARGET秒, 或打开的文件数接近上限时减少, 否则逐步增加;
+# 进程启动时从CHECK_CONCURRENCY_START开始, 之后各批校验沿用调整后的数量
+CHECK_CONCURRENCY_MIN = 10
+
+CHECK_CONCURRENCY_MAX = 500
+
+CHECK_CONCURRENCY_START = 50
+
+CHECK_TIMEOUT_TARGET = 0.3
+
+CHECK_LAG_TARGET = 0.2
+
+# 每个代理保留最近CHECK_HISTORY_SIZE次检测记录(时间, 失败阶段, 耗时), 每条7字节
+CHECK_HISTORY_SIZE = 16
+
+# 新抓取的代理先只建立TCP连接, 连接成功的才进行完整校验; 连接超时时间, 单位秒, 为0时不预筛
+CHECK_CONNECT_TIMEOUT = 1
+
+# 同时建立的TCP连接数量, 不超过可打开文件数的余量
+CHECK_CONNECT_CONCURRENCY = 1000
+
+# 抓取与校验之间的队列长度, 抓到的代理边抓边校验, 队列满时抓取暂停等待校验
+CHECK_QUEUE_SIZE = 1000
+
+# 校验失败的代理在DEAD_CACHE_TTL秒内不再从抓取结果中校验, 连续失败时时间翻倍, 最长DEAD_CACHE_MAX_TTL秒;
+# 过期超过DEAD_CACHE_MAX_TTL秒未再失败的记录被清除; DEAD_CACHE_TTL为0时不启用
+DEAD_CACHE_TTL = 1800
+
+DEAD_CACHE_MAX_TTL = 86400
+
 # ############# proxy attributes #################
 # 是否启用代理地域属性
 PROXY_REGION = True
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     benchProxyClass
+   Description :   Proxy对象的内存占用和耗时
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import tracemalloc
+
+from helper.proxy import Proxy
+from util import fastJson
+
+
+def benchProxyClass(count=100000):
+    proxy_strs = ["http://10.%d.%d.%d:%d" % (i >> 16 & 255, i >> 8 & 255, i & 255, 1000 + i % 50000)
+                  for i in range(count)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    proxies = [Proxy(proxy_str, source="freeProxy01") for proxy_str in proxy_strs]
+    create_time = time.perf_counter() - start
+    create_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for proxy in proxies:
+        proxy.add_source("freeProxy02")
+        proxy.add_source("freeProxy01")
+    source_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for proxy in proxies:
+        proxy.to_json
+    json_time = time.perf_counter() - start
+
+    # cached until the next change
+    start = time.perf_counter()
+    for proxy in proxies:
+        proxy.to_json
+    cached_time = time.perf_counter() - start
+
+    print("Proxy x %d, json encoder: %s" % (count, "orjson" if fastJson.orjson else "json"))
+    print("  create      %6.2f us  %5d bytes / record" % (create_time / count * 1e6, create_size / count))
+    print("  add_source  %6.2f us / record" % (source_time / count * 1e6))
+    print("  to_json     %6.2f us / record" % (json_time / count * 1e6))
+    print("  cached      %6.2f us / record" % (cached_time / count * 1e6))
+
+
+if __name__ == '__main__':
+    benchProxyClass()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testCheckPrefilter
+   Description :   TCP连接预筛, 用本地端口
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import socket
+import asyncio
+import collections
+
+from helper import history
+from helper.proxy import Proxy
+from helper.check import tcpConnect, connectPrefilter
+
+
+class FakeBuffer(object):
+    """ records what the checker would write to the db """
+
+    def __init__(self):
+        self.put_proxies = []
+        self.deleted = []
+
+    async def put(self, proxy):
+        self.put_proxies.append(proxy)
+
+    async def delete(self, proxy):
+        self.deleted.append(proxy)
+
+
+def closedPort():
+    """ a port nothing listens on """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def testCheckPrefilter():
+    async def run():
+        server = await asyncio.start_server(lambda reader, writer: writer.close(), "127.0.0.1", 0)
+        open_port, closed_port = server.sockets[0].getsockname()[1], closedPort()
+
+        accepted, elapsed = await tcpConnect(Proxy("http://127.0.0.1:%d" % open_port), 1)
+        assert accepted and elapsed < 1
+        assert not (await tcpConnect(Proxy("http://127.0.0.1:%d" % closed_port), 1))[0]
+
+        source_queue, target_queue = asyncio.Queue(), asyncio.Queue()
+        for i in range(6):
+            source_queue.put_nowait(Proxy("http://127.0.0.1:%d" % (open_port if i % 2 else closed_port)))
+        source_queue.put_nowait(None)
+        result_buffer = FakeBuffer()
+        stats = collections.Counter(checked=0, passed=0)
+        await connectPrefilter("raw", source_queue, target_queue, result_buffer, stats)
+
+        passed = []
+        while True:
+            proxy = target_queue.get_nowait()
+            if proxy is None:
+                break
+            passed.append(proxy)
+        assert target_queue.empty()
+        assert len(passed) == 3 and all(proxy.port == str(open_port) for proxy in passed)
+
+        # refused ones are failed checks, the connect counts stay out of the checker stats
+        assert stats == {"checked": 3, "passed": 0}, stats
+        assert len(result_buffer.put_proxies) == 3
+        for proxy in result_buffer.put_proxies:
+            assert not proxy.last_status
+            assert history.records(proxy.history)[-1][1] == history.PHASE_CONNECT
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+    print("CheckPrefilter ok!")
+
+
+if __name__ == '__main__':
+    testCheckPrefilter()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testConcurrency
+   Description :
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import asyncio
+
+from helper import concurrency
+from helper.concurrency import ConcurrencyController, RateLimiter
+
+
+def makeController(start=20):
+    return ConcurrencyController(10, 40, timeout_target=0.3, lag_target=0.2, start=start)
+
+
+def testControllerAdjust():
+    async def run():
+        open_files = concurrency.openFiles
+        concurrency.openFiles = lambda: (10, 100)
+        try:
+            # nothing waiting, nothing wrong: the limit stays
+            controller = makeController()
+            assert await controller.adjust(0) == 20
+
+            # too many timeouts, loop lag or open files cut it to 70%
+            for timed_out in [True] * 4 + [False] * 6:
+                controller.record(timed_out)
+            assert await controller.adjust(0) == 14
+            assert await makeController().adjust(0.5) == 14
+            concurrency.openFiles = lambda: (80, 100)
+            assert await makeController().adjust(0) == 14
+            concurrency.openFiles = lambda: (10, 100)
+
+            # a timeout rate from too few checks is ignored
+            controller = makeController()
+            for _ in range(4):
+                controller.record(True)
+            assert await controller.adjust(0) == 20
+
+            # workers that had to wait grow it by 5, within the ceiling
+            controller = makeController(start=38)
+            controller._blocked = True
+            assert await controller.adjust(0) == 40
+            controller._blocked = True
+            assert await controller.adjust(0) == 40
+            # and the cuts stop at the floor
+            controller = makeController(start=12)
+            assert await controller.adjust(1) == 10
+            assert await controller.adjust(1) == 10
+            assert makeController(start=1000).limit == 40 and makeController(start=0).limit == 10
+        finally:
+            concurrency.openFiles = open_files
+
+    asyncio.run(run())
+    print("ControllerAdjust ok!")
+
+
+def testControllerSlot():
+    async def run():
+        controller = makeController(start=10)
+        release = asyncio.Event()
+        peak = 0
+
+        async def validate():
+            nonlocal peak
+            async with controller.slot():
+                peak = max(peak, controller.in_flight)
+                await release.wait()
+
+        tasks = [asyncio.create_task(validate()) for _ in range(25)]
+        await asyncio.sleep(0.01)
+        assert controller.in_flight == 10 and controller._waiting == 15
+
+        # a raised limit lets waiting workers in right away
+        assert await controller.adjust(0) == 15
+        await asyncio.sleep(0.01)
+        assert controller.in_flight == 15 and peak == 15
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert controller.in_flight == 0 and controller._waiting == 0 and peak == 15
+
+        # the adjusting task lives as long as some checker run uses the controller
+        async with controller.running():
+            async with controller.running():
+                adjuster = controller._adjuster
+            assert not adjuster.done()
+        await asyncio.sleep(0)
+        assert adjuster.cancelled() and controller._adjuster is None
+
+    asyncio.run(run())
+    print("ControllerSlot ok!")
+
+
+def testRateLimiter():
+    async def run():
+        limiter = RateLimiter(20)
+        times = []
+
+        async def check(i):
+            await limiter.acquire()
+            times.append((i, time.monotonic()))
+
+        # callers go in the order they came, 1/rate apart, the first one right away
+        start = time.monotonic()
+        await asyncio.gather(*[check(i) for i in range(10)])
+        assert [i for i, _ in times] == list(range(10))
+        assert times[0][1] - start < 0.02
+        gaps = [later - earlier for (_, earlier), (_, later) in zip(times, times[1:])]
+        assert all(0.04 <= gap < 0.1 for gap in gaps), gaps
+
+        # an idle limiter does not save up slots for a burst
+        await asyncio.sleep(0.2)
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        assert 0.09 <= time.monotonic() - start < 0.2
+
+    asyncio.run(run())
+    print("RateLimiter ok!")
+
+
+if __name__ == '__main__':
+    testControllerAdjust()
+    testControllerSlot()
+    testRateLimiter()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testDeadCache
+   Description :   最近失效代理的负缓存
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import os
+import time
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+from helper.proxy import Proxy
+from db.memoryClient import MemoryClient
+from db.sqliteClient import SqliteClient
+from handler.proxyHandler import ProxyHandler
+
+
+def deadHandler(db, ttl=100, max_ttl=1000):
+    """ ProxyHandler on the given db client, without the configured one """
+    handler = ProxyHandler.__new__(ProxyHandler)
+    handler.conf = SimpleNamespace(deadCacheTtl=ttl, deadCacheMaxTtl=max_ttl)
+    handler.db = db
+    db.changeTable("use_proxy")
+    return handler
+
+
+def testDeadCache():
+    async def run(db):
+        handler = deadHandler(db)
+        proxy, other = Proxy("http://127.0.0.1:80"), Proxy("http://127.0.0.2:80")
+
+        # the ban doubles with every failure in a row up to the max
+        for strikes, ttl in enumerate([100, 200, 400, 800, 1000, 1000], 1):
+            start = time.time()
+            await handler.markDead([proxy])
+            expiry, count = (await db.getDead([proxy.proxy]))[proxy.proxy]
+            assert count == strikes and start + ttl <= expiry <= time.time() + ttl, (strikes, expiry - start)
+        assert await handler.deadProxies() == {proxy.proxy}
+
+        # a pass starts the strikes over
+        await handler.clearDead([proxy])
+        assert await handler.deadProxies() == set()
+        await handler.markDead([proxy])
+        assert (await db.getDead([proxy.proxy]))[proxy.proxy][1] == 1
+
+        # an ended ban still counts for the next failure, until it ended longer than the max ago
+        now = time.time()
+        await db.putDead({proxy.proxy: (now - 10, 3), other.proxy: (now - 2000, 3)})
+        assert await handler.deadProxies() == set()
+        assert await db.getDead([other.proxy]) == {}
+        await handler.markDead([proxy, other])
+        entries = await db.getDead([proxy.proxy, other.proxy])
+        assert entries[proxy.proxy][1] == 4 and entries[proxy.proxy][0] >= now + 800
+        assert entries[other.proxy][1] == 1 and entries[other.proxy][0] < now + 200
+
+        # a ttl of 0 turns the cache off
+        handler = deadHandler(db, ttl=0)
+        await handler.markDead([Proxy("http://127.0.0.3:80")])
+        assert await handler.deadProxies() == set()
+        assert await db.getDead(["http://127.0.0.3:80"]) == {}
+
+    asyncio.run(run(MemoryClient()))
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(SqliteClient(path=os.path.join(directory, "proxy.db"))))
+    print("DeadCache ok!")
+
+
+if __name__ == '__main__':
+    testDeadCache()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testDoValidator
+   Description :   检测间隔, 合并校验模式, use检测限速
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import asyncio
+from types import SimpleNamespace
+
+from helper import check
+from helper import history
+from helper.proxy import Proxy
+from helper.check import DoValidator, useRateLimiter
+from helper.concurrency import RateLimiter
+from helper.validator import ProxyValidator, httpTimeOutValidator
+
+
+def withHistory(phases):
+    proxy = Proxy("http://127.0.0.1:80")
+    for i, phase in enumerate(phases):
+        proxy.history = history.append(proxy.history, 1000 + i, phase, 0.1, 10)
+    return proxy
+
+
+def intervals(proxy, samples=200):
+    return [DoValidator.checkInterval(proxy) for _ in range(samples)]
+
+
+def testCheckInterval():
+    conf = DoValidator.conf
+    DoValidator.conf = SimpleNamespace(proxyCheckInterval=60, proxyCheckMaxInterval=1000)
+    try:
+        ok, failed = history.PHASE_OK, history.PHASE_HTTP
+        # doubled for every success in a row after the first, up to the max, within the jitter
+        for streak, interval in enumerate([60, 60, 120, 240, 480, 960, 1000, 1000]):
+            values = intervals(withHistory([failed] + [ok] * streak))
+            assert all(interval * 0.9 <= value <= interval * 1.1 for value in values), (streak, values)
+            assert min(values) < interval < max(values)
+
+        # a failure starts over at the base interval
+        values = intervals(withHistory([ok] * 8 + [failed]))
+        assert all(54 <= value <= 66 for value in values)
+
+        # a max below the base keeps the base
+        DoValidator.conf = SimpleNamespace(proxyCheckInterval=60, proxyCheckMaxInterval=10)
+        assert all(54 <= value <= 66 for value in intervals(withHistory([ok] * 8)))
+    finally:
+        DoValidator.conf = conf
+    print("CheckInterval ok!")
+
+
+def testCombinedValidator():
+    async def run():
+        calls = []
+
+        async def outbound(proxy, context=None):
+            calls.append("outbound")
+            await asyncio.sleep(0.2)
+            return "" if proxy.endswith(":81") else "10.0.0.1"
+
+        def validator(name, result):
+            async def func(proxy, context=None):
+                calls.append(name)
+                await asyncio.sleep(0.2)
+                return result
+            return func
+
+        ProxyValidator.http_validator = [httpTimeOutValidator, validator("custom", True)]
+        ProxyValidator.https_validator = [validator("https", True)]
+        ProxyValidator.socks_validator = [validator("socks", True)]
+        check.get_outbound_ip = outbound
+
+        # the outbound ip lookup is the liveness check, custom and https checks run next to it
+        start = time.monotonic()
+        result = await DoValidator.combinedValidator(Proxy("http://127.0.0.1:80"))
+        assert time.monotonic() - start < 0.35
+        assert result[:3] == (True, True, "10.0.0.1") and 0.2 <= result[3] < 0.35
+        assert result[4] == history.PHASE_OK and sorted(calls) == ["custom", "https", "outbound"]
+
+        # no outbound ip or a failed custom validator fail the http phase, https is not reported then
+        status, https, _, _, phase = await DoValidator.combinedValidator(Proxy("http://127.0.0.1:81"))
+        assert (status, https, phase) == (False, False, history.PHASE_HTTP)
+        ProxyValidator.http_validator = [validator("custom", False)]
+        status, https, ip, _, phase = await DoValidator.combinedValidator(Proxy("http://127.0.0.1:80"))
+        assert (status, https, ip, phase) == (False, False, "10.0.0.1", history.PHASE_HTTP)
+
+        # https is checked only if VERIFY_HTTPS, never for socks
+        ProxyValidator.http_validator = []
+        DoValidator.conf = SimpleNamespace(verifyHttps=False)
+        calls.clear()
+        assert (await DoValidator.combinedValidator(Proxy("http://127.0.0.1:80")))[:2] == (True, False)
+        assert calls == ["outbound"]
+        DoValidator.conf = SimpleNamespace(verifyHttps=True)
+        calls.clear()
+        result = await DoValidator.combinedValidator(Proxy("socks5://127.0.0.1:80"))
+        assert result[:2] == (True, False) and sorted(calls) == ["outbound", "socks"]
+        status, _, _, _, phase = await DoValidator.combinedValidator(Proxy("socks5://127.0.0.1:81"))
+        assert (status, phase) == (False, history.PHASE_SOCKS)
+
+    saved = (ProxyValidator.http_validator, ProxyValidator.https_validator, ProxyValidator.socks_validator,
+             check.get_outbound_ip, DoValidator.conf)
+    DoValidator.conf = SimpleNamespace(verifyHttps=True)
+    try:
+        asyncio.run(run())
+    finally:
+        (ProxyValidator.http_validator, ProxyValidator.https_validator, ProxyValidator.socks_validator,
+         check.get_outbound_ip, DoValidator.conf) = saved
+    print("CombinedValidator ok!")
+
+
+def testUseRateLimiter():
+    saved = check._use_limiter
+    check._use_limiter = None
+    try:
+        assert useRateLimiter(SimpleNamespace(proxyCheckRate=0)) is None
+        limiter = useRateLimiter(SimpleNamespace(proxyCheckRate=5))
+        assert isinstance(limiter, RateLimiter) and limiter.rate == 5
+        # one limiter for all use checks of the process
+        assert useRateLimiter(SimpleNamespace(proxyCheckRate=5)) is limiter
+    finally:
+        check._use_limiter = saved
+    print("UseRateLimiter ok!")
+
+
+if __name__ == '__main__':
+    testCheckInterval()
+    testCombinedValidator()
+    testUseRateLimiter()
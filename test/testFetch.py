@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testFetch
+   Description :   Fetcher.run, 用假的采集函数
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import asyncio
+from types import SimpleNamespace
+
+from helper import fetch
+from helper.proxy import Proxy
+from helper.fetch import Fetcher
+from db.memoryClient import MemoryClient
+from handler.proxyHandler import ProxyHandler
+
+
+def fakeFetcher(fetchers, queue_size=100):
+    """
+    Fetcher on a memory db, fetching with the given functions
+    :param fetchers: dict of name: async generator function yielding proxy_data
+    :param queue_size: CHECK_QUEUE_SIZE
+    """
+    handler = ProxyHandler.__new__(ProxyHandler)
+    handler.conf = SimpleNamespace(deadCacheTtl=100, deadCacheMaxTtl=1000)
+    handler.db = MemoryClient()
+    handler.db.changeTable("use_proxy")
+    fetcher = Fetcher.__new__(Fetcher)
+    fetcher.conf = SimpleNamespace(checkQueueSize=queue_size, fetchers=list(fetchers))
+    fetcher.proxy_handler = handler
+    return fetcher, SimpleNamespace(**fetchers)
+
+
+def proxyData(i, source):
+    return {"type": "http", "ip": "127.0.0.%d" % i, "port": 80, "source": source}
+
+
+async def fetchAll(fetcher, proxy_fetcher):
+    proxy_fetcher, fetch.ProxyFetcher = fetch.ProxyFetcher, proxy_fetcher
+    try:
+        return [proxy async for proxy in fetcher.run()]
+    finally:
+        fetch.ProxyFetcher = proxy_fetcher
+
+
+def testFetcherKnown():
+    async def run():
+        async def first():
+            for i in range(1, 5):
+                yield proxyData(i, "first")
+
+        async def second():
+            yield proxyData(1, "second")
+
+        fetcher, proxy_fetcher = fakeFetcher({"first": first, "second": second})
+        handler = fetcher.proxy_handler
+        stored, banned = Proxy("http://127.0.0.1:80", source="old"), Proxy("http://127.0.0.2:80", source="old")
+        await handler.db.putMany([stored, banned])
+        await handler.markDead([banned, Proxy("http://127.0.0.3:80")])
+
+        # stored proxies get their new sources even when they failed recently,
+        # only new proxies that did not fail recently are passed on
+        proxies = await fetchAll(fetcher, proxy_fetcher)
+        assert [proxy.proxy for proxy in proxies] == ["http://127.0.0.4:80"]
+        records = await handler.db.getMany([stored.proxy, banned.proxy])
+        assert set(records[stored.proxy]["source"].split(",")) == {"old", "first", "second"}
+        assert set(records[banned.proxy]["source"].split(",")) == {"old", "first"}
+
+    asyncio.run(run())
+    print("FetcherKnown ok!")
+
+
+def testFetcherStream():
+    async def run():
+        produced = []
+        slow_started = asyncio.Event()
+
+        async def fast():
+            for i in range(1, 201):
+                produced.append(i)
+                yield proxyData(i, "fast")
+
+        async def slow():
+            slow_started.set()
+            await asyncio.sleep(0.3)
+            for i in (1, 250):
+                yield proxyData(i, "slow")
+
+        fetcher, proxy_fetcher = fakeFetcher({"fast": fast, "slow": slow}, queue_size=10)
+        proxy_fetcher, fetch.ProxyFetcher = fetch.ProxyFetcher, proxy_fetcher
+        try:
+            start = time.monotonic()
+            proxies = fetcher.run()
+            first = await proxies.__anext__()
+            # the first proxy comes while the slow fetcher still runs
+            assert slow_started.is_set() and time.monotonic() - start < 0.2
+            # a consumer that does not keep up holds the fetchers back
+            await asyncio.sleep(0.1)
+            assert len(produced) <= 2 * 10 + 2, len(produced)
+            rest = [proxy async for proxy in proxies]
+        finally:
+            fetch.ProxyFetcher = proxy_fetcher
+
+        # every proxy once, a proxy found again gets the source of the later fetcher
+        proxies = {proxy.proxy: proxy for proxy in [first] + rest}
+        assert len(proxies) == len(rest) + 1 == 201
+        assert proxies["http://127.0.0.1:80"].source == "fast,slow"
+        assert proxies["http://127.0.0.250:80"].source == "slow"
+
+    asyncio.run(run())
+    print("FetcherStream ok!")
+
+
+if __name__ == '__main__':
+    testFetcherKnown()
+    testFetcherStream()
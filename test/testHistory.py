@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testHistory
+   Description :
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+from helper import history
+
+
+def testHistory():
+    data = ""
+    for i, (phase, latency) in enumerate([(history.PHASE_OK, 0.1), (history.PHASE_HTTP, 5),
+                                          (history.PHASE_OK, 0.3), (history.PHASE_OK, 0.2)]):
+        data = history.append(data, 1000 + i, phase, latency, 3)
+    assert history.records(data) == [(1001, history.PHASE_HTTP, 5), (1002, history.PHASE_OK, 0.3),
+                                      (1003, history.PHASE_OK, 0.2)]
+    assert history.append(data, 1004, history.PHASE_OK, 0.1, 0) == ""
+
+    assert history.streak(data) == 2
+    assert history.summary(data) == {"checks": 3, "success_rate": 2 / 3, "latency_p50": 0.3,
+                                     "latency_p90": 0.3, "last_fail": "http"}
+    assert history.successRate(data) == 2 / 3
+    assert history.latencyPercentile(data, 0) == 0.2
+    assert history.summary("") == {"checks": 0, "success_rate": None, "latency_p50": None,
+                                   "latency_p90": None, "last_fail": ""}
+    print("History ok!")
+
+
+if __name__ == '__main__':
+    testHistory()
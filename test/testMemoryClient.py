@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testMemoryClient
+   Description :
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import asyncio
+
+from helper.proxy import Proxy
+from db.memoryClient import MemoryClient
+
+
+def testMemoryClient():
+    async def run():
+        db = MemoryClient()
+        db.changeTable("use_proxy")
+
+        proxies = []
+        for i in range(10):
+            proxy = Proxy("http://127.0.0.%d:80" % i, source="test")
+            proxy.last_status = i % 2 == 0
+            proxy.outbound_ip = "127.0.0.1"
+            proxy.https = i < 4
+            proxies.append(proxy)
+        assert await db.putMany(proxies) == 10
+        assert await db.put(proxies[0]) == 0
+        assert await db.getCount() == {"total": 10, "valid": 5, "sources": {"test": 10}}
+
+        assert (await db.get())["last_status"]
+        assert (await db.get("https"))["https"]
+        assert await db.get("socks5") is None
+        indexes = set(db._MemoryClient__tables["use_proxy"].indexes)
+        assert await db.get("nonsense") is None and await db.pop("nonsense") is None
+        assert set(db._MemoryClient__tables["use_proxy"].indexes) == indexes
+
+        assert len(await db.claimDue(3, 600)) == 3
+        assert len(await db.claimDue(100, 600)) == 7
+        assert await db.claimDue(100, 600) == []
+
+        assert await db.exists(proxies[1].proxy)
+        assert await db.addSources({proxies[1].proxy: "test,more", "nope": "more"}) == [proxies[1].proxy]
+        assert (await db.getMany([proxies[1].proxy]))[proxies[1].proxy]["source"] == "test,more"
+        assert (await db.getCount())["sources"] == {"test": 9, "test,more": 1}
+        # the Proxy put in is left as it was
+        assert proxies[1].to_dict["source"] == "test" and proxies[1].source == "test"
+        assert await db.deleteMany([proxies[1].proxy, "nope"]) == 1
+        assert (await db.pop())["last_status"]
+        assert (await db.getCount())["total"] == 8
+
+        cursor, items = await db.scan(0, 5)
+        assert cursor == 5 and len(items) == 5
+        cursor, items = await db.scan(cursor, 5)
+        assert cursor == 0 and len(items) == 3
+
+        assert await db.reindex() == 8
+        assert (await db.getCount())["valid"] == 4
+        await db.clear()
+        assert await db.getAll() == []
+
+    asyncio.run(run())
+    print("MemoryClient ok!")
+
+
+if __name__ == '__main__':
+    testMemoryClient()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testProxyCache
+   Description :   API的进程内代理快照
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import asyncio
+
+from helper.proxy import Proxy
+from db.memoryClient import MemoryClient
+from handler.proxyHandler import ProxyHandler
+from api.proxyCache import Snapshot, ProxyCache
+
+
+def makeProxy(i, valid=True, region="", https=False, latency=0):
+    proxy = Proxy("http://127.0.0.%d:80" % i, region=region, latency=latency)
+    proxy.last_status = valid
+    proxy.outbound_ip = "127.0.0.1" if valid else ""
+    proxy.https = https
+    return proxy
+
+
+async def waitFor(condition, timeout=2):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    assert False, "timed out"
+
+
+def testSnapshot():
+    snapshot = Snapshot()
+    snapshot.put(makeProxy(1, region="Japan, Tokyo", https=True, latency=0.2).to_dict)
+    snapshot.put(makeProxy(2, region="Japan", latency=5).to_dict)
+    snapshot.put(makeProxy(3, valid=False).to_dict)
+    assert set(snapshot.proxies) == {makeProxy(1).proxy, makeProxy(2).proxy}
+
+    assert snapshot.get("https")["proxy"] == makeProxy(1).proxy
+    assert snapshot.get("http", "JAPAN")["proxy"] in snapshot.proxies
+    assert snapshot.get("socks5") is None and snapshot.get("", "china") is None
+    for _ in range(10):
+        assert snapshot.get(max_latency=1)["proxy"] == makeProxy(1).proxy
+    assert snapshot.get(max_latency=0.1) is None
+
+    # a proxy that turned invalid leaves every group, empty groups go away
+    snapshot.apply({"put": [makeProxy(1, valid=False).to_dict], "delete": [makeProxy(2).proxy]})
+    assert snapshot.proxies == {} and not snapshot.groups
+    print("Snapshot ok!")
+
+
+def testProxyCache():
+    async def run():
+        handler = ProxyHandler.__new__(ProxyHandler)
+        handler.db = MemoryClient()
+        handler.db.changeTable("use_proxy")
+        db = handler.db
+        assert db.supportsEvents
+        await db.putMany([makeProxy(1, region="Japan", https=True), makeProxy(2, region="China"),
+                          makeProxy(3, valid=False)])
+
+        cache = ProxyCache(handler, resync_interval=3600)
+        assert not cache.ready
+        task = asyncio.create_task(cache.run())
+        await waitFor(lambda: cache.ready)
+        assert cache.get("https")["proxy"] == makeProxy(1).proxy
+        assert cache.get(region="China")["proxy"] == makeProxy(2).proxy
+        assert cache.get("socks5") is None
+
+        # change events keep the snapshot current
+        await db.put(makeProxy(4, region="Peru"))
+        await waitFor(lambda: cache.get(region="Peru"))
+        await db.put(makeProxy(1, valid=False))
+        await db.delete(makeProxy(2).proxy)
+        await waitFor(lambda: cache.get("https") is None and cache.get(region="China") is None)
+
+        # events arriving while a resync scans are replayed on the new snapshot
+        scan = handler.iterAll
+
+        async def racingScan(*args, **kwargs):
+            changed = False
+            async for item in scan(*args, **kwargs):
+                if not changed:
+                    changed = True
+                    await db.delete(makeProxy(4).proxy)
+                    await db.put(makeProxy(5, region="Brazil"))
+                    await asyncio.sleep(0.05)
+                yield item
+
+        handler.iterAll = racingScan
+        cache.apply({"reset": True})
+        await cache._resync_task
+        assert cache.ready
+        assert set(cache._snapshot.proxies) == {makeProxy(5).proxy}
+
+        # a cleared pool resets the snapshot
+        handler.iterAll = scan
+        await db.clear()
+        await waitFor(lambda: cache.get() is None)
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    print("ProxyCache ok!")
+
+
+if __name__ == '__main__':
+    testSnapshot()
+    testProxyCache()
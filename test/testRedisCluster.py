@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testRedisCluster
+   Description :   集群模式下事务和脚本的key必须在同一个slot
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import time
+import asyncio
+
+from redis.crc import key_slot
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
+
+from helper.proxy import Proxy
+from db.redisClient import RedisClient
+
+
+def slotsOf(keys):
+    return {key_slot(key.encode("utf-8")) for key in keys}
+
+
+def testRedisClusterSlots():
+    try:
+        import fakeredis
+    except ImportError:
+        print("RedisCluster skipped, fakeredis not installed")
+        return
+
+    violations = []
+    pipeline_execute, script_call = Pipeline.execute, AsyncScript.__call__
+
+    async def execute(self, raise_on_error=True):
+        # a cluster refuses a MULTI whose commands, PUBLISH included, span several slots
+        if self.is_transaction:
+            keys = []
+            for args, _ in self.command_stack:
+                keys += args[1:3] if args[0].upper() == "RENAME" else args[1:2]
+            if len(slotsOf(keys)) > 1:
+                violations.append([args[0] for args, _ in self.command_stack])
+        return await pipeline_execute(self, raise_on_error)
+
+    async def call(self, keys=None, args=None, client=None):
+        if keys and len(slotsOf(keys)) > 1:
+            violations.append(keys)
+        return await script_call(self, keys=keys, args=args, client=client)
+
+    async def run():
+        db = RedisClient(host="127.0.0.1", port=6379, shards=4)
+        db._RedisClient__conn = fakeredis.FakeAsyncRedis(decode_responses=True)
+        db.changeTable("use_proxy")
+
+        proxies = []
+        for i in range(40):
+            proxy = Proxy("http://127.0.0.%d:80" % i, source="test")
+            proxy.last_status = True
+            proxy.outbound_ip = "127.0.0.1"
+            proxies.append(proxy)
+        assert await db.putMany(proxies) == 40
+        assert await db.put(proxies[0]) == 0
+        assert await db.deleteMany([proxy.proxy for proxy in proxies[:5]]) == 5
+        assert await db.pop() is not None
+        assert len(await db.claimDue(100, 600)) == 34
+        assert await db.reindex() == 34
+        await db.putDead({proxy.proxy: (time.time() - 10, 1) for proxy in proxies[:5]})
+        assert await db.deleteDead([proxies[0].proxy]) == 1
+        assert await db.purgeDead(time.time()) == 4
+        assert (await db.getCount())["total"] == 34
+
+    Pipeline.execute, AsyncScript.__call__ = execute, call
+    try:
+        asyncio.run(run())
+    finally:
+        Pipeline.execute, AsyncScript.__call__ = pipeline_execute, script_call
+    assert not violations, violations
+    print("RedisCluster ok!")
+
+
+if __name__ == '__main__':
+    testRedisClusterSlots()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testRedisIndex
+   Description :   并发写入时redis计数和索引集合保持一致
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import random
+import asyncio
+
+from helper.proxy import Proxy
+from db.redisClient import RedisClient
+
+
+def fakeClient(serializer="json", shards=1):
+    import fakeredis
+    db = RedisClient(host="127.0.0.1", port=6379, serializer=serializer, shards=shards)
+    db._RedisClient__conn = fakeredis.FakeAsyncRedis(decode_responses=True)
+    db.changeTable("use_proxy")
+    return db
+
+
+def makeProxy(i, valid, source="test"):
+    proxy = Proxy("http://127.0.0.%d:80" % i, source=source)
+    proxy.last_status = valid
+    proxy.outbound_ip = "127.0.0.1" if valid else ""
+    proxy.https = valid and i % 2 == 0
+    return proxy
+
+
+def testRedisCounters():
+    try:
+        import fakeredis
+    except ImportError:
+        print("RedisCounters skipped, fakeredis not installed")
+        return
+
+    async def run(serializer):
+        db = fakeClient(serializer, shards=2)
+
+        # writers racing on one new proxy count it once
+        await asyncio.gather(*[db.put(makeProxy(1, True)) for _ in range(3)])
+        assert await db.getCount() == {"total": 1, "valid": 1, "sources": {"test": 1}}
+
+        # the counters after concurrent puts and deletes match a rebuild from the records
+        random.seed(5)
+        tasks = []
+        for _ in range(300):
+            i = random.randrange(20)
+            if random.random() < 0.2:
+                tasks.append(db.delete(makeProxy(i, True).proxy))
+            else:
+                tasks.append(db.put(makeProxy(i, random.random() < 0.5, random.choice(["a", "b"]))))
+        for i in range(0, len(tasks), 30):
+            await asyncio.gather(*tasks[i:i + 30])
+        counted = await db.getCount()
+        await db.reindex()
+        assert counted == await db.getCount(), (counted, await db.getCount())
+
+    for serializer in ("json", "compact"):
+        asyncio.run(run(serializer))
+    print("RedisCounters ok!")
+
+
+def testRedisIndexSets():
+    try:
+        import fakeredis
+    except ImportError:
+        print("RedisIndexSets skipped, fakeredis not installed")
+        return
+
+    async def run():
+        db = fakeClient(shards=2)
+        conn = db._RedisClient__conn
+        random.seed(7)
+        for _ in range(10):
+            # the last write of a proxy decides whether get() and pop() may serve it
+            await asyncio.gather(*[db.put(makeProxy(i, random.random() < 0.5)) for i in range(10) for _ in range(3)])
+            for shard in db.shards:
+                stored = {proxy: RedisClient.isValid(item)
+                          for proxy, item in (await db.getMany([makeProxy(i, True).proxy for i in range(10)])).items()
+                          if db._RedisClient__shard(proxy) == shard}
+                valid = await conn.smembers("{%s}:valid" % shard)
+                https = await conn.smembers("{%s}:valid:https" % shard)
+                assert valid == {proxy for proxy, ok in stored.items() if ok}, (valid, stored)
+                assert https <= valid
+        while await db.pop():
+            pass
+        assert (await db.getCount())["valid"] == 0
+
+    asyncio.run(run())
+    print("RedisIndexSets ok!")
+
+
+def testRedisSources():
+    try:
+        import fakeredis
+    except ImportError:
+        print("RedisSources skipped, fakeredis not installed")
+        return
+
+    async def run(serializer):
+        db = fakeClient(serializer, shards=2)
+        conn = db._RedisClient__conn
+        first, second, missing = [makeProxy(i, True).proxy for i in (1, 2, 3)]
+        due_key = "{%s}:due" % db._RedisClient__shard(first)
+        await db.putMany([makeProxy(1, True, "a"), makeProxy(2, True, "a")])
+        due = await conn.zscore(due_key, first)
+
+        assert await db.addSources({first: "b", missing: "b"}) == [first]
+        record = (await db.getMany([first]))[first]
+        assert record["source"] == "a,b" and RedisClient.isValid(record)
+        assert await conn.zscore(due_key, first) == due
+        assert await db.getCount() == {"total": 2, "valid": 2, "sources": {"a": 1, "a,b": 1}}
+
+        # a checker result written between the read and the write is kept
+        hmget = conn.hmget
+
+        async def racingHmget(*args, **kwargs):
+            items = await hmget(*args, **kwargs)
+            await db.put(makeProxy(2, False, "a"))
+            return items
+
+        conn.hmget = racingHmget
+        assert await db.addSources({second: "c"}) == [second]
+        conn.hmget = hmget
+        record = (await db.getMany([second]))[second]
+        assert record["source"] == "a" and not RedisClient.isValid(record)
+        assert await db.getCount() == {"total": 2, "valid": 1, "sources": {"a": 1, "a,b": 1}}
+
+    asyncio.run(run("json"))
+    asyncio.run(run("compact"))
+    print("RedisSources ok!")
+
+
+def testRedisEvents():
+    try:
+        import fakeredis
+    except ImportError:
+        print("RedisEvents skipped, fakeredis not installed")
+        return
+
+    async def run(serializer):
+        db = fakeClient(serializer, shards=2)
+        conn = db._RedisClient__conn
+
+        # the scripts publish, a separate PUBLISH could reach subscribers out of order
+        async def noPublish(*args, **kwargs):
+            raise AssertionError("published outside a script")
+
+        conn.publish = noPublish
+        events = db.subscribe()
+        assert await events.__anext__() == {"reset": True}
+
+        await db.putMany([makeProxy(1, True, "a"), makeProxy(2, False, "a")])
+        await db.addSources({makeProxy(1, True).proxy: "b"})
+        await db.delete(makeProxy(2, True).proxy)
+        received = []
+        while not received or "delete" not in received[-1]:
+            received.append(await asyncio.wait_for(events.__anext__(), 1))
+        await events.aclose()
+
+        # putMany sends one event per shard
+        puts = [(item["proxy"], item["source"], item["last_status"])
+                for event in received[:-2] for item in event["put"]]
+        assert sorted(puts) == [(makeProxy(1, True).proxy, "a", True), (makeProxy(2, True).proxy, "a", False)]
+        assert [(item["proxy"], item["source"]) for item in received[-2]["put"]] == [(makeProxy(1, True).proxy, "a,b")]
+        assert received[-1] == {"delete": [makeProxy(2, True).proxy]}
+
+    asyncio.run(run("json"))
+    asyncio.run(run("compact"))
+    print("RedisEvents ok!")
+
+
+if __name__ == '__main__':
+    testRedisCounters()
+    testRedisIndexSets()
+    testRedisSources()
+    testRedisEvents()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testResultBuffer
+   Description :   检测结果批量写入
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import asyncio
+
+from helper.proxy import Proxy
+from helper.check import ResultBuffer
+
+
+class FakeHandler(object):
+    """ records the batches written, the methods named in `failing` raise """
+
+    def __init__(self):
+        self.calls = []
+        self.failing = set()
+
+    async def call(self, method, proxies):
+        await asyncio.sleep(0)
+        if method in self.failing:
+            raise ConnectionError("db down")
+        self.calls.append((method, sorted(proxy.proxy for proxy in proxies)))
+
+    async def putMany(self, proxies):
+        await self.call("putMany", proxies)
+
+    async def deleteMany(self, proxies):
+        await self.call("deleteMany", proxies)
+
+    async def markDead(self, proxies):
+        await self.call("markDead", proxies)
+
+    async def clearDead(self, proxies):
+        await self.call("clearDead", proxies)
+
+
+def makeProxy(i, valid=True):
+    proxy = Proxy("http://127.0.0.%d:80" % i)
+    proxy.last_status = valid
+    return proxy
+
+
+def testResultBuffer():
+    async def run():
+        handler = FakeHandler()
+        buffer = ResultBuffer(handler, size=3, interval=3600)
+        await buffer.put(makeProxy(1))
+        await buffer.delete(makeProxy(2, valid=False))
+        assert len(buffer) == 2 and not handler.calls
+
+        # the batch is written once it is full, the last result of a proxy wins
+        await buffer.put(makeProxy(2, valid=False))
+        await buffer.put(makeProxy(3))
+        assert len(buffer) == 0
+        assert handler.calls == [("putMany", [makeProxy(i).proxy for i in (1, 2, 3)]),
+                                 ("markDead", [makeProxy(2).proxy]),
+                                 ("clearDead", [makeProxy(1).proxy, makeProxy(3).proxy])]
+
+        # a batch the db failed to take waits for the next flush
+        handler.calls, handler.failing = [], {"putMany"}
+        await buffer.put(makeProxy(4))
+        await buffer.delete(makeProxy(5))
+        await buffer.flush()
+        assert len(buffer) == 2 and not handler.calls
+
+        # only the deletes are kept when the puts went through
+        handler.failing = {"deleteMany"}
+        await buffer.flush()
+        assert handler.calls == [("putMany", [makeProxy(4).proxy])]
+        assert buffer._delete.keys() == {makeProxy(5).proxy} and not buffer._put
+
+        # a newer result of a proxy is not replaced by the kept one
+        handler.calls = []
+        await buffer.delete(makeProxy(6))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        await buffer.put(makeProxy(6))
+        await flush
+        assert buffer._put.keys() == {makeProxy(6).proxy} and buffer._delete.keys() == {makeProxy(5).proxy}
+
+        # the negative cache failing does not write the batch again
+        handler.calls, handler.failing = [], {"markDead"}
+        await buffer.flush()
+        assert len(buffer) == 0
+        assert handler.calls == [("putMany", [makeProxy(6).proxy]), ("deleteMany", [makeProxy(5).proxy])]
+
+    asyncio.run(run())
+    print("ResultBuffer ok!")
+
+
+if __name__ == '__main__':
+    testResultBuffer()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testSqliteClient
+   Description :
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import tempfile
+
+from helper.proxy import Proxy
+from db.sqliteClient import SqliteClient
+
+
+def makeProxies(count):
+    proxies = []
+    for i in range(count):
+        proxy = Proxy("http://127.0.%d.%d:80" % (i // 250, i % 250), source="test")
+        proxy.last_status = i % 2 == 0
+        proxy.outbound_ip = "127.0.0.1"
+        proxy.https = i < 4
+        proxies.append(proxy)
+    return proxies
+
+
+def testSqliteClient():
+    async def run(path):
+        db = SqliteClient(path=path)
+        db.changeTable("use_proxy")
+        assert not db.supportsEvents and db.subscribe() is None
+
+        proxies = makeProxies(10)
+        assert await db.putMany(proxies) == 10
+        assert await db.put(proxies[0]) == 0
+        assert await db.getCount() == {"total": 10, "valid": 5, "sources": {"test": 10}}
+
+        assert (await db.get())["last_status"]
+        assert (await db.get("https"))["https"]
+        assert await db.get("socks5") is None
+        assert set(await db.getMany([proxies[1].proxy, "nope"])) == {proxies[1].proxy}
+
+        assert len(await db.claimDue(3, 600)) == 3
+        assert len(await db.claimDue(100, 600)) == 7
+        assert await db.claimDue(100, 600) == []
+
+        # a batch failing half way leaves nothing behind
+        try:
+            await db.deleteMany([proxies[1].proxy, object()])
+            assert False, "no error"
+        except Exception as e:
+            assert "not supported" in str(e), e
+        assert await db.exists(proxies[1].proxy)
+        assert await db.addSources({proxies[1].proxy: "test,more", "nope": "more"}) == [proxies[1].proxy]
+        assert (await db.getMany([proxies[1].proxy]))[proxies[1].proxy]["source"] == "test,more"
+        assert (await db.getCount())["sources"] == {"test": 9, "test,more": 1}
+
+        assert await db.deleteMany([proxies[1].proxy, "nope"]) == 1
+        assert (await db.pop())["last_status"]
+        assert (await db.getCount())["total"] == 8
+
+        cursor, items = await db.scan("", 5)
+        assert len(items) == 5
+        cursor, items = await db.scan(cursor, 5)
+        assert cursor == "" and len(items) == 3
+        assert len((await db.scan("", 100, valid=True))[1]) == 4
+
+        now = time.time()
+        await db.putDead({"http://1.1.1.1:80": (now + 100, 2), "http://1.1.1.2:80": (now - 100, 1)})
+        assert (await db.getDead(["http://1.1.1.1:80"]))["http://1.1.1.1:80"] == (now + 100, 2)
+        assert await db.listDead(now) == ["http://1.1.1.1:80"]
+        assert await db.purgeDead(now) == 1
+        assert await db.deleteDead(["http://1.1.1.1:80"]) == 1
+
+        await db.clear()
+        assert await db.getAll() == []
+
+    async def race(path):
+        # two connections to one file, as two uvicorn workers
+        first, second = SqliteClient(path=path), SqliteClient(path=path)
+        first.changeTable("use_proxy")
+        second.changeTable("use_proxy")
+        assert await first.putMany(makeProxies(200)) == 200
+        popped = []
+        for _ in range(60):
+            items = await asyncio.gather(first.pop(), second.pop())
+            popped += [item["proxy"] for item in items if item]
+        assert len(popped) == len(set(popped)) == 100
+        assert (await second.getCount())["total"] == 100
+
+        claimed = await asyncio.gather(first.claimDue(100, 600), second.claimDue(100, 600))
+        claimed = [item["proxy"] for items in claimed for item in items]
+        assert len(claimed) == len(set(claimed)) == 100
+
+    async def rewrite(path):
+        # a check result another process writes while reindex scans is kept
+        db = SqliteClient(path=path)
+        db.changeTable("use_proxy")
+        proxies = makeProxies(3)
+        assert await db.putMany(proxies) == 3
+        proxies[0].check_count = 7
+        other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        written = []
+
+        def keep(data):
+            if not written:
+                other.execute('UPDATE "use_proxy" SET data = ? WHERE proxy = ?',
+                              (json.dumps(proxies[0].to_dict), proxies[0].proxy))
+                written.append(True)
+            return False
+
+        assert await db._SqliteClient__rewrite(keep) == 2
+        other.close()
+        assert (await db.getMany([proxies[0].proxy]))[proxies[0].proxy]["check_count"] == 7
+        assert await db.reindex() == 3
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(os.path.join(directory, "proxy.db")))
+        asyncio.run(race(os.path.join(directory, "race.db")))
+        asyncio.run(rewrite(os.path.join(directory, "rewrite.db")))
+    print("SqliteClient ok!")
+
+
+if __name__ == '__main__':
+    testSqliteClient()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     testSsdbProtocol
+   Description :   SSDB原生协议的解析和连接池, 用本地的假服务端
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import asyncio
+
+from db.ssdbClient import SsdbConnection, SsdbConnectionPool, SsdbError
+
+
+async def readRequest(reader):
+    blocks = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        if line == b"\n":
+            return blocks
+        blocks.append((await reader.readexactly(int(line) + 1))[:-1].decode("utf-8"))
+
+
+async def serve(reader, writer):
+    """ echo返回参数, slow等待后返回, bad返回error, missing返回not_found """
+    while True:
+        request = await readRequest(reader)
+        if request is None:
+            break
+        command, args = request[0], request[1:]
+        if command == "slow":
+            await asyncio.sleep(0.3)
+        if command == "bad":
+            reply = ["error", "bad command"]
+        elif command == "missing":
+            reply = ["not_found"]
+        else:
+            reply = ["ok"] + args
+        writer.write(SsdbConnection.pack(*reply))
+        await writer.drain()
+    writer.close()
+
+
+def testSsdbProtocol():
+    async def run():
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        conn = SsdbConnection("127.0.0.1", port)
+        assert await conn.execute("echo", "a", "中文\n", "") == ["a", "中文\n", ""]
+        assert await conn.execute("missing", "a") is None
+
+        # an error reply in a pipeline still consumes the replies after it
+        try:
+            await conn.executeMany([("echo", "1"), ("bad",), ("echo", "2")])
+            assert False, "no SsdbError"
+        except SsdbError:
+            pass
+        assert await conn.execute("echo", "3") == ["3"]
+        conn.close()
+
+        pool = SsdbConnectionPool(max_connections=2, host="127.0.0.1", port=port)
+        results = await asyncio.gather(*[pool.execute("echo", str(i)) for i in range(10)])
+        assert results == [[str(i)] for i in range(10)]
+        assert pool._idle.qsize() <= 2
+
+        # a caller cancelled while waiting for its reply must not hand the connection back
+        task = asyncio.create_task(pool.execute("slow", "late"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.4)
+        for i in range(4):
+            assert await pool.execute("echo", "next%d" % i) == ["next%d" % i]
+
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(run())
+    print("SsdbProtocol ok!")
+
+
+if __name__ == '__main__':
+    testSsdbProtocol()
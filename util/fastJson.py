@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     fastJson
+   Description :   json dumps/loads, using orjson when it is installed
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson:
+    def dumps(obj):
+        return orjson.dumps(obj).decode("utf-8")
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    loads = json.loads
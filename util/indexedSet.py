@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     indexedSet
+   Description :
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import random
+
+
+class IndexedSet(object):
+    """
+    IndexedSet
+    explain: set with O(1) add, discard and random choice
+    """
+
+    def __init__(self, items=()):
+        self._items = []
+        self._index = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, item):
+        if item not in self._index:
+            self._index[item] = len(self._items)
+            self._items.append(item)
+
+    def discard(self, item):
+        index = self._index.pop(item, None)
+        if index is None:
+            return
+        last = self._items.pop()
+        if index < len(self._items):
+            self._items[index] = last
+            self._index[last] = index
+
+    def choice(self):
+        return random.choice(self._items) if self._items else None
+
+    def sample(self, k):
+        return random.sample(self._items, min(k, len(self._items)))
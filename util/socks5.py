@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+-------------------------------------------------
+   File Name：     socks5
+   Description :   SOCKS5 client handshake (RFC 1928/1929) on asyncio streams
+   Author :        JHao
+   date：          2026/10/18
+-------------------------------------------------
+   Change Activity:
+                   2026/10/18:
+-------------------------------------------------
+"""
+__author__ = 'JHao'
+
+import struct
+import asyncio
+from urllib.parse import urlsplit
+
+VERSION = 5
+AUTH_VERSION = 1
+
+METHOD_NO_AUTH = 0
+METHOD_USERNAME = 2
+METHOD_REFUSED = 0xFF
+
+CMD_CONNECT = 1
+
+ATYP_IPV4 = 1
+ATYP_DOMAIN = 3
+ATYP_IPV6 = 4
+
+ADDRESS_SIZE = {ATYP_IPV4: 4, ATYP_IPV6: 16}
+
+
+class Socks5Error(Exception):
+    """ the proxy refused or answered outside the protocol """
+
+
+async def handshake(reader, writer, host, port, username="", password=""):
+    """
+    Greeting, optional username/password auth and CONNECT on an open connection to the proxy
+    :param reader: asyncio.StreamReader
+    :param writer: asyncio.StreamWriter
+    :param host: target host name or ip, resolved by the proxy
+    :param port: target port
+    :param username: username for RFC 1929 auth, '' for none
+    :param password: password for RFC 1929 auth
+    :return: None, raises Socks5Error or asyncio.IncompleteReadError on failure
+    """
+    methods = bytes([METHOD_NO_AUTH, METHOD_USERNAME]) if username else bytes([METHOD_NO_AUTH])
+    writer.write(bytes([VERSION, len(methods)]) + methods)
+    version, method = await reader.readexactly(2)
+    if version != VERSION:
+        raise Socks5Error("not a socks5 proxy")
+    if method == METHOD_USERNAME and username:
+        user, secret = username.encode(), password.encode()
+        writer.write(bytes([AUTH_VERSION, len(user)]) + user + bytes([len(secret)]) + secret)
+        _, status = await reader.readexactly(2)
+        if status != 0:
+            raise Socks5Error("authentication failed")
+    elif method != METHOD_NO_AUTH:
+        raise Socks5Error("no acceptable auth method")
+
+    target = host.encode("idna")
+    writer.write(bytes([VERSION, CMD_CONNECT, 0, ATYP_DOMAIN, len(target)]) + target + struct.pack(">H", port))
+    version, reply, _, atyp = await reader.readexactly(4)
+    if version != VERSION or reply != 0:
+        raise Socks5Error("connect refused, reply %d" % reply)
+    if atyp == ATYP_DOMAIN:
+        size = (await reader.readexactly(1))[0]
+    elif atyp in ADDRESS_SIZE:
+        size = ADDRESS_SIZE[atyp]
+    else:
+        raise Socks5Error("unknown address type %d" % atyp)
+    # bound address and port, not needed
+    await reader.readexactly(size + 2)
+
+
+async def httpStatus(proxy, url, headers=None, timing=None):
+    """
+    Status code of a HEAD request to a plain http url through a SOCKS5 proxy
+    :param proxy: socks5://[username:password@]ip:port
+    :param url: http url of the judge
+    :param headers: extra request headers
+    :param timing: dict receiving the seconds taken by "connect", "handshake" and "ttfb",
+                   ttfb counts from the start like the traced aiohttp requests
+    :return: status code, raises OSError, Socks5Error or asyncio.IncompleteReadError on failure
+    """
+    proxy, target = urlsplit(proxy), urlsplit(url)
+    loop = asyncio.get_running_loop()
+    timing = dict() if timing is None else timing
+    start = loop.time()
+    reader, writer = await asyncio.open_connection(proxy.hostname, proxy.port)
+    try:
+        timing["connect"] = loop.time() - start
+        await handshake(reader, writer, target.hostname, target.port or 80,
+                        proxy.username or "", proxy.password or "")
+        timing["handshake"] = loop.time() - start - timing["connect"]
+
+        lines = ["HEAD %s HTTP/1.1" % (target.path or "/"), "Host: %s" % target.netloc, "Connection: close"]
+        lines += ["%s: %s" % item for item in (headers or {}).items() if item[0].lower() not in ("host", "connection")]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        status_line = await reader.readline()
+        timing["ttfb"] = loop.time() - start
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/") or not parts[1].isdigit():
+            raise Socks5Error("not an http response")
+        return int(parts[1])
+    finally:
+        writer.close()